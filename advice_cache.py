@@ -0,0 +1,205 @@
+"""
+Two-tier (memory LRU + SQLite) cache for generated Ayurvedic advice
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from metrics import record_cache_lookup
+
+# Scores are rounded to this step (in percentage points) before keying
+DEFAULT_QUANTIZATION_STEP = 5.0
+
+
+def quantize_scores(dosha_scores: Dict[str, float], step: float = DEFAULT_QUANTIZATION_STEP) -> Dict[str, float]:
+    """Round dosha percentages to the nearest step"""
+    if step <= 0:
+        return dict(dosha_scores)
+    return {dosha: round(score / step) * step for dosha, score in dosha_scores.items()}
+
+
+def normalize_concerns(concerns: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace in a concerns string"""
+    concerns = re.sub(r'[^\w\s]', ' ', (concerns or '').lower())
+    return ' '.join(concerns.split())
+
+
+def make_advice_key(dosha_scores: Dict[str, float], user_concerns: str, namespace: str = "",
+                    step: float = DEFAULT_QUANTIZATION_STEP) -> str:
+    """Build a stable cache key from quantized scores and normalized concerns"""
+    quantized = quantize_scores(dosha_scores, step)
+    payload = json.dumps([namespace, sorted(quantized.items()), normalize_concerns(user_concerns)])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AdviceCache:
+    """In-memory LRU in front of an optional on-disk SQLite tier.
+
+    The SQLite tier expires entries after ttl seconds and evicts the least
+    recently used rows once it holds more than max_disk_entries.
+    """
+
+    def __init__(self, path: Optional[str] = None, memory_size: int = 1024,
+                 ttl: Optional[float] = 7 * 24 * 3600, max_disk_entries: int = 100000,
+                 step: float = DEFAULT_QUANTIZATION_STEP, name: str = "advice"):
+        self.name = name
+        self.path = path
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.step = step
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0, "evictions": 0}
+        if path:
+            self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS advice (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS advice_accessed ON advice (accessed_at)")
+
+    def key(self, dosha_scores: Dict[str, float], user_concerns: str, namespace: str = "") -> str:
+        """Return the cache key for a profile"""
+        return make_advice_key(dosha_scores, user_concerns, namespace, self.step)
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def _remember(self, key: str, value: str, created_at: float):
+        if self.memory_size <= 0:
+            return
+        with self._lock:
+            self._memory[key] = (value, created_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def get(self, key: str) -> Optional[str]:
+        """Return cached advice for key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[1], now):
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    record_cache_lookup(self.name, True)
+                    return entry[0]
+                del self._memory[key]
+
+        if self.path:
+            conn = self._connect()
+            row = conn.execute("SELECT value, created_at FROM advice WHERE key = ?", (key,)).fetchone()
+            if row and not self._expired(row[1], now):
+                with conn:
+                    conn.execute("UPDATE advice SET accessed_at = ? WHERE key = ?", (now, key))
+                self._remember(key, row[0], row[1])
+                with self._lock:
+                    self.stats["disk_hits"] += 1
+                record_cache_lookup(self.name, True)
+                return row[0]
+
+        with self._lock:
+            self.stats["misses"] += 1
+        record_cache_lookup(self.name, False)
+        return None
+
+    def set(self, key: str, value: str):
+        """Store advice under key in both tiers"""
+        now = time.time()
+        self._remember(key, value, now)
+        if self.path:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO advice (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now)
+                )
+            self._evict_disk(conn, now)
+        with self._lock:
+            self.stats["sets"] += 1
+
+    def _evict_disk(self, conn: sqlite3.Connection, now: float):
+        with conn:
+            removed = 0
+            if self.ttl is not None:
+                removed += conn.execute("DELETE FROM advice WHERE created_at < ?", (now - self.ttl,)).rowcount
+            count = conn.execute("SELECT COUNT(*) FROM advice").fetchone()[0]
+            if count > self.max_disk_entries:
+                removed += conn.execute(
+                    "DELETE FROM advice WHERE key IN (SELECT key FROM advice ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_disk_entries,)
+                ).rowcount
+        if removed:
+            with self._lock:
+                self.stats["evictions"] += removed
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._memory.clear()
+        if self.path:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM advice")
+
+    def hit_rate(self) -> float:
+        """Return the fraction of lookups served from either tier"""
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def get_stats(self) -> Dict[str, float]:
+        """Return a snapshot of hit/miss counters"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+        stats["hit_rate"] = self.hit_rate()
+        return stats
+
+
+_default_cache: Optional[AdviceCache] = None
+_default_lock = threading.Lock()
+
+
+def get_default_advice_cache() -> AdviceCache:
+    """Return the process-wide advice cache configured from the environment"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                ttl = os.getenv("ADVICE_CACHE_TTL")
+                _default_cache = AdviceCache(
+                    path=os.getenv("ADVICE_CACHE_PATH"),
+                    memory_size=int(os.getenv("ADVICE_CACHE_MEMORY_SIZE", "1024")),
+                    ttl=float(ttl) if ttl else 7 * 24 * 3600,
+                    max_disk_entries=int(os.getenv("ADVICE_CACHE_MAX_ENTRIES", "100000")),
+                )
+    return _default_cache
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Checkpointed, resumable bulk advice generation: profiles JSONL in, advice JSONL out
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ayurveda_agent import ADVICE_CACHE_NAMESPACE, AyurvedaAgent
+from metrics import LLM_COMPLETION_TOKENS, LLM_PROMPT_TOKENS
+from rate_limiter import BATCH
+from resilience import is_transient
+from scoring import DOSHAS, score_answers
+
+CHECKPOINT_VERSION = 1
+
+
+def read_lines(file, offset: int = 0) -> Iterator[Tuple[bytes, int]]:
+    """Yield (non-blank line, byte offset just past it) from a binary JSONL file, starting at offset"""
+    file.seek(offset)
+    for line in file:
+        offset += len(line)
+        if line.strip():
+            yield line, offset
+
+
+def profile_scores(profile: Dict, questions: Optional[List[Dict]] = None) -> Dict[str, float]:
+    """Dosha scores of a profile given as {"scores": {...}} or {"answers": [...]}"""
+    if "scores" in profile:
+        return {dosha: float(profile["scores"][dosha]) for dosha in DOSHAS}
+    if questions is None:
+        from question_bank import get_question_bank
+        questions = get_question_bank().questions
+    return score_answers(profile["answers"], questions)
+
+
+def advice_token_usage() -> Tuple[int, int]:
+    """Prompt and completion tokens spent on advice calls so far in this process"""
+    def total(counter) -> int:
+        return int(sum(value for (call_site, _), value in counter.values().items() if call_site == "advice"))
+    return total(LLM_PROMPT_TOKENS), total(LLM_COMPLETION_TOKENS)
+
+
+class Checkpoint:
+    """Progress of a run: input consumed and output written, saved atomically as JSON.
+
+    Output is fsynced before the checkpoint that covers it is written, so
+    on restart the output is truncated back to output_size and generation
+    resumes at input_offset without duplicating or losing records.
+    """
+
+    def __init__(self, path: str, input_offset: int = 0, output_size: int = 0, stats: Optional[Dict] = None):
+        self.path = path
+        self.input_offset = input_offset
+        self.output_size = output_size
+        self.stats = stats or {}
+
+    @classmethod
+    def load(cls, path: str) -> Optional["Checkpoint"]:
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        if data.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version in {path}")
+        return cls(path, data["input_offset"], data["output_size"], data.get("stats"))
+
+    def save(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"version": CHECKPOINT_VERSION, "input_offset": self.input_offset,
+                       "output_size": self.output_size, "stats": self.stats, "saved_at": time.time()}, file)
+        os.replace(temp_path, self.path)
+
+
+class _Generation:
+    """One prompt's advice in flight, shared by every pending profile with that prompt"""
+
+    __slots__ = ("future", "rows", "attempts")
+
+    def __init__(self, future: Future):
+        self.future = future
+        self.rows = 0
+        self.attempts = 0
+
+
+class AdvicePipeline:
+    """Generates advice for every profile in a JSONL file through a bounded worker pool.
+
+    Profiles whose prompts are identical (same quantized scores, concerns
+    and prompt version) share one generation. Results are written in
+    input order, so the checkpoint is simply how far into the input and
+    output the run has got. A generation that is throttled or finds the
+    circuit open is retried with backoff; if it keeps failing the run
+    stops before that profile, so a resume picks it up again. Input lines
+    that cannot be parsed, and prompts the API rejects, are written as
+    error rows.
+    """
+
+    def __init__(self, agent: Optional[AyurvedaAgent] = None, workers: int = 8, checkpoint_every: int = 100,
+                 checkpoint_interval: float = 30.0, progress_interval: float = 10.0, retries: int = 5,
+                 retry_backoff: float = 5.0, retry_backoff_max: float = 60.0):
+        if agent is None:
+            agent = AyurvedaAgent()
+            # Bulk regeneration yields to interactive sessions under the shared rate limiter
+            agent.priority = BATCH
+        self.agent = agent
+        self.workers = workers
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_interval = checkpoint_interval
+        self.progress_interval = progress_interval
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+
+    def prompt_key(self, scores: Dict[str, float], concerns: str) -> str:
+        """Identical keys mean identical prompts (and the same advice cache entry)"""
+        return self.agent.cache.key(scores, concerns, ADVICE_CACHE_NAMESPACE)
+
+    def retry_delay(self, attempt: int) -> float:
+        """Seconds to wait before regenerating a prompt for the attempt-th time (0-based)"""
+        return min(self.retry_backoff_max, self.retry_backoff * (2 ** attempt))
+
+    def run(self, input_path: str, output_path: str, checkpoint_path: Optional[str] = None,
+            restart: bool = False) -> Dict:
+        """Process the input from the last checkpoint (or the start) and return the run's stats"""
+        checkpoint_path = checkpoint_path or f"{output_path}.checkpoint"
+        checkpoint = None if restart else Checkpoint.load(checkpoint_path)
+        input_size = os.path.getsize(input_path)
+        if checkpoint is None:
+            checkpoint = Checkpoint(checkpoint_path)
+            with open(output_path, "wb"):
+                pass
+        elif checkpoint.input_offset > input_size:
+            raise ValueError(f"{input_path} is shorter than its checkpoint; was the input replaced?")
+        else:
+            # Drop records written after the last checkpoint; they are regenerated
+            os.truncate(output_path, checkpoint.output_size)
+
+        stats = {"records": 0, "generated": 0, "deduplicated": 0, "errors": 0, "retries": 0, "prompt_tokens": 0,
+                 "completion_tokens": 0}
+        stats.update(checkpoint.stats)
+        base_tokens = advice_token_usage()
+        base_stats = dict(stats)
+        started = time.monotonic()
+        start_offset = checkpoint.input_offset
+        last_checkpoint = last_progress = started
+        since_checkpoint = 0
+
+        # prompt key -> its generation while profiles with that prompt are pending; later
+        # duplicates of a written prompt start a new generation, which the advice cache answers
+        generations: Dict[str, _Generation] = {}
+        # (profile id, scores, concerns, prompt key, started a generation, input offset past the profile,
+        # error) in input order; key is None for input lines that could not be parsed
+        pending = deque()
+        window = self.workers * 4
+
+        def head_ready() -> bool:
+            key = pending[0][3]
+            return key is None or generations[key].future.done()
+
+        def write_next():
+            nonlocal since_checkpoint
+            record_id, scores, concerns, key, generated, offset, error = pending[0]
+            advice = None
+            if key is not None:
+                generation = generations[key]
+                try:
+                    advice = generation.future.result()
+                except Exception as e:
+                    if not is_transient(e):
+                        error = f"{type(e).__name__}: {e}"
+                    elif generation.attempts < self.retries:
+                        # Nothing is written or checkpointed past this profile until it succeeds
+                        time.sleep(self.retry_delay(generation.attempts))
+                        generation.attempts += 1
+                        stats["retries"] += 1
+                        generation.future = executor.submit(self.agent.generate_advice, scores, concerns)
+                        return
+                    else:
+                        print(f"❌ Advice for record {record_id!r} still failing after {self.retries} retries "
+                              f"({type(e).__name__}: {e}); stopping so a resume retries it", file=sys.stderr)
+                        raise
+                generation.rows -= 1
+                if not generation.rows:
+                    del generations[key]
+            pending.popleft()
+            row = {"id": record_id, "scores": scores, "concerns": concerns}
+            row.update({"error": error} if error else {"advice": advice})
+            output.write((json.dumps(row) + "\n").encode("utf-8"))
+            # Counted on write so a resumed run does not count unwritten records twice
+            stats["records"] += 1
+            if error:
+                stats["errors"] += 1
+            else:
+                stats["generated" if generated else "deduplicated"] += 1
+            checkpoint.input_offset = offset
+            since_checkpoint += 1
+
+        def save_checkpoint():
+            nonlocal since_checkpoint, last_checkpoint
+            output.flush()
+            os.fsync(output.fileno())
+            prompt_tokens, completion_tokens = advice_token_usage()
+            stats["prompt_tokens"] = base_stats["prompt_tokens"] + prompt_tokens - base_tokens[0]
+            stats["completion_tokens"] = base_stats["completion_tokens"] + completion_tokens - base_tokens[1]
+            checkpoint.output_size = output.tell()
+            checkpoint.stats = dict(stats)
+            checkpoint.save()
+            since_checkpoint = 0
+            last_checkpoint = time.monotonic()
+
+        def report_progress(final: bool = False):
+            nonlocal last_progress
+            elapsed = time.monotonic() - started
+            consumed = checkpoint.input_offset - start_offset
+            rate = (stats["records"] - base_stats["records"]) / elapsed if elapsed else 0.0
+            byte_rate = consumed / elapsed if elapsed else 0.0
+            eta = (input_size - checkpoint.input_offset) / byte_rate if byte_rate else float("inf")
+            prompt_tokens, completion_tokens = advice_token_usage()
+            spent = prompt_tokens - base_tokens[0] + completion_tokens - base_tokens[1]
+            print(f"{'✅' if final else '⏳'} {stats['records']} records "
+                  f"({checkpoint.input_offset / input_size:.1%} of input) | {rate:.1f}/s | "
+                  f"ETA {'-' if final else _format_seconds(eta)} | {stats['generated']} generated, "
+                  f"{stats['deduplicated']} deduplicated, {stats['errors']} errors, {stats['retries']} retries | "
+                  f"{spent} tokens this run", file=sys.stderr)
+            last_progress = time.monotonic()
+
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="advice-pipeline")
+        try:
+            with open(input_path, "rb") as source, open(output_path, "ab") as output:
+                try:
+                    for line, offset in read_lines(source, start_offset):
+                        profile = None
+                        try:
+                            profile = json.loads(line)
+                            scores = profile_scores(profile)
+                            concerns = (profile.get("concerns") or "").strip()
+                        except (ValueError, KeyError, TypeError, AttributeError) as e:
+                            record_id = profile.get("id") if isinstance(profile, dict) else None
+                            pending.append((record_id, None, None, None, False, offset,
+                                            f"Invalid profile: {type(e).__name__}: {e}"))
+                        else:
+                            key = self.prompt_key(scores, concerns)
+                            generation = generations.get(key)
+                            generated = generation is None
+                            if generated:
+                                generation = generations[key] = _Generation(
+                                    executor.submit(self.agent.generate_advice, scores, concerns))
+                            generation.rows += 1
+                            pending.append((profile.get("id"), scores, concerns, key, generated, offset, None))
+
+                        while pending and (len(pending) >= window or head_ready()):
+                            write_next()
+                        now = time.monotonic()
+                        if (since_checkpoint >= self.checkpoint_every
+                                or now - last_checkpoint >= self.checkpoint_interval):
+                            save_checkpoint()
+                        if now - last_progress >= self.progress_interval:
+                            report_progress()
+
+                    while pending:
+                        write_next()
+                finally:
+                    # Covers only what was written, so a stopped run resumes at the first unwritten profile
+                    save_checkpoint()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        report_progress(final=True)
+        stats["elapsed_s"] = time.monotonic() - started
+        return stats
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds == float("inf"):
+        return "?"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Bulk-generate personalized advice for stored profiles")
+    parser.add_argument("input", help="JSONL of {\"id\": .., \"scores\": {..} or \"answers\": [..], \"concerns\": ..}")
+    parser.add_argument("output", help="JSONL of generated advice (appended to on resume)")
+    parser.add_argument("--checkpoint", help="Checkpoint path (default: OUTPUT.checkpoint)")
+    parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint and start from the beginning")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent advice generations")
+    parser.add_argument("--checkpoint-every", type=int, default=100, help="Records between checkpoints")
+    parser.add_argument("--checkpoint-interval", type=float, default=30.0, help="Seconds between checkpoints")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="Seconds between progress lines")
+    parser.add_argument("--retries", type=int, default=5,
+                        help="Regenerations of a throttled or failing prompt before the run stops")
+    args = parser.parse_args(argv)
+
+    pipeline = AdvicePipeline(workers=args.workers, checkpoint_every=args.checkpoint_every,
+                              checkpoint_interval=args.checkpoint_interval, progress_interval=args.progress_interval,
+                              retries=args.retries)
+    pipeline.run(args.input, args.output, args.checkpoint, args.restart)
+
+
+if __name__ == "__main__":
+    main()
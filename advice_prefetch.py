@@ -0,0 +1,57 @@
+"""
+Speculative advice generation on worker threads, started before the user asks for it
+"""
+
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+
+from ayurveda_agent import AyurvedaAgent
+from metrics import REGISTRY
+
+PREFETCHES = REGISTRY.counter("ayurveda_advice_prefetch_total", "Speculative advice generations by outcome", ("outcome",))
+
+
+class AdvicePrefetcher:
+    """Runs get_personalized_advice ahead of time on a small shared thread pool.
+
+    Generation goes through the agent's cache and single-flight group, so
+    a page that asks for the same profile while the prefetch is running
+    waits for that call instead of starting another. Cancelling drops a
+    queued prefetch; one already running finishes and only fills the cache.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="advice-prefetch")
+
+    def prefetch(self, agent: AyurvedaAgent, dosha_scores: Dict[str, float], user_concerns: str = "") -> Future:
+        """Start generating advice for a profile and return its future"""
+        PREFETCHES.inc(outcome="started")
+        return self._executor.submit(agent.get_personalized_advice, dosha_scores, user_concerns)
+
+    @staticmethod
+    def cancel(future: Optional[Future]):
+        """Drop a prefetch that is no longer wanted"""
+        if future is not None and not future.done():
+            PREFETCHES.inc(outcome="cancelled" if future.cancel() else "abandoned")
+
+    @staticmethod
+    def result(future: Future, timeout: Optional[float] = None) -> str:
+        """Wait for a prefetched result, counting whether it was ready when asked for"""
+        PREFETCHES.inc(outcome="ready" if future.done() else "waited")
+        return future.result(timeout)
+
+
+_default_prefetcher: Optional[AdvicePrefetcher] = None
+_default_lock = threading.Lock()
+
+
+def get_advice_prefetcher() -> AdvicePrefetcher:
+    """Return the process-wide prefetcher (ADVICE_PREFETCH_WORKERS threads)"""
+    global _default_prefetcher
+    if _default_prefetcher is None:
+        with _default_lock:
+            if _default_prefetcher is None:
+                _default_prefetcher = AdvicePrefetcher(int(os.getenv("ADVICE_PREFETCH_WORKERS", "4")))
+    return _default_prefetcher
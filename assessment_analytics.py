@@ -0,0 +1,249 @@
+"""
+Population analytics over stored assessments: option distributions, item discrimination and dosha mix
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from assessment_store import MAX_OPTION, choice_layout, iter_choice_chunks
+from scoring import DOSHA_INDEX, DOSHAS, UNANSWERED, ScoringEngine, rank_doshas
+
+# (path, choice_layout of the log or None, first row, end row)
+WorkUnit = Tuple[str, Optional[Tuple[int, int]], int, int]
+
+# Unanswered plus every option a 2-bit code can hold
+_CODE_COLUMNS = MAX_OPTION + 2
+
+
+class PopulationAggregate:
+    """Additive sums over a set of assessments; shards are combined with merge.
+
+    Item discrimination is the corrected item-total correlation: for each
+    option, whether it was chosen against the respondent's tally for the
+    option's dosha on the other questions. Only the sums it needs are
+    kept, so aggregates stay a few kilobytes however many records they cover.
+    """
+
+    def __init__(self, questions: List[Dict], bank_version: str):
+        self.num_questions = len(questions)
+        self.max_options = max((len(q['options']) for q in questions), default=0)
+        self.bank_version = int(bank_version, 16)
+        self.records = 0
+        self.skipped = {"other_bank_version": 0, "other_length": 0, "empty": 0}
+        self.first_timestamp: Optional[int] = None
+        self.last_timestamp: Optional[int] = None
+        # Column 0 counts unanswered questions, column o + 1 answers with option o
+        self.option_counts = np.zeros((self.num_questions, _CODE_COLUMNS), dtype=np.int64)
+        self.score_sums = np.zeros(len(DOSHAS), dtype=np.float64)
+        self.pairs = np.zeros((len(DOSHAS), len(DOSHAS)), dtype=np.int64)
+        # Per (question, option): sum x, sum y, sum y^2, sum xy over respondents who answered
+        self.item_sums = np.zeros((4, self.num_questions, self.max_options), dtype=np.int64)
+
+    def add(self, engine: ScoringEngine, option_doshas: np.ndarray, answers: np.ndarray,
+            versions: np.ndarray, timestamps: np.ndarray):
+        """Fold one chunk of decoded records into the sums"""
+        if answers.shape[1] != self.num_questions:
+            self.skipped["other_length"] += len(answers)
+            return
+        keep = versions == self.bank_version
+        self.skipped["other_bank_version"] += int((~keep).sum())
+        answered = answers != UNANSWERED
+        empty = keep & ~answered.any(axis=1)
+        self.skipped["empty"] += int(empty.sum())
+        keep &= ~empty
+        if not keep.all():
+            answers, answered, timestamps = answers[keep], answered[keep], timestamps[keep]
+        if not len(answers):
+            return
+
+        self.records += len(answers)
+        first, last = int(timestamps.min()), int(timestamps.max())
+        self.first_timestamp = first if self.first_timestamp is None else min(self.first_timestamp, first)
+        self.last_timestamp = last if self.last_timestamp is None else max(self.last_timestamp, last)
+
+        cells = np.arange(self.num_questions) * _CODE_COLUMNS + (answers + 1)
+        self.option_counts += np.bincount(cells.ravel(), minlength=self.option_counts.size).reshape(
+            self.option_counts.shape)
+
+        scores = engine.score(answers)
+        self.score_sums += scores.sum(axis=0)
+        ranks = rank_doshas(scores)
+        self.pairs += np.bincount(ranks[:, 0] * len(DOSHAS) + ranks[:, 1],
+                                  minlength=self.pairs.size).reshape(self.pairs.shape)
+
+        chosen = (answers[:, :, None] == np.arange(self.max_options)).astype(np.int32)
+        tallies = engine.dosha_counts(answers).astype(np.int32)
+        rest = tallies[:, np.maximum(option_doshas, 0)] - chosen
+        rest *= answered[:, :, None]
+        self.item_sums[0] += chosen.sum(axis=0, dtype=np.int64)
+        self.item_sums[1] += rest.sum(axis=0, dtype=np.int64)
+        self.item_sums[2] += (rest * rest).sum(axis=0, dtype=np.int64)
+        self.item_sums[3] += (chosen * rest).sum(axis=0, dtype=np.int64)
+
+    def merge(self, other: "PopulationAggregate") -> "PopulationAggregate":
+        self.records += other.records
+        for reason, count in other.skipped.items():
+            self.skipped[reason] += count
+        for name, pick in (("first_timestamp", min), ("last_timestamp", max)):
+            values = [v for v in (getattr(self, name), getattr(other, name)) if v is not None]
+            setattr(self, name, pick(values) if values else None)
+        self.option_counts += other.option_counts
+        self.score_sums += other.score_sums
+        self.pairs += other.pairs
+        self.item_sums += other.item_sums
+        return self
+
+    def report(self, questions: List[Dict]) -> Dict:
+        """Build the JSON-serializable report"""
+        total = self.records
+        report_questions = []
+        for q, question in enumerate(questions):
+            counts = self.option_counts[q]
+            answered = int(total - counts[0])
+            options = []
+            for o, option in enumerate(question['options']):
+                count = int(counts[o + 1])
+                options.append({
+                    "text": option['text'],
+                    "dosha": option['dosha'],
+                    "count": count,
+                    "share": count / answered if answered else 0.0,
+                    "discrimination": self._correlation(q, o, answered) if option['dosha'] in DOSHA_INDEX else None,
+                })
+            report_questions.append({
+                "number": q + 1,
+                "question": question['question'],
+                "answered": answered,
+                "unanswered": int(counts[0]),
+                "invalid": int(counts[len(question['options']) + 1:].sum()),
+                "options": options,
+            })
+
+        pair_counts = {f"{DOSHAS[p]}>{DOSHAS[s]}": int(self.pairs[p, s])
+                       for p in range(len(DOSHAS)) for s in range(len(DOSHAS)) if p != s}
+        primary = self.pairs.sum(axis=1)
+        return {
+            "bank_version": f"{self.bank_version:016x}",
+            "records": total,
+            "skipped": dict(self.skipped),
+            "time_range": {"first": self.first_timestamp, "last": self.last_timestamp},
+            "population": {
+                "mean_scores": {d: float(self.score_sums[i] / total) if total else 0.0 for i, d in enumerate(DOSHAS)},
+                "primary": {d: {"count": int(primary[i]), "share": int(primary[i]) / total if total else 0.0}
+                            for i, d in enumerate(DOSHAS)},
+                "pairs": {pair: {"count": count, "share": count / total if total else 0.0}
+                          for pair, count in sorted(pair_counts.items(), key=lambda item: item[1], reverse=True)},
+            },
+            "questions": report_questions,
+        }
+
+    def _correlation(self, q: int, o: int, n: int) -> Optional[float]:
+        sx, sy, syy, sxy = (float(self.item_sums[k, q, o]) for k in range(4))
+        # x is 0/1, so sum x^2 == sum x
+        spread = (n * sx - sx * sx) * (n * syy - sy * sy)
+        if n < 2 or spread <= 0:
+            return None
+        return (n * sxy - sx * sy) / math.sqrt(spread)
+
+
+def option_dosha_table(questions: List[Dict], max_options: int) -> np.ndarray:
+    """(questions x max_options) dosha index of each option, -1 where there is none"""
+    table = np.full((len(questions), max_options), -1, dtype=np.int64)
+    for q, question in enumerate(questions):
+        for o, option in enumerate(question['options']):
+            table[q, o] = DOSHA_INDEX.get(option['dosha'], -1)
+    return table
+
+
+def plan_units(paths: Sequence[str], shard_rows: int) -> List[WorkUnit]:
+    """Split uniform logs into row ranges of shard_rows; other logs are one unit each"""
+    units = []
+    for path in paths:
+        layout = choice_layout(path)
+        if layout is None:
+            units.append((path, None, 0, 0))
+            continue
+        rows = layout[1]
+        units.extend((path, layout, start, min(start + shard_rows, rows)) for start in range(0, rows, shard_rows))
+    return units
+
+
+def aggregate_unit(unit: WorkUnit, questions: List[Dict], bank_version: str,
+                   chunk_rows: int = 16384) -> PopulationAggregate:
+    """Scan one unit chunk by chunk in constant memory"""
+    path, layout, start, stop = unit
+    aggregate = PopulationAggregate(questions, bank_version)
+    engine = ScoringEngine(questions)
+    option_doshas = option_dosha_table(questions, aggregate.max_options)
+    chunks = iter_choice_chunks(path, chunk_rows, start, stop, layout) if layout is not None \
+        else iter_choice_chunks(path, chunk_rows)
+    for answers, versions, timestamps in chunks:
+        aggregate.add(engine, option_doshas, answers, versions, timestamps)
+    return aggregate
+
+
+def analyze(paths: Sequence[str], questions: List[Dict], bank_version: str, workers: int = 1,
+            chunk_rows: int = 16384, shard_rows: int = 1_000_000) -> Dict:
+    """Scan every log, in parallel across processes when workers > 1, and return the report"""
+    started = time.perf_counter()
+    units = plan_units(paths, shard_rows)
+    scan = partial(aggregate_unit, questions=questions, bank_version=bank_version, chunk_rows=chunk_rows)
+    total = PopulationAggregate(questions, bank_version)
+    if workers > 1 and len(units) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(units))) as executor:
+            for aggregate in executor.map(scan, units):
+                total.merge(aggregate)
+    else:
+        for unit in units:
+            total.merge(scan(unit))
+    elapsed = time.perf_counter() - started
+
+    report = total.report(questions)
+    report["scan"] = {
+        "files": len(paths),
+        "units": len(units),
+        "workers": workers,
+        "elapsed_s": elapsed,
+        "records_per_s": total.records / elapsed if elapsed else 0.0,
+    }
+    return report
+
+
+def main(argv: Optional[List[str]] = None):
+    """Write a population analytics report for one or more assessment logs"""
+    from question_bank import QUESTIONS_FILE, get_question_bank
+
+    parser = argparse.ArgumentParser(description="Item and population statistics over stored assessments")
+    parser.add_argument('logs', nargs='+', help="Assessment logs written by assessment_store (one per shard)")
+    parser.add_argument('--output', default='-', help="JSON report path ('-' for stdout)")
+    parser.add_argument('--questions', default=QUESTIONS_FILE, help="Question bank file")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument('--chunk-rows', type=int, default=16384, help="Records decoded per vectorized chunk")
+    parser.add_argument('--shard-rows', type=int, default=1_000_000, help="Records per work unit of a large log")
+    args = parser.parse_args(argv)
+
+    bank = get_question_bank(args.questions, artifact_path=None)
+    report = analyze(args.logs, bank.questions, bank.version, args.workers, args.chunk_rows, args.shard_rows)
+
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+    scan = report["scan"]
+    print(f"✅ Analyzed {report['records']} assessments in {scan['elapsed_s']:.2f}s "
+          f"({scan['records_per_s']:,.0f}/s, {scan['units']} units)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
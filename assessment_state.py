@@ -0,0 +1,80 @@
+"""
+Incrementally scored assessment state for an interactive session
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from chat import get_user_assessment_summary
+from scoring import DOSHA_INDEX, DOSHAS
+
+
+class AssessmentState:
+    """Answers plus running dosha tallies, updated in O(1) per answer.
+
+    Scores, the dosha ranking and the chat summary are computed on first
+    use and reused until an answer changes. Results match score_answers.
+    """
+
+    def __init__(self, questions: List[Dict], answers: Optional[List[Optional[int]]] = None):
+        self.questions = questions
+        # Dosha index of every option, or None for options without a dosha
+        self._option_doshas = [[DOSHA_INDEX.get(option['dosha']) for option in q['options']] for q in questions]
+        self.answers: List[Optional[int]] = [None] * len(questions)
+        self.counts = [0] * len(DOSHAS)
+        self.answered = 0
+        self._memo: Dict[str, object] = {}
+        for index, option in enumerate((answers or [])[:len(questions)]):
+            self.set_answer(index, option)
+
+    def _apply(self, index: int, option: Optional[int], sign: int):
+        if option is None:
+            return
+        self.answered += sign
+        doshas = self._option_doshas[index]
+        if 0 <= option < len(doshas) and doshas[option] is not None:
+            self.counts[doshas[option]] += sign
+
+    def set_answer(self, index: int, option: Optional[int]):
+        """Record (or change, or clear with None) the answer to question index"""
+        previous = self.answers[index]
+        if previous == option:
+            return
+        self._apply(index, previous, -1)
+        self._apply(index, option, 1)
+        self.answers[index] = option
+        self._memo.clear()
+
+    def reset(self):
+        self.answers = [None] * len(self.questions)
+        self.counts = [0] * len(DOSHAS)
+        self.answered = 0
+        self._memo.clear()
+
+    def scores(self) -> Dict[str, float]:
+        """Dosha percentages of the answered questions"""
+        scores = self._memo.get("scores")
+        if scores is None:
+            answered = self.answered
+            scores = self._memo["scores"] = {
+                dosha: count * 100.0 / answered if answered else 0.0 for dosha, count in zip(DOSHAS, self.counts)
+            }
+        return scores
+
+    def sorted_scores(self) -> List[Tuple[str, float]]:
+        """(dosha, score) pairs from highest to lowest score"""
+        ranked = self._memo.get("sorted")
+        if ranked is None:
+            ranked = self._memo["sorted"] = sorted(self.scores().items(), key=lambda x: x[1], reverse=True)
+        return ranked
+
+    def ranking(self) -> Tuple[str, str]:
+        """(primary, secondary) dosha"""
+        ranked = self.sorted_scores()
+        return ranked[0][0], ranked[1][0]
+
+    def summary(self) -> str:
+        """The assessment summary given to the chat model"""
+        summary = self._memo.get("summary")
+        if summary is None:
+            summary = self._memo["summary"] = get_user_assessment_summary(self.answers, self.questions, self.scores())
+        return summary
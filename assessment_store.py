@@ -0,0 +1,385 @@
+"""
+Bit-packed assessment records and an append-only, memory-mappable log of them
+"""
+
+import atexit
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from scoring import DOSHAS, UNANSWERED
+
+FILE_MAGIC = b"AYVLOG"
+FORMAT_VERSION = 1
+FILE_HEADER = struct.Struct("<6sH")
+# kind, answer count, question bank version, unix timestamp
+RECORD_HEADER = struct.Struct("<BHQI")
+RECORD_CRC = struct.Struct("<I")
+
+KIND_CHOICE = 0
+KIND_YES_NO = 1
+
+# Multiple-choice answers are stored as 2-bit codes: 0 = unanswered, 1-3 = option 0-2
+MAX_OPTION = 2
+
+
+def _payload_size(kind: int, count: int) -> int:
+    if kind == KIND_CHOICE:
+        return (count + 3) // 4
+    if kind == KIND_YES_NO:
+        return len(DOSHAS) + (count + 7) // 8
+    raise ValueError(f"Unknown assessment record kind {kind}")
+
+
+def record_size(kind: int, count: int) -> int:
+    """Bytes one record of this shape occupies in the log"""
+    return RECORD_HEADER.size + _payload_size(kind, count) + RECORD_CRC.size
+
+
+class AssessmentRecord:
+    """One stored assessment: packed answers, question bank version and timestamp"""
+
+    __slots__ = ("kind", "count", "payload", "bank_version", "timestamp")
+
+    def __init__(self, kind: int, count: int, payload: bytes, bank_version: int = 0, timestamp: Optional[int] = None):
+        self.kind = kind
+        self.count = count
+        self.payload = payload
+        self.bank_version = bank_version
+        self.timestamp = int(time.time()) if timestamp is None else timestamp
+
+    @classmethod
+    def from_answers(cls, answers: Sequence[Optional[int]], bank_version: str = "0",
+                     timestamp: Optional[int] = None) -> "AssessmentRecord":
+        """Pack a multiple-choice submission; bank_version is QuestionBank.version"""
+        packed = bytearray(_payload_size(KIND_CHOICE, len(answers)))
+        for i, answer in enumerate(answers):
+            if answer is None:
+                continue
+            if not 0 <= answer <= MAX_OPTION:
+                raise ValueError(f"Answer {answer} to question {i + 1} does not fit a 2-bit option code")
+            packed[i >> 2] |= (answer + 1) << ((i & 3) * 2)
+        return cls(KIND_CHOICE, len(answers), bytes(packed), int(bank_version, 16), timestamp)
+
+    @classmethod
+    def from_yes_no(cls, responses: Dict[str, List[bool]], timestamp: Optional[int] = None) -> "AssessmentRecord":
+        """Pack a yes/no submission grouped by dosha as group sizes plus a bitmask"""
+        sizes = [len(responses.get(dosha, ())) for dosha in DOSHAS]
+        flags = [bool(answer) for dosha in DOSHAS for answer in responses.get(dosha, ())]
+        bits = np.packbits(np.array(flags, dtype=bool), bitorder="little").tobytes()
+        return cls(KIND_YES_NO, len(flags), bytes(sizes) + bits, 0, timestamp)
+
+    def answers(self) -> List[Optional[int]]:
+        """Unpack a multiple-choice submission"""
+        payload = self.payload
+        codes = [(payload[i >> 2] >> ((i & 3) * 2)) & 3 for i in range(self.count)]
+        return [code - 1 if code else None for code in codes]
+
+    def yes_no(self) -> Dict[str, List[bool]]:
+        """Unpack a yes/no submission"""
+        sizes = self.payload[:len(DOSHAS)]
+        bits = np.unpackbits(np.frombuffer(self.payload, dtype=np.uint8, offset=len(DOSHAS)), bitorder="little")
+        flags = bits[:self.count].astype(bool).tolist()
+        responses, start = {}, 0
+        for dosha, size in zip(DOSHAS, sizes):
+            responses[dosha] = flags[start:start + size]
+            start += size
+        return responses
+
+    @property
+    def bank_version_hex(self) -> str:
+        return f"{self.bank_version:016x}"
+
+    def to_bytes(self) -> bytes:
+        body = RECORD_HEADER.pack(self.kind, self.count, self.bank_version, self.timestamp) + self.payload
+        return body + RECORD_CRC.pack(zlib.crc32(body))
+
+
+def _read_record(buffer, offset: int, end: int) -> Optional[Tuple[AssessmentRecord, int]]:
+    """Decode the record at offset, or return None at a torn or corrupt tail"""
+    if offset + RECORD_HEADER.size > end:
+        return None
+    kind, count, bank_version, timestamp = RECORD_HEADER.unpack_from(buffer, offset)
+    try:
+        size = record_size(kind, count)
+    except ValueError:
+        return None
+    if offset + size > end:
+        return None
+    body_end = offset + size - RECORD_CRC.size
+    if zlib.crc32(buffer[offset:body_end]) != RECORD_CRC.unpack_from(buffer, body_end)[0]:
+        return None
+    payload = bytes(buffer[offset + RECORD_HEADER.size:body_end])
+    return AssessmentRecord(kind, count, payload, bank_version, timestamp), offset + size
+
+
+def _check_header(buffer):
+    magic, version = FILE_HEADER.unpack_from(buffer, 0)
+    if magic != FILE_MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Not an assessment log (bad magic or format version)")
+
+
+def _valid_length(path: str) -> int:
+    """Return the byte length of the log up to its last intact record"""
+    mapped = _open_map(path)
+    if mapped is None:
+        return FILE_HEADER.size
+    with mapped:
+        end = len(mapped)
+        if end >= FILE_HEADER.size + RECORD_HEADER.size:
+            # Uniform logs, the common case, are intact when a record of the first one's shape ends the file
+            kind, count = RECORD_HEADER.unpack_from(mapped, FILE_HEADER.size)[:2]
+            try:
+                stride = record_size(kind, count)
+            except ValueError:
+                stride = 0
+            tail = end - stride
+            if stride and tail >= FILE_HEADER.size and _read_record(mapped, tail, end) is not None:
+                return end
+        # Torn or mixed-shape tail: walk the records through the map rather than reading the file in
+        offset = FILE_HEADER.size
+        while True:
+            result = _read_record(mapped, offset, end)
+            if result is None:
+                return offset
+            offset = result[1]
+
+
+class AssessmentLog:
+    """Append-only assessment log with batched fsync.
+
+    Every append is flushed to the OS at once; records are fsynced after
+    fsync_every appends or fsync_interval seconds, whichever comes first
+    (a timer covers the interval when no further appends arrive), so a
+    machine crash loses at most one batch. Opening an existing log
+    truncates a torn tail left by such a crash; a log whose last record
+    is intact is checked without reading the rest of it.
+    """
+
+    def __init__(self, path: str, fsync_every: int = 256, fsync_interval: float = 1.0, recover: bool = True):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if 0 < size < FILE_HEADER.size:
+            if not recover:
+                raise ValueError(f"{path} is shorter than an assessment log header")
+            # Torn while writing the header: nothing was ever stored
+            os.truncate(path, 0)
+            size = 0
+        if size and recover:
+            length = _valid_length(path)
+            if length < size:
+                os.truncate(path, length)
+        self._file = open(path, "ab")
+        if not size:
+            self._file.write(FILE_HEADER.pack(FILE_MAGIC, FORMAT_VERSION))
+            self._file.flush()
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def append(self, record: AssessmentRecord):
+        self.append_many([record])
+
+    def append_many(self, records: Sequence[AssessmentRecord]):
+        data = b"".join(record.to_bytes() for record in records)
+        with self._lock:
+            self._file.write(data)
+            # Hand the bytes to the OS now: readers see them and a process crash cannot lose them
+            self._file.flush()
+            self._pending += len(records)
+            if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.fsync_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def flush(self):
+        """Make every appended record durable now"""
+        with self._lock:
+            if self._pending and not self._file.closed:
+                self._sync()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._sync()
+                self._file.close()
+
+    def __enter__(self) -> "AssessmentLog":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _open_map(path: str) -> Optional[mmap.mmap]:
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size <= FILE_HEADER.size:
+            return None
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    _check_header(mapped)
+    return mapped
+
+
+def iter_records(path: str) -> Iterator[AssessmentRecord]:
+    """Yield every intact record in the log, stopping at a torn tail"""
+    mapped = _open_map(path)
+    if mapped is None:
+        return
+    with mapped:
+        offset, end = FILE_HEADER.size, len(mapped)
+        while True:
+            result = _read_record(mapped, offset, end)
+            if result is None:
+                return
+            record, offset = result
+            yield record
+
+
+ChoiceChunk = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+# Rows per header check when validating a log's layout, bounding memory
+_LAYOUT_CHECK_ROWS = 1 << 20
+
+
+def _choice_dtype(count: int) -> np.dtype:
+    return np.dtype([("kind", "u1"), ("count", "<u2"), ("version", "<u8"), ("timestamp", "<u4"),
+                     ("payload", "u1", (_payload_size(KIND_CHOICE, count),)), ("crc", "<u4")])
+
+
+def choice_layout(path: str) -> Optional[Tuple[int, int]]:
+    """Return (questions, rows) if every record is a multiple-choice one of the same length, else None"""
+    mapped = _open_map(path)
+    if mapped is None:
+        return None
+    with mapped:
+        if len(mapped) < FILE_HEADER.size + RECORD_HEADER.size:
+            return None
+        kind, count = RECORD_HEADER.unpack_from(mapped, FILE_HEADER.size)[:2]
+        if kind != KIND_CHOICE:
+            return None
+        stride = record_size(kind, count)
+        rows = (len(mapped) - FILE_HEADER.size) // stride
+        if not rows:
+            return None
+        dtype = _choice_dtype(count)
+        for begin in range(0, rows, _LAYOUT_CHECK_ROWS):
+            table = np.frombuffer(mapped, dtype=dtype, count=min(_LAYOUT_CHECK_ROWS, rows - begin),
+                                  offset=FILE_HEADER.size + begin * stride)
+            uniform = bool(np.all(table["kind"] == kind) and np.all(table["count"] == count))
+            del table
+            if not uniform:
+                return None
+        # A full-length torn write at the end would pass the header checks, so verify its checksum
+        if _read_record(mapped, FILE_HEADER.size + (rows - 1) * stride, len(mapped)) is None:
+            return None
+        return count, rows
+
+
+def _records_to_chunk(records: List[AssessmentRecord]) -> ChoiceChunk:
+    width = max((record.count for record in records), default=0)
+    answers = np.full((len(records), width), UNANSWERED, dtype=np.int64)
+    for row, record in enumerate(records):
+        values = record.answers()
+        answers[row, :len(values)] = [UNANSWERED if value is None else value for value in values]
+    return (answers, np.array([r.bank_version for r in records], dtype=np.uint64),
+            np.array([r.timestamp for r in records], dtype=np.uint32))
+
+
+def iter_choice_chunks(path: str, chunk_rows: int = 65536, start: int = 0, stop: Optional[int] = None,
+                       layout: Optional[Tuple[int, int]] = None) -> Iterator[ChoiceChunk]:
+    """Yield (answers, bank versions, timestamps) for the multiple-choice records, chunk_rows at a time.
+
+    answers is an (N x questions) int64 array with UNANSWERED for skipped
+    questions, ready for ScoringEngine.score. Logs whose records all share
+    one shape (see choice_layout) are decoded straight from the memory map
+    without a per-record Python loop, and start/stop can select a row range
+    of them; any other log is read in full through iter_records. Pass a
+    layout already returned by choice_layout to skip validating it again.
+    """
+    layout = layout or choice_layout(path)
+    if layout is None:
+        if start or stop is not None:
+            raise ValueError(f"{path} is not a uniform multiple-choice log; it cannot be split into row ranges")
+        batch = []
+        for record in iter_records(path):
+            if record.kind == KIND_CHOICE:
+                batch.append(record)
+                if len(batch) >= chunk_rows:
+                    yield _records_to_chunk(batch)
+                    batch = []
+        if batch:
+            yield _records_to_chunk(batch)
+        return
+
+    count, rows = layout
+    stop = rows if stop is None else min(stop, rows)
+    stride = record_size(KIND_CHOICE, count)
+    dtype = _choice_dtype(count)
+    shifts = np.array([0, 2, 4, 6], dtype=np.uint8)
+    with _open_map(path) as mapped:
+        for begin in range(start, stop, chunk_rows):
+            size = min(chunk_rows, stop - begin)
+            table = np.frombuffer(mapped, dtype=dtype, count=size, offset=FILE_HEADER.size + begin * stride)
+            codes = (table["payload"][:, :, None] >> shifts) & 3
+            chunk = (codes.reshape(size, -1)[:, :count].astype(np.int64) - 1,
+                     table["version"].copy(), table["timestamp"].copy())
+            # The map cannot close while arrays still point into it
+            del table, codes
+            yield chunk
+
+
+def load_choice_matrix(path: str) -> ChoiceChunk:
+    """Return (answers, bank versions, timestamps) for every multiple-choice record in the log"""
+    chunks = list(iter_choice_chunks(path, chunk_rows=_LAYOUT_CHECK_ROWS))
+    if not chunks:
+        return np.zeros((0, 0), dtype=np.int64), np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint32)
+    width = max(answers.shape[1] for answers, _, _ in chunks)
+    answers = np.full((sum(len(a) for a, _, _ in chunks), width), UNANSWERED, dtype=np.int64)
+    row = 0
+    for chunk, _, _ in chunks:
+        answers[row:row + len(chunk), :chunk.shape[1]] = chunk
+        row += len(chunk)
+    return (answers, np.concatenate([versions for _, versions, _ in chunks]),
+            np.concatenate([timestamps for _, _, timestamps in chunks]))
+
+
+_default_log: Optional[AssessmentLog] = None
+_default_lock = threading.Lock()
+
+
+def get_assessment_log() -> Optional[AssessmentLog]:
+    """Return the process-wide log at ASSESSMENT_LOG_PATH, or None when persistence is off"""
+    global _default_log
+    path = os.getenv("ASSESSMENT_LOG_PATH")
+    if not path:
+        return None
+    if _default_log is None:
+        with _default_lock:
+            if _default_log is None:
+                _default_log = AssessmentLog(
+                    path,
+                    fsync_every=int(os.getenv("ASSESSMENT_LOG_FSYNC_EVERY", "256")),
+                    fsync_interval=float(os.getenv("ASSESSMENT_LOG_FSYNC_INTERVAL", "1.0")),
+                )
+                atexit.register(_default_log.close)
+    return _default_log
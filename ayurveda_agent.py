@@ -1,117 +1,129 @@
-import os
-from openai import OpenAI
-from typing import Dict, List, Optional
+import asyncio
+import sys
+from types import MappingProxyType
+from typing import Dict, Generator, List, Mapping, Optional, Tuple
 import json
+from config import MODEL_ROUTES
+from llm_backend import LLMBackend, get_llm_backend
+from metrics import instrument
+from model_router import get_model_router, observe_latency
+from rate_limiter import BATCH, INTERACTIVE, attempt_budget
+from resilience import ADVICE_POLICY, is_transient, resilient
+from scoring import score_yes_no
+from guidelines import CONSTITUTION_GUIDELINES, render_advice
+from advice_cache import AdviceCache, get_default_advice_cache, quantize_scores
+from single_flight import AsyncSingleFlight, SingleFlight
+
+# Primary model of the advice route; calls may be routed to its fallback model
+ADVICE_MODEL = MODEL_ROUTES["advice"]["model"]
+ADVICE_SYSTEM_PROMPT = "You are an expert Ayurvedic practitioner with deep knowledge of doshas, diet, lifestyle, and natural healing. Provide practical, personalized advice."
+# Bump when the advice prompt changes so stale cached answers are not served
+ADVICE_PROMPT_VERSION = 1
+ADVICE_CACHE_NAMESPACE = f"{ADVICE_MODEL}:v{ADVICE_PROMPT_VERSION}"
+# Prefixes the local guidance served when the LLM is failing or its circuit is open
+ADVICE_FALLBACK_NOTICE = "⚠️ Personalized AI advice is unavailable right now, so here is the general guidance for your constitution.\n\n"
+
+# Identical concurrent advice requests (same cache key) share one upstream call
+_advice_flight = SingleFlight("advice")
+_async_advice_flight = AsyncSingleFlight("advice")
+
+# Yes/no questions for the interactive CLI assessment, shared by every agent
+DOSHA_QUESTIONS: Mapping[str, Tuple[str, ...]] = MappingProxyType({
+    "vata": (
+        "Do you tend to have dry skin and hair?",
+        "Do you often feel anxious or worried?",
+        "Do you have irregular eating and sleeping patterns?",
+        "Do you prefer warm weather over cold?",
+        "Do you tend to be creative and enthusiastic?",
+        "Do you have a thin, lean body frame?",
+        "Do you speak quickly and move fast?",
+        "Do you have difficulty gaining weight?",
+        "Do you experience constipation frequently?",
+        "Do you have a tendency to overthink?"
+    ),
+    "pitta": (
+        "Do you have a medium build with good muscle tone?",
+        "Do you tend to be competitive and ambitious?",
+        "Do you have a strong appetite and get irritable when hungry?",
+        "Do you prefer cool weather over hot?",
+        "Do you have a sharp memory and good concentration?",
+        "Do you tend to be organized and precise?",
+        "Do you have a tendency toward anger or irritability?",
+        "Do you have a warm body temperature?",
+        "Do you have a medium-sized frame?",
+        "Do you prefer cold drinks and foods?"
+    ),
+    "kapha": (
+        "Do you have a large, solid body frame?",
+        "Do you tend to be calm and patient?",
+        "Do you have thick, oily skin and hair?",
+        "Do you gain weight easily?",
+        "Do you have a slow, steady walk?",
+        "Do you prefer warm, dry weather?",
+        "Do you have a deep, stable voice?",
+        "Do you sleep deeply and for long periods?",
+        "Do you have a strong immune system?",
+        "Do you tend to be loyal and supportive?"
+    )
+})
 
 class AyurvedaAgent:
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize the Ayurveda AI Agent"""
-        self.client = OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
-        self.dosha_questions = self._get_dosha_assessment_questions()
-        self.constitution_guidelines = self._get_constitution_guidelines()
-        
-    def _get_dosha_assessment_questions(self) -> Dict[str, List[str]]:
-        """Return comprehensive dosha assessment questions"""
-        return {
-            "vata": [
-                "Do you tend to have dry skin and hair?",
-                "Do you often feel anxious or worried?",
-                "Do you have irregular eating and sleeping patterns?",
-                "Do you prefer warm weather over cold?",
-                "Do you tend to be creative and enthusiastic?",
-                "Do you have a thin, lean body frame?",
-                "Do you speak quickly and move fast?",
-                "Do you have difficulty gaining weight?",
-                "Do you experience constipation frequently?",
-                "Do you have a tendency to overthink?"
-            ],
-            "pitta": [
-                "Do you have a medium build with good muscle tone?",
-                "Do you tend to be competitive and ambitious?",
-                "Do you have a strong appetite and get irritable when hungry?",
-                "Do you prefer cool weather over hot?",
-                "Do you have a sharp memory and good concentration?",
-                "Do you tend to be organized and precise?",
-                "Do you have a tendency toward anger or irritability?",
-                "Do you have a warm body temperature?",
-                "Do you have a medium-sized frame?",
-                "Do you prefer cold drinks and foods?"
-            ],
-            "kapha": [
-                "Do you have a large, solid body frame?",
-                "Do you tend to be calm and patient?",
-                "Do you have thick, oily skin and hair?",
-                "Do you gain weight easily?",
-                "Do you have a slow, steady walk?",
-                "Do you prefer warm, dry weather?",
-                "Do you have a deep, stable voice?",
-                "Do you sleep deeply and for long periods?",
-                "Do you have a strong immune system?",
-                "Do you tend to be loyal and supportive?"
-            ]
-        }
-    
-    def _get_constitution_guidelines(self) -> Dict[str, Dict]:
-        """Return guidelines for each dosha constitution"""
-        return {
-            "vata": {
-                "description": "Vata is composed of Air and Ether elements. Vata types are creative, quick-thinking, and adaptable but can be prone to anxiety and irregular habits.",
-                "diet": {
-                    "favorable": ["Warm, cooked foods", "Sweet, sour, and salty tastes", "Ghee and oils", "Dairy products", "Nuts and seeds", "Root vegetables"],
-                    "avoid": ["Cold, raw foods", "Bitter and astringent tastes", "Dry, light foods", "Carbonated drinks", "Caffeine"]
-                },
-                "lifestyle": {
-                    "daily_routine": "Regular sleep schedule (10 PM - 6 AM), warm oil massage, gentle exercise like yoga and walking",
-                    "exercise": "Gentle, grounding exercises like walking, swimming, tai chi, and restorative yoga",
-                    "stress_management": "Meditation, deep breathing, warm baths, calming music"
-                }
-            },
-            "pitta": {
-                "description": "Pitta is composed of Fire and Water elements. Pitta types are intelligent, focused, and driven but can be prone to anger and inflammation.",
-                "diet": {
-                    "favorable": ["Cooling foods", "Sweet, bitter, and astringent tastes", "Fresh vegetables", "Sweet fruits", "Dairy products", "Grains"],
-                    "avoid": ["Hot, spicy foods", "Sour and salty tastes", "Fermented foods", "Alcohol", "Red meat", "Excessive oil"]
-                },
-                "lifestyle": {
-                    "daily_routine": "Early to bed (10 PM), early to rise (6 AM), cooling practices, moderate exercise",
-                    "exercise": "Moderate exercise like swimming, cycling, and cooling yoga practices",
-                    "stress_management": "Cooling meditation, moon gazing, spending time in nature"
-                }
-            },
-            "kapha": {
-                "description": "Kapha is composed of Earth and Water elements. Kapha types are strong, loyal, and patient but can be prone to weight gain and lethargy.",
-                "diet": {
-                    "favorable": ["Light, dry foods", "Bitter, pungent, and astringent tastes", "Honey", "Legumes", "Light vegetables", "Spices"],
-                    "avoid": ["Heavy, oily foods", "Sweet, sour, and salty tastes", "Dairy products", "Cold foods", "Excessive water"]
-                },
-                "lifestyle": {
-                    "daily_routine": "Early rising (6 AM), vigorous exercise, dry massage, stimulating practices",
-                    "exercise": "Vigorous exercise like running, dancing, power yoga, and strength training",
-                    "stress_management": "Stimulating activities, energizing music, social engagement"
-                }
-            }
-        }
+    # Scheduling priority of this agent's LLM calls under the shared rate limiter
+    priority = INTERACTIVE
+    
+    def __init__(self, api_key: Optional[str] = None, cache: Optional[AdviceCache] = None,
+                 backend: Optional[LLMBackend] = None):
+        """Initialize the Ayurveda AI Agent.
+
+        No LLM client is created until advice is first requested, so the
+        agent can be used for offline scoring without an API key.
+        """
+        self._api_key = api_key
+        self._backend = backend
+        self._llm = None
+        self.cache = cache if cache is not None else get_default_advice_cache()
+        # Module-level read-only data: constructing an agent copies nothing
+        self.dosha_questions = DOSHA_QUESTIONS
+        self.constitution_guidelines = CONSTITUTION_GUIDELINES
+    
+    @property
+    def llm(self) -> LLMBackend:
+        """The instrumented, resilient LLM backend, built on first use"""
+        if self._llm is None:
+            # Every upstream attempt pays rate-limit budget; throttling never trips the circuit breaker
+            backend = observe_latency(self._backend or get_llm_backend(self._api_key))
+            self._llm = instrument(resilient(backend, ADVICE_POLICY, attempt_budget(self.priority)), "advice")
+        return self._llm
+        
+    def get_constitution_advice(self, dosha_scores: Dict[str, float]) -> str:
+        """Render the precomputed constitution-level advice for a set of scores"""
+        sorted_doshas = sorted(dosha_scores.items(), key=lambda x: x[1], reverse=True)
+        return render_advice(sorted_doshas[0][0], sorted_doshas[1][0], dosha_scores)
+    
+    def _fallback_advice(self, dosha_scores: Dict[str, float]) -> str:
+        """Local advice served when the LLM call fails; never cached"""
+        return ADVICE_FALLBACK_NOTICE + self.get_constitution_advice(dosha_scores)
+    
+    def _degrade(self, error: Exception, dosha_scores: Dict[str, float]) -> str:
+        """Fallback advice for an upstream failure; any other error is re-raised"""
+        if not is_transient(error):
+            raise error
+        print(f"⚠️ Advice LLM call failed ({type(error).__name__}: {error}); serving local guidance", file=sys.stderr)
+        return self._fallback_advice(dosha_scores)
     
     def assess_dosha_constitution(self, responses: Dict[str, List[bool]]) -> Dict[str, float]:
         """Assess dosha constitution based on user responses"""
-        dosha_scores = {"vata": 0, "pitta": 0, "kapha": 0}
-        
-        for dosha, answers in responses.items():
-            if dosha in dosha_scores:
-                dosha_scores[dosha] = sum(answers) / len(answers) * 100
-        
-        return dosha_scores
+        return score_yes_no(responses)
     
-    def get_personalized_advice(self, dosha_scores: Dict[str, float], user_concerns: str = "") -> str:
-        """Generate personalized Ayurvedic advice based on dosha constitution"""
+    def _build_advice_prompt(self, dosha_scores: Dict[str, float], user_concerns: str = "") -> str:
+        """Build the user prompt for personalized advice"""
         
         # Determine primary and secondary doshas
         sorted_doshas = sorted(dosha_scores.items(), key=lambda x: x[1], reverse=True)
         primary_dosha = sorted_doshas[0][0]
         secondary_dosha = sorted_doshas[1][0] if len(sorted_doshas) > 1 else None
         
-        # Create prompt for AI
-        prompt = f"""
+        return f"""
         You are an expert Ayurvedic practitioner. Based on the following dosha assessment:
 
         Vata: {dosha_scores['vata']:.1f}%
@@ -133,22 +145,78 @@ class AyurvedaAgent:
 
         Make the advice practical, specific, and easy to follow. Use Ayurvedic principles but explain them in modern terms.
         """
+    
+    def _advice_messages(self, prompt: str) -> List[Dict[str, str]]:
+        """Return the chat messages for an advice prompt"""
+        return [
+            {"role": "system", "content": ADVICE_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def generate_advice(self, dosha_scores: Dict[str, float], user_concerns: str = "") -> str:
+        """Generate advice, raising on upstream errors instead of falling back to local guidance"""
+        
+        # Profiles are quantized so near-identical score sets share a cached answer
+        dosha_scores = quantize_scores(dosha_scores, self.cache.step)
+        cache_key = self.cache.key(dosha_scores, user_concerns, ADVICE_CACHE_NAMESPACE)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        def generate() -> str:
+            prompt = self._build_advice_prompt(dosha_scores, user_concerns)
+            call = get_model_router().select("advice")
+            advice = self.llm.complete(self._advice_messages(prompt), call.model, max_tokens=call.max_tokens).text
+            if not call.is_fallback:
+                self.cache.set(cache_key, advice)
+            return advice
         
+        advice, _ = _advice_flight.do(cache_key, generate)
+        return advice
+    
+    def get_personalized_advice(self, dosha_scores: Dict[str, float], user_concerns: str = "") -> str:
+        """Generate personalized Ayurvedic advice based on dosha constitution"""
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are an expert Ayurvedic practitioner with deep knowledge of doshas, diet, lifestyle, and natural healing. Provide practical, personalized advice."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=1000,
-                temperature=0.7
-            )
-            return response.choices[0].message.content
+            return self.generate_advice(dosha_scores, user_concerns)
         except Exception as e:
-            return f"Error generating advice: {str(e)}"
+            # Deadline, exhausted retries, throttling or an open circuit: degrade to local guidance
+            return self._degrade(e, dosha_scores)
     
-    def get_dosha_questions(self) -> Dict[str, List[str]]:
+    def stream_personalized_advice(self, dosha_scores: Dict[str, float], user_concerns: str = "") -> Generator[str, None, str]:
+        """Yield personalized advice tokens as they arrive.
+
+        The generator's return value is the full advice text, which is also
+        stored in the cache once the stream completes successfully (unless it
+        came from the route's fallback model). If the upstream fails, local
+        constitution advice is yielded instead.
+        """
+        raw_scores = dosha_scores
+        dosha_scores = quantize_scores(dosha_scores, self.cache.step)
+        cache_key = self.cache.key(dosha_scores, user_concerns, ADVICE_CACHE_NAMESPACE)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return cached
+        
+        prompt = self._build_advice_prompt(dosha_scores, user_concerns)
+        call = get_model_router().select("advice")
+        tokens = []
+        
+        try:
+            for token in self.llm.stream(self._advice_messages(prompt), call.model, max_tokens=call.max_tokens):
+                tokens.append(token)
+                yield token
+        except Exception as e:
+            fallback = self._degrade(e, raw_scores)
+            yield ("\n\n" if tokens else "") + fallback
+            return fallback
+        
+        advice = "".join(tokens)
+        if not call.is_fallback:
+            self.cache.set(cache_key, advice)
+        return advice
+    
+    def get_dosha_questions(self) -> Mapping[str, Tuple[str, ...]]:
         """Return the dosha assessment questions"""
         return self.dosha_questions
     
@@ -179,6 +247,16 @@ class AyurvedaAgent:
         for dosha, score in dosha_scores.items():
             print(f"{dosha.capitalize()}: {score:.1f}%")
         
+        from assessment_store import AssessmentRecord, get_assessment_log
+        log = get_assessment_log()
+        if log is not None:
+            log.append(AssessmentRecord.from_yes_no(responses))
+        
+        # Speculatively generate the no-concerns advice while the user types
+        from advice_prefetch import get_advice_prefetcher
+        prefetcher = get_advice_prefetcher()
+        prefetch = prefetcher.prefetch(self, dosha_scores)
+        
         # Get user concerns
         print("\nWhat specific health concerns or goals would you like advice on?")
         concerns = input("(Press Enter if none): ").strip()
@@ -188,10 +266,73 @@ class AyurvedaAgent:
         print("🌱 YOUR PERSONALIZED AYURVEDIC ADVICE")
         print("="*50)
         
-        advice = self.get_personalized_advice(dosha_scores, concerns)
-        print(advice)
+        if not concerns:
+            advice = prefetcher.result(prefetch)
+            print(advice)
+            return advice
+        prefetcher.cancel(prefetch)
+        
+        # Print tokens as they arrive so the first words show up immediately
+        stream = self.stream_personalized_advice(dosha_scores, concerns)
+        while True:
+            try:
+                print(next(stream), end="", flush=True)
+            except StopIteration as done:
+                advice = done.value
+                break
+        print()
+        
+        return advice
+
+class AsyncAyurvedaAgent(AyurvedaAgent):
+    """AyurvedaAgent with asyncio advice generation for batch workloads"""
+    
+    priority = BATCH
+    
+    async def _generate_advice_async(self, dosha_scores: Dict[str, float], user_concerns: str = "") -> str:
+        """Generate advice, raising on upstream errors instead of returning an error string"""
+        dosha_scores = quantize_scores(dosha_scores, self.cache.step)
+        cache_key = self.cache.key(dosha_scores, user_concerns, ADVICE_CACHE_NAMESPACE)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        async def generate() -> str:
+            prompt = self._build_advice_prompt(dosha_scores, user_concerns)
+            call = get_model_router().select("advice")
+            completion = await self.llm.acomplete(self._advice_messages(prompt), call.model, max_tokens=call.max_tokens)
+            if not call.is_fallback:
+                self.cache.set(cache_key, completion.text)
+            return completion.text
         
+        advice, _ = await _async_advice_flight.do(cache_key, generate)
         return advice
+    
+    async def get_personalized_advice_async(self, dosha_scores: Dict[str, float], user_concerns: str = "") -> str:
+        """Async variant of get_personalized_advice"""
+        try:
+            return await self._generate_advice_async(dosha_scores, user_concerns)
+        except Exception as e:
+            return self._degrade(e, dosha_scores)
+    
+    async def batch_advice(self, profiles: List[Dict], concurrency: int = 8) -> List[Dict]:
+        """Generate advice for many profiles with at most `concurrency` requests in flight.
+
+        Each profile is a dict with "dosha_scores" and optional "user_concerns".
+        Results are returned in input order as dicts with "advice" set on success,
+        or "error" and "error_type" set when that profile failed.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def run(profile: Dict) -> Dict:
+            async with semaphore:
+                try:
+                    advice = await self._generate_advice_async(profile["dosha_scores"], profile.get("user_concerns", ""))
+                    return {"advice": advice, "error": None, "error_type": None}
+                except Exception as e:
+                    return {"advice": None, "error": str(e), "error_type": type(e).__name__}
+        
+        return list(await asyncio.gather(*(run(profile) for profile in profiles)))
 
 def main():
     """Main function to run the Ayurveda Agent"""
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the parsing, scoring and prompt paths, with run-to-run regression checks
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from advice_cache import AdviceCache
+from ayurveda_agent import AyurvedaAgent
+from chat import get_user_assessment_summary
+from guidelines import DOSHAS, render_advice
+from llm_stub import StubBackend
+from question_bank import get_question_bank, parse_questions
+from scoring import ScoringEngine, YesNoScoringEngine, rank_doshas, score_answers, score_yes_no
+
+DEFAULT_SIZES = [10, 1000, 100000]
+# Per-row Python paths are timed on at most this many rows and reported per row
+PER_ROW_CAP = 20000
+
+# Cold-start scripts, each timed in a fresh interpreter
+IMPORT_BENCHMARKS = {
+    "startup.python": "pass",
+    "startup.import_scoring": "import scoring",
+    "startup.import_ayurveda_agent": "import ayurveda_agent",
+    "startup.import_config": "import config",
+    "startup.offline_agent": (
+        "from ayurveda_agent import AyurvedaAgent; "
+        "AyurvedaAgent().assess_dosha_constitution({'vata': [True] * 10, 'pitta': [False] * 10, 'kapha': [True] * 10})"
+    ),
+}
+
+
+def synthetic_question_text(num_questions: int, num_options: int = 3, seed: int = 0) -> str:
+    """Render a synthetic bank in the questions.txt format"""
+    rng = random.Random(seed)
+    names = [dosha.title() for dosha in DOSHAS]
+    lines = []
+    for q in range(1, num_questions + 1):
+        lines.append(f"<Question {q}>Synthetic question number {q} about habits?</Question {q}>")
+        for o in range(1, num_options + 1):
+            lines.append(f"<Option {o}>Option {o} for question {q} ({rng.choice(names)})</Option {o}>")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def synthetic_answers(rows: int, questions: List[Dict], seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    counts = np.array([len(q["options"]) for q in questions])
+    return (rng.random((rows, len(questions))) * counts).astype(np.int64)
+
+
+def synthetic_yes_no(rows: int, per_dosha: int = 10, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).random((rows, per_dosha * len(DOSHAS))) < 0.5
+
+
+def best_time(func: Callable[[], object], repeat: int) -> float:
+    """Return the fastest of `repeat` runs in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmarks(sizes: List[int], num_questions: int = 20, repeat: int = 5, seed: int = 0) -> Dict[str, Dict]:
+    """Run every benchmark and return {name: {"rows", "seconds", "us_per_row"}}"""
+    results: Dict[str, Dict] = {}
+
+    def record(name: str, rows: int, seconds: float):
+        results[name] = {"rows": rows, "seconds": seconds, "us_per_row": seconds / rows * 1e6 if rows else 0.0}
+
+    text = synthetic_question_text(num_questions, seed=seed)
+    questions = parse_questions(text)
+    agent = AyurvedaAgent(cache=AdviceCache(memory_size=0), backend=StubBackend())
+
+    # load_questions: cold parse and the shared cached bank
+    record("load_questions.parse", 1, best_time(lambda: parse_questions(text), repeat))
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False, encoding="utf-8") as file:
+        file.write(text)
+    try:
+        get_question_bank(file.name, artifact_path=None)
+        record("load_questions.cached", 1000,
+               best_time(lambda: [get_question_bank(file.name, artifact_path=None) for _ in range(1000)], repeat))
+    finally:
+        os.remove(file.name)
+
+    engine = ScoringEngine(questions)
+    yes_no_engine = YesNoScoringEngine([(dosha, 10) for dosha in DOSHAS])
+
+    for rows in sizes:
+        answers = synthetic_answers(rows, questions, seed)
+        yes_no = synthetic_yes_no(rows, seed=seed)
+        sample = min(rows, PER_ROW_CAP)
+        answer_lists = answers[:sample].tolist()
+        response_dicts = [
+            {dosha: row[i * 10:(i + 1) * 10] for i, dosha in enumerate(DOSHAS)}
+            for row in yes_no[:sample].tolist()
+        ]
+        scores = engine.score(answers[:sample])
+        score_dicts = [dict(zip(DOSHAS, row)) for row in scores.tolist()]
+        ranking = rank_doshas(scores)[:, :2].tolist()
+
+        record(f"calculate_dosha_scores.single[{rows}]", sample,
+               best_time(lambda: [score_answers(a, questions) for a in answer_lists], repeat))
+        record(f"calculate_dosha_scores.bulk[{rows}]", rows, best_time(lambda: engine.score(answers), repeat))
+        record(f"assess_dosha_constitution.single[{rows}]", sample,
+               best_time(lambda: [score_yes_no(r) for r in response_dicts], repeat))
+        record(f"assess_dosha_constitution.bulk[{rows}]", rows, best_time(lambda: yes_no_engine.score(yes_no), repeat))
+        record(f"get_user_assessment_summary[{rows}]", sample, best_time(
+            lambda: [get_user_assessment_summary(a, questions, s) for a, s in zip(answer_lists, score_dicts)], repeat))
+        # get_advice in streamlit_app delegates straight to render_advice
+        record(f"get_advice[{rows}]", sample, best_time(
+            lambda: [render_advice(DOSHAS[p], DOSHAS[s], d) for (p, s), d in zip(ranking, score_dicts)], repeat))
+        record(f"advice_prompt[{rows}]", sample, best_time(
+            lambda: [agent._advice_messages(agent._build_advice_prompt(d, "trouble sleeping")) for d in score_dicts],
+            repeat))
+
+    return results
+
+
+def run_import_benchmarks(repeat: int = 5) -> Dict[str, Dict]:
+    """Time each IMPORT_BENCHMARKS script in a fresh interpreter, keeping the fastest run"""
+    results: Dict[str, Dict] = {}
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    # Offline startup must not depend on (or pick up) a real key
+    env = {key: value for key, value in os.environ.items() if key != "OPENAI_API_KEY"}
+    for name, script in IMPORT_BENCHMARKS.items():
+        seconds = best_time(lambda: subprocess.run([sys.executable, "-c", script], cwd=cwd, env=env, check=True), repeat)
+        results[name] = {"rows": 1, "seconds": seconds, "us_per_row": seconds * 1e6}
+    return results
+
+
+def compare_results(current: Dict[str, Dict], baseline: Dict[str, Dict], default_threshold: float,
+                    thresholds: Dict[str, float]) -> List[str]:
+    """Return a message for every benchmark slower than baseline by more than its threshold"""
+    regressions = []
+    for name, result in current.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["us_per_row"]
+        after = result["us_per_row"]
+        threshold = next((value for prefix, value in thresholds.items() if name.startswith(prefix)), default_threshold)
+        if before > 0 and (after - before) / before > threshold:
+            regressions.append(f"{name}: {before:.3f} -> {after:.3f} us/row (+{(after - before) / before:.0%}, limit {threshold:.0%})")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run microbenchmarks and check for regressions")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Comma-separated submission counts (e.g. 10,1000,1000000)")
+    parser.add_argument("--questions", type=int, default=20, help="Questions in the synthetic bank")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per benchmark (fastest is kept)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-startup", action="store_true", help="Skip the cold-start import benchmarks")
+    parser.add_argument("--output", help="Write JSON results to this path")
+    parser.add_argument("--compare", help="Baseline JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed slowdown as a fraction of baseline (default 0.25)")
+    parser.add_argument("--benchmark-threshold", action="append", default=[], metavar="PREFIX=FRACTION",
+                        help="Override the threshold for benchmarks whose name starts with PREFIX")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    results = run_benchmarks(sizes, args.questions, args.repeat, args.seed)
+    if not args.skip_startup:
+        results.update(run_import_benchmarks(args.repeat))
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "questions": args.questions,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+    for name, result in results.items():
+        print(f"{name:<48}{result['rows']:>10}{result['seconds'] * 1000:>12.3f} ms{result['us_per_row']:>12.3f} us/row")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+        thresholds = {}
+        for override in args.benchmark_threshold:
+            prefix, _, value = override.partition("=")
+            thresholds[prefix] = float(value)
+        regressions = compare_results(results, baseline, args.threshold, thresholds)
+        if regressions:
+            print("\n❌ Regressions:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Assessment summaries and AI chat with the Ayurvedic expert
+"""
+
+from typing import Dict, Generator, List, Optional, Tuple
+
+from chat_memory import ChatMemory
+from guidelines import render_advice
+from knowledge_index import answer_from_guidelines
+from llm_backend import LLMBackend, as_backend
+from metrics import instrument
+from model_router import get_model_router, observe_latency
+from rate_limiter import INTERACTIVE, attempt_budget
+from resilience import CHAT_POLICY, resilient
+from semantic_cache import get_chat_cache
+
+def get_user_assessment_summary(answers: List[int], questions: List[Dict], scores: Dict[str, float]) -> str:
+    """Create a summary of the user's assessment for the AI"""
+    summary = "User's Ayurvedic Assessment Results:\n\n"
+    
+    # Add dosha scores
+    summary += f"Dosha Constitution:\n"
+    summary += f"- Vata: {scores['vata']:.1f}%\n"
+    summary += f"- Pitta: {scores['pitta']:.1f}%\n"
+    summary += f"- Kapha: {scores['kapha']:.1f}%\n\n"
+    
+    # Determine primary and secondary doshas
+    sorted_doshas = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    primary_dosha = sorted_doshas[0][0]
+    secondary_dosha = sorted_doshas[1][0]
+    
+    summary += f"Primary Constitution: {primary_dosha.title()} ({scores[primary_dosha]:.1f}%)\n"
+    summary += f"Secondary Constitution: {secondary_dosha.title()} ({scores[secondary_dosha]:.1f}%)\n\n"
+    
+    # Add specific answers
+    summary += "Assessment Responses:\n"
+    for i, (answer, question) in enumerate(zip(answers, questions)):
+        if answer is not None and answer < len(question['options']):
+            selected_option = question['options'][answer]
+            summary += f"Q{i+1}: {question['question']}\n"
+            summary += f"A: {selected_option['text']} ({selected_option['dosha'].title() if selected_option['dosha'] else 'Neutral'})\n\n"
+    
+    return summary
+
+# Bump when the chat prompt changes so cached answers from the old prompt are not reused
+CHAT_PROMPT_VERSION = 1
+CHAT_ERROR_MESSAGE = "I apologize, but I'm having trouble connecting to the AI service. Please try again later. Error: {error}"
+CHAT_FALLBACK_MESSAGE = "I can't reach the AI service right now, so here is the general guidance for your constitution while it recovers.\n\n"
+
+def chat_fallback_reply(error: Exception, scores: Optional[Dict[str, float]] = None) -> str:
+    """Reply used when the LLM fails: local constitution guidance if scores are known"""
+    if not scores:
+        return CHAT_ERROR_MESSAGE.format(error=str(error))
+    sorted_doshas = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    return CHAT_FALLBACK_MESSAGE + render_advice(sorted_doshas[0][0], sorted_doshas[1][0], scores)
+
+def build_chat_messages(user_message: str, assessment_summary: str, memory: Optional[ChatMemory] = None) -> List[Dict]:
+    """Build the chat completion messages for a user question, including bounded history"""
+    
+    system_prompt = f"""You are an expert Ayurvedic practitioner with deep knowledge of doshas, diet, lifestyle, and natural healing. 
+
+The user has completed an Ayurvedic dosha assessment. Here are their results:
+
+{assessment_summary}
+
+Based on this assessment, provide personalized, practical Ayurvedic advice. Consider their specific dosha constitution when answering questions about:
+- Diet and nutrition
+- Lifestyle and daily routine
+- Exercise recommendations
+- Stress management
+- Seasonal considerations
+- Specific health concerns
+
+Always provide practical, actionable advice that the user can implement in their daily life. Use modern language while respecting traditional Ayurvedic principles. Be encouraging and supportive in your responses."""
+
+    return [
+        {"role": "system", "content": system_prompt},
+        *(memory.history_messages() if memory else []),
+        {"role": "user", "content": user_message}
+    ]
+
+def chat_llm(llm: LLMBackend) -> LLMBackend:
+    """Wrap a backend (or an OpenAI client) for chat: metrics, then resilience charging budget per attempt"""
+    return instrument(resilient(observe_latency(as_backend(llm)), CHAT_POLICY, attempt_budget(INTERACTIVE)), "chat")
+
+def chat_cache_partition(scores: Optional[Dict[str, float]], memory: Optional[ChatMemory],
+                         model: str) -> Optional[str]:
+    """Answer cache partition for an opening question to model, or None when the cache does not apply.
+
+    Follow-up questions depend on the conversation so far and are never cached.
+    Each model has its own namespace, so short questions answered by the
+    cheap chat_simple model are never served for the full chat route.
+    """
+    if not scores or (memory is not None and memory.history_messages()):
+        return None
+    return get_chat_cache().partition(scores, f"{model}:v{CHAT_PROMPT_VERSION}")
+
+def chat_route(user_message: str, messages: List[Dict[str, str]]) -> Tuple[str, str]:
+    """Route name a chat turn takes and that route's primary model"""
+    router = get_model_router()
+    route = router.chat_route(user_message, messages)
+    return route, router.routes[route].model
+
+def chat_with_ai(llm: LLMBackend, user_message: str, assessment_summary: str, memory: Optional[ChatMemory] = None,
+                 scores: Optional[Dict[str, float]] = None) -> str:
+    """Chat with the AI Ayurvedic expert; llm may also be an openai.OpenAI client"""
+    # Common questions are answered from the guideline index without an LLM call
+    fast = answer_from_guidelines(user_message, scores)
+    if fast is not None:
+        if memory is not None:
+            memory.add_exchange(user_message, fast.text)
+        return fast.text
+    messages = build_chat_messages(user_message, assessment_summary, memory)
+    route, model = chat_route(user_message, messages)
+    partition = chat_cache_partition(scores, memory, model)
+    reply = get_chat_cache().get(user_message, partition) if partition else None
+    if reply is None:
+        call = get_model_router().select(route)
+        llm = chat_llm(llm)
+        try:
+            reply = llm.complete(messages, call.model, max_tokens=call.max_tokens).text
+        except Exception as e:
+            return chat_fallback_reply(e, scores)
+        if partition and not call.is_fallback:
+            get_chat_cache().set(user_message, partition, reply)
+    if memory is not None:
+        memory.add_exchange(user_message, reply)
+    return reply
+
+def stream_chat_with_ai(llm: LLMBackend, user_message: str, assessment_summary: str,
+                        memory: Optional[ChatMemory] = None,
+                        scores: Optional[Dict[str, float]] = None) -> Generator[str, None, str]:
+    """Chat with the AI Ayurvedic expert, yielding tokens as they arrive.
+
+    The generator's return value is the full reply text. Successful
+    exchanges are recorded in memory once the stream completes.
+    """
+    fast = answer_from_guidelines(user_message, scores)
+    if fast is not None:
+        yield fast.text
+        if memory is not None:
+            memory.add_exchange(user_message, fast.text)
+        return fast.text
+    messages = build_chat_messages(user_message, assessment_summary, memory)
+    route, model = chat_route(user_message, messages)
+    partition = chat_cache_partition(scores, memory, model)
+    cached = get_chat_cache().get(user_message, partition) if partition else None
+    if cached is not None:
+        yield cached
+        if memory is not None:
+            memory.add_exchange(user_message, cached)
+        return cached
+    call = get_model_router().select(route)
+    llm = chat_llm(llm)
+    tokens = []
+    try:
+        for token in llm.stream(messages, call.model, max_tokens=call.max_tokens):
+            tokens.append(token)
+            yield token
+    except Exception as e:
+        tokens.append(("\n\n" if tokens else "") + chat_fallback_reply(e, scores))
+        yield tokens[-1]
+        return "".join(tokens)
+    reply = "".join(tokens)
+    if partition and not call.is_fallback:
+        get_chat_cache().set(user_message, partition, reply)
+    if memory is not None:
+        memory.add_exchange(user_message, reply)
+    return reply
@@ -0,0 +1,110 @@
+"""
+Token-bounded conversation memory for the AI chat
+"""
+
+import math
+import re
+from typing import Callable, Dict, List, Optional
+
+# Rough average for English text with OpenAI tokenizers
+CHARS_PER_TOKEN = 4
+# Per-message framing overhead (role, separators) in chat completions
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of text without a tokenizer"""
+    if not text:
+        return 0
+    return max(math.ceil(len(text) / CHARS_PER_TOKEN), len(text.split()))
+
+
+def estimate_message_tokens(messages: List[Dict[str, str]]) -> int:
+    """Estimate the prompt tokens of a list of chat messages"""
+    return sum(estimate_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def _first_sentence(text: str, max_chars: int) -> str:
+    sentence = _SENTENCE_RE.split(' '.join(text.split()), maxsplit=1)[0]
+    if len(sentence) > max_chars:
+        sentence = sentence[:max_chars - 1].rstrip() + '…'
+    return sentence
+
+
+def summarize_exchange(user_message: str, reply: str, max_chars: int = 160) -> str:
+    """Compress one question/answer exchange into a single summary line"""
+    return f"- User asked: {_first_sentence(user_message, max_chars)} Expert: {_first_sentence(reply, max_chars)}"
+
+
+class ChatMemory:
+    """Recent chat turns plus a rolling summary of older ones, under a hard token budget.
+
+    Exchanges that no longer fit in window_tokens are folded into the summary;
+    the summary keeps its newest lines within summary_tokens. An optional
+    summarizer(previous_summary, evicted_messages) can replace the local
+    extractive summary, e.g. with an LLM call.
+    """
+
+    def __init__(self, window_tokens: int = 1200, summary_tokens: int = 300,
+                 summarizer: Optional[Callable[[str, List[Dict[str, str]]], str]] = None):
+        self.window_tokens = window_tokens
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer
+        self.turns: List[Dict[str, str]] = []
+        self.summary = ""
+
+    def add_exchange(self, user_message: str, reply: str):
+        """Record a completed user/assistant exchange"""
+        self.turns.append({"role": "user", "content": user_message})
+        self.turns.append({"role": "assistant", "content": reply})
+        self._compact()
+
+    def _compact(self):
+        evicted = []
+        # Drop whole exchanges so the window never starts with a dangling reply
+        while len(self.turns) > 2 and estimate_message_tokens(self.turns) > self.window_tokens:
+            evicted.extend(self.turns[:2])
+            del self.turns[:2]
+        # A single oversized exchange is truncated rather than kept whole
+        if estimate_message_tokens(self.turns) > self.window_tokens:
+            budget_chars = max(self.window_tokens // 2 - MESSAGE_OVERHEAD_TOKENS, 1) * CHARS_PER_TOKEN
+            for turn in self.turns:
+                turn["content"] = turn["content"][:budget_chars]
+        if evicted:
+            self._summarize(evicted)
+
+    def _summarize(self, evicted: List[Dict[str, str]]):
+        if self.summarizer:
+            summary = self.summarizer(self.summary, evicted)
+        else:
+            lines = self.summary.split('\n') if self.summary else []
+            for i in range(0, len(evicted) - 1, 2):
+                lines.append(summarize_exchange(evicted[i]["content"], evicted[i + 1]["content"]))
+            summary = '\n'.join(lines)
+
+        # Keep the newest summary lines within budget
+        lines = summary.split('\n')
+        while len(lines) > 1 and estimate_tokens('\n'.join(lines)) > self.summary_tokens:
+            lines.pop(0)
+        summary = '\n'.join(lines)
+        if estimate_tokens(summary) > self.summary_tokens:
+            summary = summary[-self.summary_tokens * CHARS_PER_TOKEN:]
+        self.summary = summary
+
+    def history_messages(self) -> List[Dict[str, str]]:
+        """Return the summary (as a system note) followed by the recent turns"""
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"})
+        messages.extend(dict(turn) for turn in self.turns)
+        return messages
+
+    def token_count(self) -> int:
+        """Estimated tokens the memory adds to a prompt"""
+        return estimate_message_tokens(self.history_messages())
+
+    def clear(self):
+        self.turns = []
+        self.summary = ""
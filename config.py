@@ -1,8 +1,9 @@
 import os
-import streamlit as st
 
 def setup_openai_api_key():
     """Setup OpenAI API key for the Streamlit app"""
+    # Imported here so CLI and batch users of this module never load Streamlit
+    import streamlit as st
     
     # Check if API key is already set
     api_key = os.getenv("OPENAI_API_KEY")
@@ -51,10 +52,52 @@ def setup_openai_api_key():
 
 def get_api_key_status():
     """Check if API key is available"""
+    import streamlit as st
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         try:
             api_key = st.secrets["OPENAI_API_KEY"]
         except:
             pass
-    return api_key is not None 
\ No newline at end of file
+    return api_key is not None
+
+
+# --- Model routing (used by model_router.py) ---
+# Each route has a model, its max_tokens, a p95 latency budget in seconds and
+# the model used instead while the route model's recent p95 is over budget.
+MODEL_ROUTES = {
+    "advice": {
+        "model": os.getenv("ADVICE_MODEL", "gpt-4"),
+        "max_tokens": int(os.getenv("ADVICE_MAX_TOKENS", "1000")),
+        "p95_budget_s": float(os.getenv("ADVICE_P95_BUDGET_S", "45")),
+        "fallback_model": os.getenv("ADVICE_FALLBACK_MODEL", "gpt-4o-mini"),
+    },
+    "chat": {
+        "model": os.getenv("CHAT_MODEL", "gpt-4"),
+        "max_tokens": int(os.getenv("CHAT_MAX_TOKENS", "500")),
+        "p95_budget_s": float(os.getenv("CHAT_P95_BUDGET_S", "20")),
+        "fallback_model": os.getenv("CHAT_FALLBACK_MODEL", "gpt-4o-mini"),
+    },
+    "chat_simple": {
+        "model": os.getenv("CHAT_SIMPLE_MODEL", "gpt-4o-mini"),
+        "max_tokens": int(os.getenv("CHAT_SIMPLE_MAX_TOKENS", "250")),
+        "p95_budget_s": float(os.getenv("CHAT_SIMPLE_P95_BUDGET_S", "10")),
+        "fallback_model": None,
+    },
+}
+
+# A chat turn goes to "chat_simple" when the question is short, the whole prompt
+# (system prompt, assessment summary and history) is small, and it asks for
+# nothing plan-like
+CHAT_SIMPLE_MAX_WORDS = int(os.getenv("CHAT_SIMPLE_MAX_WORDS", "20"))
+CHAT_SIMPLE_MAX_PROMPT_TOKENS = int(os.getenv("CHAT_SIMPLE_MAX_PROMPT_TOKENS", "1000"))
+CHAT_COMPLEX_TERMS = frozenset("""
+    plan plans regimen program protocol schedule detailed comprehensive full complete week weekly month monthly
+    compare comparison difference why explain step steps
+""".split())
+
+# Latency samples older than this many seconds are forgotten, so a model that
+# was over budget is tried again once its slow period has aged out
+ROUTE_LATENCY_WINDOW_S = float(os.getenv("ROUTE_LATENCY_WINDOW_S", "300"))
+# Fewer recent samples than this never trigger a fallback
+ROUTE_MIN_SAMPLES = int(os.getenv("ROUTE_MIN_SAMPLES", "10"))
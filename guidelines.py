@@ -0,0 +1,135 @@
+"""
+Ayurvedic constitution guidelines and precomputed advice renderings
+"""
+
+from itertools import product
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Tuple
+
+DOSHAS = ('vata', 'pitta', 'kapha')
+
+
+def freeze(value: Any) -> Any:
+    """Recursively turn dicts into read-only mappings and lists into tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+# Shared by every session and agent in the process, so it is read-only
+CONSTITUTION_GUIDELINES: Mapping[str, Mapping] = freeze({
+    "vata": {
+        "description": "Vata is composed of Air and Ether elements. Vata types are creative, quick-thinking, and adaptable but can be prone to anxiety and irregular habits.",
+        "diet": {
+            "favorable": ["Warm, cooked foods", "Sweet, sour, and salty tastes", "Ghee and oils", "Dairy products", "Nuts and seeds", "Root vegetables"],
+            "avoid": ["Cold, raw foods", "Bitter and astringent tastes", "Dry, light foods", "Carbonated drinks", "Caffeine"]
+        },
+        "lifestyle": {
+            "daily_routine": "Regular sleep schedule (10 PM - 6 AM), warm oil massage, gentle exercise like yoga and walking",
+            "exercise": "Gentle, grounding exercises like walking, swimming, tai chi, and restorative yoga",
+            "stress_management": "Meditation, deep breathing, warm baths, calming music"
+        }
+    },
+    "pitta": {
+        "description": "Pitta is composed of Fire and Water elements. Pitta types are intelligent, focused, and driven but can be prone to anger and inflammation.",
+        "diet": {
+            "favorable": ["Cooling foods", "Sweet, bitter, and astringent tastes", "Fresh vegetables", "Sweet fruits", "Dairy products", "Grains"],
+            "avoid": ["Hot, spicy foods", "Sour and salty tastes", "Fermented foods", "Alcohol", "Red meat", "Excessive oil"]
+        },
+        "lifestyle": {
+            "daily_routine": "Early to bed (10 PM), early to rise (6 AM), cooling practices, moderate exercise",
+            "exercise": "Moderate exercise like swimming, cycling, and cooling yoga practices",
+            "stress_management": "Cooling meditation, moon gazing, spending time in nature"
+        }
+    },
+    "kapha": {
+        "description": "Kapha is composed of Earth and Water elements. Kapha types are strong, loyal, and patient but can be prone to weight gain and lethargy.",
+        "diet": {
+            "favorable": ["Light, dry foods", "Bitter, pungent, and astringent tastes", "Honey", "Legumes", "Light vegetables", "Spices"],
+            "avoid": ["Heavy, oily foods", "Sweet, sour, and salty tastes", "Dairy products", "Cold foods", "Excessive water"]
+        },
+        "lifestyle": {
+            "daily_routine": "Early rising (6 AM), vigorous exercise, dry massage, stimulating practices",
+            "exercise": "Vigorous exercise like running, dancing, power yoga, and strength training",
+            "stress_management": "Stimulating activities, energizing music, social engagement"
+        }
+    }
+})
+
+# Second-person descriptions used on the advice page
+ADVICE_DESCRIPTIONS: Mapping[str, str] = MappingProxyType({
+    "vata": "Creative, quick-thinking, and adaptable. You tend to be energetic and imaginative but may experience anxiety and irregular habits.",
+    "pitta": "Intelligent, focused, and driven. You are goal-oriented and competitive but may be prone to anger and inflammation.",
+    "kapha": "Strong, loyal, and patient. You are dependable and nurturing but may be prone to weight gain and lethargy."
+})
+
+# Stand-ins for the two score values while rendering a template
+_PRIMARY_SCORE = "\x00primary\x00"
+_SECONDARY_SCORE = "\x00secondary\x00"
+
+
+def _render_advice(primary_dosha: str, secondary_dosha: str, primary_score: str, secondary_score: str) -> str:
+    """Render the advice page text with pre-formatted score strings"""
+    guidelines = CONSTITUTION_GUIDELINES[primary_dosha]
+
+    return f"""
+    ## Your Personalized Ayurvedic Guidance
+
+    ### Constitution Analysis
+    Your primary constitution is **{primary_dosha.title()}** ({primary_score}%),
+    with **{secondary_dosha.title()}** ({secondary_score}%) as your secondary influence.
+
+    **{ADVICE_DESCRIPTIONS[primary_dosha]}**
+
+    ### Dietary Recommendations
+
+    **Favor These Foods:**
+    {chr(10).join([f"• {food}" for food in guidelines['diet']['favorable']])}
+
+    **Avoid or Minimize:**
+    {chr(10).join([f"• {food}" for food in guidelines['diet']['avoid']])}
+
+    ### Lifestyle Recommendations
+
+    **Daily Routine:**
+    {guidelines['lifestyle']['daily_routine']}
+
+    **Exercise:**
+    {guidelines['lifestyle']['exercise']}
+
+    **Stress Management:**
+    {guidelines['lifestyle']['stress_management']}
+
+    ### Seasonal Considerations
+    As a {primary_dosha} type, pay special attention to balancing your constitution during seasonal changes.
+    Consider adjusting your diet and lifestyle practices accordingly.
+
+    ### Practical Tips
+    • Start with small changes and gradually incorporate these recommendations
+    • Listen to your body and adjust practices as needed
+    • Consider consulting with an Ayurvedic practitioner for personalized guidance
+    • Maintain consistency in your daily routine for best results
+    """
+
+
+def _build_advice_template(primary_dosha: str, secondary_dosha: str) -> Tuple[str, str, str]:
+    """Split a rendering into the static text around the two score values"""
+    text = _render_advice(primary_dosha, secondary_dosha, _PRIMARY_SCORE, _SECONDARY_SCORE)
+    before, rest = text.split(_PRIMARY_SCORE)
+    middle, after = rest.split(_SECONDARY_SCORE)
+    return before, middle, after
+
+
+# Static text for every (primary, secondary) pair, rendered once at import
+ADVICE_TEMPLATES: Dict[Tuple[str, str], Tuple[str, str, str]] = {
+    (primary, secondary): _build_advice_template(primary, secondary)
+    for primary, secondary in product(DOSHAS, DOSHAS)
+}
+
+
+def render_advice(primary_dosha: str, secondary_dosha: str, scores: Dict[str, float]) -> str:
+    """Fill the precomputed advice template for a profile with its scores"""
+    before, middle, after = ADVICE_TEMPLATES[(primary_dosha, secondary_dosha)]
+    return f"{before}{scores[primary_dosha]:.1f}{middle}{scores[secondary_dosha]:.1f}{after}"
@@ -0,0 +1,199 @@
+"""
+TF-IDF index over the constitution guidelines, used to answer common chat questions without the LLM
+"""
+
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from guidelines import ADVICE_DESCRIPTIONS, CONSTITUTION_GUIDELINES, DOSHAS
+from metrics import REGISTRY
+
+FAST_PATH_REQUESTS = REGISTRY.counter("ayurveda_chat_fast_path_total",
+                                      "Chat questions by where they were answered", ("outcome",))
+
+# Minimum share of the question's TF-IDF weight a passage must cover, and its
+# lead over the runner-up passage, for a local answer
+FAST_PATH_THRESHOLD = float(os.getenv("CHAT_FAST_PATH_THRESHOLD", "0.6"))
+FAST_PATH_MARGIN = float(os.getenv("CHAT_FAST_PATH_MARGIN", "0.2"))
+
+_WORD_RE = re.compile(r"[a-z]+")
+_STOPWORDS = frozenset("""
+    a about am an and any are as at be been being but by can could do does for from had has have how i if in
+    into is it its like me more most my of on or our please should so some such than that the their them then
+    there these they this to tell us want was we were what when where which while who why will with would you
+    your ok okay hi hello thanks thank know need dosha doshas constitution body type ayurveda ayurvedic
+    suit suits help helps better improve manage get make time right best good ideal up
+""".split())
+
+# Words people use for each topic, beyond those in the guideline text itself
+_TOPIC_TERMS: Dict[str, str] = {
+    "description": "mean meaning trait personality characteristic nature explain describe",
+    "favorable": "eat eating food foods diet meal meals breakfast lunch dinner snack nutrition favor",
+    "avoid": "eat food foods diet avoid bad worst reduce minimize limit cut stop skip harmful aggravate not never",
+    "daily_routine": "routine daily day schedule sleep wake morning evening night bedtime habit habits",
+    "exercise": "exercise exercises workout sport sports fitness train training gym activity active move",
+    "stress_management": "stress stressed anxiety anxious calm relax relaxation worry mind mental anger irritable meditate",
+}
+
+# A question containing one of these is never answered with the foods to favor
+_NEGATIONS = frozenset(("not", "never", "avoid", "t"))
+
+_TOPIC_TITLES = {
+    "daily_routine": "Daily routine",
+    "exercise": "Exercise",
+    "stress_management": "Stress management",
+}
+
+
+def _stem(word: str) -> str:
+    for suffix in ("ing", "ed", "s"):
+        if len(word) >= len(suffix) + 3 and word.endswith(suffix) and not word.endswith("ss"):
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, drop stopwords and dosha names, and crudely stem"""
+    return [_stem(word) for word in _WORD_RE.findall(text.lower())
+            if word not in _STOPWORDS and word not in DOSHAS]
+
+
+# A passage only answers a question that asks for its topic with one of these words,
+# so a condition that shares a word with the guidelines ("a cold", "cold foods")
+# cannot pull in a passage on its own; foods to avoid need a word of avoidance
+_TOPIC_INTENTS: Dict[str, frozenset] = {topic: frozenset(tokenize(terms)) for topic, terms in _TOPIC_TERMS.items()}
+_TOPIC_INTENTS["avoid"] -= _TOPIC_INTENTS["favorable"]
+
+
+def negation_terms(text: str) -> frozenset:
+    """Negating words in the text ("don't" counts through its "t")"""
+    return _NEGATIONS.intersection(_WORD_RE.findall(text.lower()))
+
+
+def mentioned_doshas(text: str) -> List[str]:
+    words = set(_WORD_RE.findall(text.lower()))
+    return [dosha for dosha in DOSHAS if dosha in words]
+
+
+class Passage:
+    """One indexed piece of guidance and the reply it produces"""
+
+    def __init__(self, dosha: str, topic: str, text: str, answer: str):
+        self.dosha = dosha
+        self.topic = topic
+        self.text = text
+        self.answer = answer
+
+
+class FastAnswer:
+    """A locally answered question; confidence is the share of the question the passage covers"""
+
+    def __init__(self, text: str, confidence: float, passage: Passage):
+        self.text = text
+        self.confidence = confidence
+        self.passage = passage
+
+
+def build_passages(guidelines: Mapping = CONSTITUTION_GUIDELINES,
+                   descriptions: Mapping = ADVICE_DESCRIPTIONS) -> List[Passage]:
+    """Split the guidelines into per-dosha, per-topic passages with ready-made answers"""
+    passages = []
+    for dosha, guide in guidelines.items():
+        name = dosha.title()
+        passages.append(Passage(dosha, "description", f"{guide['description']} {descriptions[dosha]}",
+                                f"{guide['description']}\n\n{descriptions[dosha]}"))
+        for topic, heading in (("favorable", "favor"), ("avoid", "avoid or minimize")):
+            foods = guide["diet"][topic]
+            passages.append(Passage(dosha, topic, " ".join(foods),
+                                    f"For a {name} constitution, {heading}:\n"
+                                    + "\n".join(f"• {food}" for food in foods)))
+        for topic, practice in guide["lifestyle"].items():
+            passages.append(Passage(dosha, topic, practice, f"**{_TOPIC_TITLES.get(topic, topic)} for {name}:** {practice}."))
+    return passages
+
+
+class GuidelineIndex:
+    """TF-IDF weighted inverted index over guideline passages, searched within one dosha at a time.
+
+    A passage's score is the share of the question's squared TF-IDF weight
+    carried by terms the passage contains, so words the index has never
+    seen (specific conditions, medications) pull confidence down.
+    """
+
+    def __init__(self, passages: Optional[List[Passage]] = None):
+        self.passages = passages if passages is not None else build_passages()
+        documents = [tokenize(f"{p.text} {_TOPIC_TERMS.get(p.topic, '')}") for p in self.passages]
+        document_frequency = Counter(term for terms in documents for term in set(terms))
+        count = len(documents)
+        self.idf = {term: math.log((1 + count) / (1 + df)) + 1 for term, df in document_frequency.items()}
+        # Unknown query words weigh as much as the rarest known word, diluting confidence
+        self.unknown_idf = math.log(1 + count) + 1
+        # term -> [(passage index, share of the credit for the term)]; the passage
+        # that repeats a term most gets full credit, others get less
+        self.postings: Dict[str, List[Tuple[int, float]]] = {}
+        for i, terms in enumerate(documents):
+            for term, tf in Counter(terms).items():
+                self.postings.setdefault(term, []).append((i, 1 + math.log(tf)))
+        for term, postings in self.postings.items():
+            top = max(weight for _, weight in postings)
+            self.postings[term] = [(i, weight / top) for i, weight in postings]
+
+    def search(self, question: str, dosha: str) -> List[Tuple[float, Passage]]:
+        """Return (score, passage) for the dosha's passages, best first"""
+        counts = Counter(tokenize(question))
+        weights = {term: ((1 + math.log(tf)) * self.idf.get(term, self.unknown_idf)) ** 2 for term, tf in counts.items()}
+        total = sum(weights.values())
+        scores = {i: 0.0 for i, passage in enumerate(self.passages) if passage.dosha == dosha}
+        for term, weight in weights.items():
+            for i, credit in self.postings.get(term, ()):
+                if i in scores:
+                    scores[i] += weight / total * credit
+        results = [(score, self.passages[i]) for i, score in scores.items()]
+        results.sort(key=lambda result: result[0], reverse=True)
+        return results
+
+    def answer(self, question: str, scores: Optional[Dict[str, float]] = None,
+               threshold: float = FAST_PATH_THRESHOLD, margin: float = FAST_PATH_MARGIN) -> Optional[FastAnswer]:
+        """Return a local answer when one passage clearly matches, otherwise None.
+
+        The dosha is the one named in the question, or else the user's
+        primary dosha; questions naming several doshas go to the LLM. Only
+        passages whose topic the question asks about are considered.
+        """
+        doshas = mentioned_doshas(question)
+        if len(doshas) > 1 or (not doshas and not scores):
+            return None
+        dosha = doshas[0] if doshas else max(scores, key=scores.get)
+        terms = set(tokenize(question))
+        results = [result for result in self.search(question, dosha)
+                   if result[1].topic not in _TOPIC_INTENTS or terms & _TOPIC_INTENTS[result[1].topic]]
+        if negation_terms(question):
+            results = [result for result in results if result[1].topic != "favorable"]
+        if not results:
+            return None
+        best, passage = results[0]
+        runner_up = results[1][0] if len(results) > 1 else 0.0
+        if best < threshold or best - runner_up < margin:
+            return None
+        return FastAnswer(passage.answer, best, passage)
+
+
+GUIDELINE_INDEX = GuidelineIndex()
+
+
+def answer_from_guidelines(question: str, scores: Optional[Dict[str, float]] = None) -> Optional[FastAnswer]:
+    """Try the local fast path for a chat question, counting whether it was served"""
+    answer = GUIDELINE_INDEX.answer(question, scores)
+    FAST_PATH_REQUESTS.inc(outcome="served" if answer else "llm")
+    return answer
+
+
+def fast_path_fraction() -> float:
+    """Return the fraction of chat questions answered from the local index"""
+    values = FAST_PATH_REQUESTS.values()
+    served = values.get(("served",), 0.0)
+    total = served + values.get(("llm",), 0.0)
+    return served / total if total else 0.0
@@ -0,0 +1,196 @@
+"""
+Pluggable LLM backends for advice generation and chat
+"""
+
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+# openai (and httpx) are imported on first client construction: importing
+# them costs several hundred milliseconds, which scoring-only and stub
+# users should not pay.
+
+# Connection pool shared by every session using a backend; tune for the host's concurrency
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+
+
+def connection_limits():
+    """Return the httpx pool limits for OpenAI clients, or None to use the SDK defaults"""
+    try:
+        import httpx
+    except ImportError:  # SDK builds without httpx keep their default pool limits
+        return None
+    return httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=KEEPALIVE_EXPIRY)
+
+
+class Completion:
+    """Text and token usage of a finished chat completion"""
+
+    def __init__(self, text: str, model: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+        self.text = text
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+
+class EmptyCompletionError(Exception):
+    """The upstream answered without any completion text (e.g. a content filter stop)"""
+
+
+class LLMBackend(ABC):
+    """Interface every chat completion provider implements"""
+
+    # Identifies the upstream in metrics and circuit breakers
+    name = "llm"
+
+    @abstractmethod
+    def complete(self, messages: List[Dict[str, str]], model: str, max_tokens: int,
+                 temperature: float = 0.7) -> Completion:
+        """Return the full completion for messages"""
+
+    @abstractmethod
+    def stream(self, messages: List[Dict[str, str]], model: str, max_tokens: int,
+               temperature: float = 0.7) -> Iterator[str]:
+        """Yield completion tokens as they arrive"""
+
+    @abstractmethod
+    async def acomplete(self, messages: List[Dict[str, str]], model: str, max_tokens: int,
+                        temperature: float = 0.7) -> Completion:
+        """Async variant of complete"""
+
+
+class OpenAIBackend(LLMBackend):
+    """OpenAI (or any OpenAI-compatible server via base_url / OPENAI_BASE_URL)
+
+    Pass client to reuse an existing openai.OpenAI client instead of building one.
+    """
+
+    name = "openai"
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 timeout: float = 60.0, max_retries: int = 2, client: Optional["OpenAI"] = None):
+        if client is not None:
+            api_key = api_key or client.api_key
+            base_url = base_url or (str(client.base_url) if client.base_url else None)
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        if client is None:
+            from openai import DefaultHttpxClient, OpenAI
+            limits = connection_limits()
+            client = OpenAI(api_key=self.api_key, base_url=self.base_url, timeout=timeout, max_retries=max_retries,
+                            http_client=DefaultHttpxClient(limits=limits) if limits else None)
+        self.client = client
+        self._async_client = None
+        self._async_lock = threading.Lock()
+
+    @property
+    def async_client(self) -> "AsyncOpenAI":
+        if self._async_client is None:
+            with self._async_lock:
+                if self._async_client is None:
+                    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+                    limits = connection_limits()
+                    self._async_client = AsyncOpenAI(
+                        api_key=self.api_key, base_url=self.base_url, timeout=self.timeout,
+                        max_retries=self.max_retries,
+                        http_client=DefaultAsyncHttpxClient(limits=limits) if limits else None,
+                    )
+        return self._async_client
+
+    @staticmethod
+    def _to_completion(response, model: str) -> Completion:
+        choice = response.choices[0] if response.choices else None
+        if choice is None or not choice.message.content:
+            reason = getattr(choice, "finish_reason", None)
+            raise EmptyCompletionError(f"{model} returned no completion text (finish_reason={reason})")
+        usage = response.usage
+        return Completion(
+            choice.message.content,
+            getattr(response, "model", None) or model,
+            usage.prompt_tokens if usage else 0,
+            usage.completion_tokens if usage else 0,
+        )
+
+    def complete(self, messages, model, max_tokens, temperature=0.7) -> Completion:
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        return self._to_completion(response, model)
+
+    def stream(self, messages, model, max_tokens, temperature=0.7) -> Iterator[str]:
+        stream = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True
+        )
+        empty = True
+        for chunk in stream:
+            token = chunk.choices[0].delta.content if chunk.choices else None
+            if token:
+                empty = False
+                yield token
+        if empty:
+            raise EmptyCompletionError(f"{model} streamed no completion text")
+
+    async def acomplete(self, messages, model, max_tokens, temperature=0.7) -> Completion:
+        response = await self.async_client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        return self._to_completion(response, model)
+
+
+def as_backend(llm) -> LLMBackend:
+    """Accept an LLMBackend, or an openai.OpenAI client as chat_with_ai took before backends existed"""
+    if isinstance(llm, LLMBackend):
+        return llm
+    if hasattr(llm, "chat") and hasattr(llm.chat, "completions"):
+        return OpenAIBackend(client=llm)
+    raise TypeError(f"Expected an LLMBackend or an OpenAI client, got {type(llm).__name__}")
+
+
+_backends: Dict[Tuple[str, Optional[str], Optional[str]], LLMBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_llm_backend(api_key: Optional[str] = None) -> LLMBackend:
+    """Return the process-wide backend selected by LLM_BACKEND ("openai" by default, or "stub").
+
+    Backends are shared per API key and base URL, so every session and
+    agent reuses one HTTP connection pool instead of opening its own.
+    SDK retries are disabled because callers wrap the backend in
+    resilience.ResilientBackend, which owns retries and deadlines.
+    """
+    kind = os.getenv("LLM_BACKEND", "openai").lower()
+    if kind == "stub":
+        key = (kind, None, None)
+    else:
+        key = (kind, api_key or os.getenv("OPENAI_API_KEY"), os.getenv("OPENAI_BASE_URL"))
+    backend = _backends.get(key)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(key)
+            if backend is None:
+                if kind == "stub":
+                    from llm_stub import StubBackend, StubConfig
+                    backend = StubBackend(StubConfig.from_env())
+                else:
+                    backend = OpenAIBackend(api_key=key[1], base_url=key[2], max_retries=0)
+                _backends[key] = backend
+    return backend
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Deterministic local LLM stand-in: an in-process backend and an OpenAI-compatible stub server
+"""
+
+import argparse
+import asyncio
+import hashlib
+import http.server
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from guidelines import CONSTITUTION_GUIDELINES
+from llm_backend import Completion, LLMBackend
+
+
+class StubError(Exception):
+    """Injected upstream failure carrying the HTTP status it simulates"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class StubConfig:
+    """Latency, throughput and failure profile of the simulated model.
+
+    Time to first token is drawn from latency_distribution ("fixed",
+    "uniform" or "lognormal") around ttft_ms; tokens then arrive at
+    tokens_per_second. error_rate of requests fail with error_status.
+    """
+
+    def __init__(self, ttft_ms: float = 300.0, jitter_ms: float = 100.0, latency_distribution: str = "lognormal",
+                 tokens_per_second: float = 50.0, error_rate: float = 0.0, error_status: int = 429,
+                 seed: Optional[int] = None, time_scale: float = 1.0):
+        self.ttft_ms = ttft_ms
+        self.jitter_ms = jitter_ms
+        self.latency_distribution = latency_distribution
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.seed = seed
+        # Multiplies every simulated delay; 0 disables sleeping entirely
+        self.time_scale = time_scale
+
+    @classmethod
+    def from_env(cls) -> "StubConfig":
+        seed = os.getenv("STUB_SEED")
+        return cls(
+            ttft_ms=float(os.getenv("STUB_TTFT_MS", "300")),
+            jitter_ms=float(os.getenv("STUB_JITTER_MS", "100")),
+            latency_distribution=os.getenv("STUB_LATENCY_DISTRIBUTION", "lognormal"),
+            tokens_per_second=float(os.getenv("STUB_TOKENS_PER_SECOND", "50")),
+            error_rate=float(os.getenv("STUB_ERROR_RATE", "0")),
+            error_status=int(os.getenv("STUB_ERROR_STATUS", "429")),
+            seed=int(seed) if seed else None,
+            time_scale=float(os.getenv("STUB_TIME_SCALE", "1")),
+        )
+
+
+class StubModel:
+    """Produces deterministic replies and simulated timings for a request"""
+
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._sentences = self._build_corpus()
+
+    @staticmethod
+    def _build_corpus() -> List[str]:
+        sentences = []
+        for dosha, guidelines in CONSTITUTION_GUIDELINES.items():
+            sentences.append(guidelines["description"])
+            sentences.append(f"For {dosha.title()}, favor {', '.join(guidelines['diet']['favorable']).lower()}.")
+            sentences.append(f"For {dosha.title()}, avoid {', '.join(guidelines['diet']['avoid']).lower()}.")
+            for practice in guidelines["lifestyle"].values():
+                sentences.append(practice + ".")
+        return sentences
+
+    def reply_tokens(self, messages: List[Dict[str, str]], max_tokens: int) -> List[str]:
+        """Return the reply for messages as word tokens; identical prompts get identical replies"""
+        digest = hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).digest()
+        rng = random.Random(digest)
+        words = []
+        while len(words) < max_tokens:
+            words.extend(rng.choice(self._sentences).split())
+            if rng.random() < 0.15:
+                break
+        words = words[:max_tokens]
+        return [word + " " for word in words[:-1]] + words[-1:]
+
+    def sample_ttft(self) -> float:
+        """Draw a time to first token in seconds"""
+        config = self.config
+        with self._lock:
+            if config.latency_distribution == "fixed":
+                ms = config.ttft_ms
+            elif config.latency_distribution == "uniform":
+                ms = self._rng.uniform(config.ttft_ms - config.jitter_ms, config.ttft_ms + config.jitter_ms)
+            else:
+                # Median ttft_ms; jitter_ms sets the spread and the tail is cut off at three sigma
+                sigma = math.log1p(config.jitter_ms / config.ttft_ms) if config.ttft_ms else 0.0
+                ms = config.ttft_ms * min(self._rng.lognormvariate(0.0, sigma), math.exp(3 * sigma))
+        return max(ms, 0.0) / 1000.0 * config.time_scale
+
+    def token_delay(self) -> float:
+        if self.config.tokens_per_second <= 0:
+            return 0.0
+        return self.config.time_scale / self.config.tokens_per_second
+
+    def maybe_fail(self):
+        """Raise StubError for the configured fraction of requests"""
+        with self._lock:
+            failed = self._rng.random() < self.config.error_rate
+        if failed:
+            raise StubError(self.config.error_status, f"Injected stub error ({self.config.error_status})")
+
+    def plan(self, messages: List[Dict[str, str]], max_tokens: int) -> Tuple[List[str], float, float, int]:
+        """Return (tokens, ttft seconds, per-token delay, prompt tokens), or raise an injected error"""
+        self.maybe_fail()
+        prompt_tokens = sum(len(m["content"].split()) for m in messages)
+        return self.reply_tokens(messages, max_tokens), self.sample_ttft(), self.token_delay(), prompt_tokens
+
+
+class StubBackend(LLMBackend):
+    """In-process backend that simulates an LLM without any network calls"""
+
+    name = "stub"
+
+    def __init__(self, config: Optional[StubConfig] = None):
+        self.model = StubModel(config or StubConfig())
+
+    def complete(self, messages, model, max_tokens, temperature=0.7) -> Completion:
+        tokens, ttft, delay, prompt_tokens = self.model.plan(messages, max_tokens)
+        time.sleep(ttft + delay * len(tokens))
+        return Completion("".join(tokens), model, prompt_tokens, len(tokens))
+
+    def stream(self, messages, model, max_tokens, temperature=0.7) -> Iterator[str]:
+        tokens, ttft, delay, _ = self.model.plan(messages, max_tokens)
+        time.sleep(ttft)
+        for i, token in enumerate(tokens):
+            if i and delay:
+                time.sleep(delay)
+            yield token
+
+    async def acomplete(self, messages, model, max_tokens, temperature=0.7) -> Completion:
+        tokens, ttft, delay, prompt_tokens = self.model.plan(messages, max_tokens)
+        await asyncio.sleep(ttft + delay * len(tokens))
+        return Completion("".join(tokens), model, prompt_tokens, len(tokens))
+
+
+# --- OpenAI-compatible stub server ---
+
+class StubRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Implements POST /v1/chat/completions, including SSE streaming"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    model: StubModel = None
+    quiet = True
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_invalid(self, status: int, message: str):
+        self._send_json(status, {"error": {"message": message, "type": "invalid_request_error"}})
+
+    def _read_request(self) -> Optional[Dict]:
+        """Parse the JSON request body, or answer 400 and return None"""
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+        except ValueError:
+            length = -1
+        if length < 0:
+            # The body cannot be delimited, so the connection cannot be reused
+            self.close_connection = True
+            self._send_invalid(400, "Invalid Content-Length")
+            return None
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_invalid(400, "Invalid JSON")
+            return None
+        if not isinstance(request, dict):
+            self._send_invalid(400, "Request body must be a JSON object")
+            return None
+        return request
+
+    def do_POST(self):
+        request = self._read_request()
+        if request is None:
+            return
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            self._send_invalid(404, "Not Found")
+            return
+
+        messages = request.get("messages", [])
+        model = request.get("model", "stub")
+        try:
+            max_tokens = int(request.get("max_tokens") or 256)
+        except (TypeError, ValueError):
+            self._send_invalid(400, "max_tokens must be an integer")
+            return
+        if not isinstance(messages, list) or not all(isinstance(m, dict) and isinstance(m.get("content"), str)
+                                                     for m in messages):
+            self._send_invalid(400, "messages must be a list of objects with string content")
+            return
+        try:
+            tokens, ttft, delay, prompt_tokens = self.model.plan(messages, max_tokens)
+        except StubError as e:
+            error_type = "rate_limit_exceeded" if e.status_code == 429 else "server_error"
+            self._send_json(e.status_code, {"error": {"message": str(e), "type": error_type, "code": error_type}})
+            return
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        time.sleep(ttft)
+
+        if not request.get("stream"):
+            time.sleep(delay * len(tokens))
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                          "total_tokens": prompt_tokens + len(tokens)},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta: Dict, finish_reason: Optional[str] = None):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        event({"role": "assistant", "content": ""})
+        for i, token in enumerate(tokens):
+            if i and delay:
+                time.sleep(delay)
+            event({"content": token})
+        event({}, "stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def create_stub_server(host: str = "127.0.0.1", port: int = 8100, config: Optional[StubConfig] = None,
+                       quiet: bool = True) -> http.server.ThreadingHTTPServer:
+    """Build an OpenAI-compatible stub server; point clients at http://host:port/v1"""
+    handler = type("BoundStubRequestHandler", (StubRequestHandler,), {
+        "model": StubModel(config or StubConfig()),
+        "quiet": quiet,
+    })
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an OpenAI-compatible stub LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--ttft-ms", type=float, default=300.0, help="Median time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=100.0, help="Spread of the latency distribution")
+    parser.add_argument("--latency-distribution", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=429, help="HTTP status of injected failures")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    config = StubConfig(args.ttft_ms, args.jitter_ms, args.latency_distribution, args.tokens_per_second,
+                        args.error_rate, args.error_status, args.seed)
+    with create_stub_server(args.host, args.port, config, quiet=not args.verbose) as httpd:
+        print(f"🧪 Stub LLM server running at http://{args.host}:{args.port}/v1")
+        print(f"   export OPENAI_BASE_URL=http://{args.host}:{args.port}/v1 OPENAI_API_KEY=stub")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            print(f"\n🛑 Server stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test: simulated users run questionnaire -> scoring -> advice -> chat
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+from advice_cache import AdviceCache
+from ayurveda_agent import ADVICE_FALLBACK_NOTICE, AyurvedaAgent
+from chat import CHAT_FALLBACK_MESSAGE, chat_with_ai, get_user_assessment_summary
+from chat_memory import ChatMemory
+from knowledge_index import fast_path_fraction
+from llm_backend import LLMBackend, OpenAIBackend
+from llm_stub import StubBackend, StubConfig, create_stub_server
+from question_bank import get_question_bank
+from scoring import score_answers
+
+STAGES = ("questionnaire", "scoring", "advice", "chat")
+
+SAMPLE_CONCERNS = ["", "trouble sleeping", "weight gain", "anxiety", "low energy", "digestion issues"]
+SAMPLE_QUESTIONS = [
+    "What should I eat for breakfast?",
+    "How can I improve my sleep?",
+    "Is ghee ok for me?",
+    "What exercise suits my constitution?",
+    "How should I adjust my routine in winter?",
+]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class StageRecorder:
+    """Thread-safe per-stage latency and error collection"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+        self.errors: Dict[str, int] = {stage: 0 for stage in STAGES}
+
+    def record(self, stage: str, seconds: float, error: bool = False):
+        with self._lock:
+            self.latencies[stage].append(seconds)
+            if error:
+                self.errors[stage] += 1
+
+    def report(self, elapsed: float) -> Dict[str, Dict[str, float]]:
+        report = {}
+        for stage in STAGES:
+            values = sorted(self.latencies[stage])
+            report[stage] = {
+                "count": len(values),
+                "errors": self.errors[stage],
+                "throughput_per_s": len(values) / elapsed if elapsed else 0.0,
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+            }
+        return report
+
+
+def simulate_user(user_id: int, agent: AyurvedaAgent, llm: LLMBackend, recorder: StageRecorder,
+                  sessions: int, chat_turns: int, seed: int):
+    """Run one simulated user through full assessment sessions"""
+    rng = random.Random(seed + user_id)
+    for _ in range(sessions):
+        start = time.perf_counter()
+        questions = get_question_bank().questions
+        answers = [rng.randrange(len(q["options"])) for q in questions]
+        recorder.record("questionnaire", time.perf_counter() - start)
+
+        start = time.perf_counter()
+        scores = score_answers(answers, questions)
+        summary = get_user_assessment_summary(answers, questions, scores)
+        recorder.record("scoring", time.perf_counter() - start)
+
+        start = time.perf_counter()
+        advice = agent.get_personalized_advice(scores, rng.choice(SAMPLE_CONCERNS))
+        recorder.record("advice", time.perf_counter() - start, advice.startswith(ADVICE_FALLBACK_NOTICE))
+
+        memory = ChatMemory()
+        for _ in range(chat_turns):
+            start = time.perf_counter()
+            reply = chat_with_ai(llm, rng.choice(SAMPLE_QUESTIONS), summary, memory, scores)
+            recorder.record("chat", time.perf_counter() - start, reply.startswith(CHAT_FALLBACK_MESSAGE))
+
+
+def run_load_test(llm: LLMBackend, users: int = 10, sessions: int = 5, chat_turns: int = 3,
+                  use_cache: bool = False, seed: int = 0) -> Dict:
+    """Drive `users` concurrent simulated users and return the per-stage report"""
+    cache = AdviceCache() if use_cache else AdviceCache(memory_size=0)
+    agent = AyurvedaAgent(cache=cache, backend=llm)
+    recorder = StageRecorder()
+    threads = [
+        threading.Thread(target=simulate_user, args=(i, agent, llm, recorder, sessions, chat_turns, seed))
+        for i in range(users)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "users": users,
+        "sessions_per_user": sessions,
+        "elapsed_s": elapsed,
+        "sessions_per_s": users * sessions / elapsed if elapsed else 0.0,
+        "stages": recorder.report(elapsed),
+        "chat_fast_path_fraction": fast_path_fraction(),
+    }
+
+
+def print_report(report: Dict):
+    print(f"\n📈 {report['users']} users x {report['sessions_per_user']} sessions in {report['elapsed_s']:.2f}s "
+          f"({report['sessions_per_s']:.1f} sessions/s)")
+    print(f"{'stage':<14}{'count':>8}{'errors':>8}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:<14}{stats['count']:>8}{stats['errors']:>8}{stats['throughput_per_s']:>10.1f}"
+              f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+    print(f"chat answered locally: {report['chat_fast_path_fraction']:.1%}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Load-test the assessment, advice and chat paths")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent simulated users")
+    parser.add_argument("--sessions", type=int, default=5, help="Assessments per user")
+    parser.add_argument("--chat-turns", type=int, default=3, help="Chat messages per assessment")
+    parser.add_argument("--backend", choices=["stub", "stub-server", "openai"], default="stub",
+                        help="stub: in-process; stub-server: local OpenAI-compatible HTTP stub; openai: OPENAI_BASE_URL/real API")
+    parser.add_argument("--ttft-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--latency-distribution", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--cache", action="store_true", help="Enable the advice cache")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the report to this path")
+    args = parser.parse_args(argv)
+
+    config = StubConfig(args.ttft_ms, args.jitter_ms, args.latency_distribution, args.tokens_per_second,
+                        args.error_rate, seed=args.seed)
+    stub_server = None
+    if args.backend == "stub":
+        llm = StubBackend(config)
+    elif args.backend == "stub-server":
+        stub_server = create_stub_server(port=0, config=config)
+        threading.Thread(target=stub_server.serve_forever, daemon=True).start()
+        host, port = stub_server.server_address[:2]
+        llm = OpenAIBackend(api_key="stub", base_url=f"http://{host}:{port}/v1")
+    else:
+        llm = OpenAIBackend()
+
+    try:
+        report = run_load_test(llm, args.users, args.sessions, args.chat_turns, args.cache, args.seed)
+    finally:
+        if stub_server:
+            stub_server.shutdown()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
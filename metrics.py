@@ -0,0 +1,270 @@
+"""
+Process-wide metrics for LLM calls and caches, rendered in Prometheus text format
+"""
+
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from chat_memory import estimate_message_tokens
+from llm_backend import Completion, LLMBackend
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+LabelKey = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def values(self) -> Dict[LabelKey, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value:g}"
+                for key, value in sorted(self.values().items())]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # key -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-1] += value
+
+    def values(self) -> Dict[LabelKey, List[float]]:
+        with self._lock:
+            return {key: list(state) for key, state in self._values.items()}
+
+    def summarize(self, state: List[float]) -> Dict[str, float]:
+        """Return count, mean and bucket-interpolated p50/p95/p99 for one label set"""
+        counts = state[:-1]
+        total = sum(counts)
+        summary = {"count": total, "mean": state[-1] / total if total else 0.0}
+        for q in (0.5, 0.95, 0.99):
+            target = q * total
+            cumulative = 0
+            lower = 0.0
+            estimate = self.buckets[-1] if total else 0.0
+            for i, count in enumerate(counts[:-1]):
+                if count and cumulative + count >= target:
+                    estimate = lower + (self.buckets[i] - lower) * (target - cumulative) / count
+                    break
+                cumulative += count
+                lower = self.buckets[i]
+            summary[f"p{int(q * 100)}"] = estimate
+        return summary
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, state in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = 'le="%g"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            cumulative += state[len(self.buckets)]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {state[-1]:g}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """A named set of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+LLM_REQUESTS = REGISTRY.counter("ayurveda_llm_requests_total", "LLM completion calls", ("call_site", "model", "outcome"))
+LLM_LATENCY = REGISTRY.histogram("ayurveda_llm_request_duration_seconds", "LLM completion latency", ("call_site", "model"))
+LLM_TTFT = REGISTRY.histogram("ayurveda_llm_time_to_first_token_seconds", "Time to first streamed token", ("call_site", "model"))
+LLM_PROMPT_TOKENS = REGISTRY.counter("ayurveda_llm_prompt_tokens_total", "Prompt tokens sent", ("call_site", "model"))
+LLM_COMPLETION_TOKENS = REGISTRY.counter("ayurveda_llm_completion_tokens_total", "Completion tokens received", ("call_site", "model"))
+LLM_ERRORS = REGISTRY.counter("ayurveda_llm_errors_total", "Failed LLM calls by exception class", ("call_site", "model", "error_class"))
+CACHE_REQUESTS = REGISTRY.counter("ayurveda_cache_requests_total", "Cache lookups", ("cache", "result"))
+HTTP_LATENCY = REGISTRY.histogram("ayurveda_http_request_duration_seconds", "HTTP API latency", ("route", "status"), FAST_BUCKETS)
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    """Count a cache hit or miss"""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_llm_call(call_site: str, model: str, latency: float, prompt_tokens: int = 0, completion_tokens: int = 0,
+                    ttft: Optional[float] = None, error: Optional[BaseException] = None):
+    """Record one LLM call's latency, token usage and outcome"""
+    LLM_LATENCY.observe(latency, call_site=call_site, model=model)
+    LLM_REQUESTS.inc(call_site=call_site, model=model, outcome="error" if error else "ok")
+    if ttft is not None:
+        LLM_TTFT.observe(ttft, call_site=call_site, model=model)
+    if prompt_tokens:
+        LLM_PROMPT_TOKENS.inc(prompt_tokens, call_site=call_site, model=model)
+    if completion_tokens:
+        LLM_COMPLETION_TOKENS.inc(completion_tokens, call_site=call_site, model=model)
+    if error is not None:
+        LLM_ERRORS.inc(call_site=call_site, model=model, error_class=type(error).__name__)
+
+
+def llm_summary() -> List[Dict]:
+    """Per call site and model: calls, errors, latency percentiles, TTFT and tokens"""
+    requests = LLM_REQUESTS.values()
+    prompt_tokens = LLM_PROMPT_TOKENS.values()
+    completion_tokens = LLM_COMPLETION_TOKENS.values()
+    ttfts = LLM_TTFT.values()
+    rows = []
+    for key, state in sorted(LLM_LATENCY.values().items()):
+        latency = LLM_LATENCY.summarize(state)
+        ttft = LLM_TTFT.summarize(ttfts[key]) if key in ttfts else None
+        rows.append({
+            "call_site": key[0],
+            "model": key[1],
+            "calls": int(latency["count"]),
+            "errors": int(requests.get(key + ("error",), 0)),
+            "p50_s": round(latency["p50"], 3),
+            "p95_s": round(latency["p95"], 3),
+            "mean_ttft_s": round(ttft["mean"], 3) if ttft else None,
+            "prompt_tokens": int(prompt_tokens.get(key, 0)),
+            "completion_tokens": int(completion_tokens.get(key, 0)),
+        })
+    return rows
+
+
+def cache_hit_rates() -> Dict[str, float]:
+    """Return the hit rate of every cache that has been looked up"""
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), value in CACHE_REQUESTS.values().items():
+        hits_total = totals.setdefault(cache, [0.0, 0.0])
+        hits_total[1] += value
+        if result == "hit":
+            hits_total[0] += value
+    return {cache: hits / total for cache, (hits, total) in totals.items() if total}
+
+
+class InstrumentedBackend(LLMBackend):
+    """Wraps a backend and records every call under a call site label"""
+
+    def __init__(self, backend: LLMBackend, call_site: str):
+        self.backend = backend
+        self.call_site = call_site
+        self.name = backend.name
+
+    def complete(self, messages, model, max_tokens, temperature=0.7) -> Completion:
+        start = time.perf_counter()
+        try:
+            completion = self.backend.complete(messages, model, max_tokens, temperature)
+        except Exception as e:
+            record_llm_call(self.call_site, model, time.perf_counter() - start, error=e)
+            raise
+        record_llm_call(self.call_site, model, time.perf_counter() - start,
+                        completion.prompt_tokens, completion.completion_tokens)
+        return completion
+
+    def stream(self, messages, model, max_tokens, temperature=0.7) -> Iterator[str]:
+        start = time.perf_counter()
+        ttft = None
+        # Streams carry no usage, so tokens are estimated locally
+        chunks = 0
+        try:
+            for token in self.backend.stream(messages, model, max_tokens, temperature):
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                chunks += 1
+                yield token
+        except Exception as e:
+            record_llm_call(self.call_site, model, time.perf_counter() - start,
+                            estimate_message_tokens(messages), chunks, ttft, error=e)
+            raise
+        record_llm_call(self.call_site, model, time.perf_counter() - start,
+                        estimate_message_tokens(messages), chunks, ttft)
+
+    async def acomplete(self, messages, model, max_tokens, temperature=0.7) -> Completion:
+        start = time.perf_counter()
+        try:
+            completion = await self.backend.acomplete(messages, model, max_tokens, temperature)
+        except Exception as e:
+            record_llm_call(self.call_site, model, time.perf_counter() - start, error=e)
+            raise
+        record_llm_call(self.call_site, model, time.perf_counter() - start,
+                        completion.prompt_tokens, completion.completion_tokens)
+        return completion
+
+
+def instrument(backend: LLMBackend, call_site: str) -> LLMBackend:
+    """Return backend wrapped for metrics under call_site, without double-wrapping"""
+    if isinstance(backend, InstrumentedBackend):
+        if backend.call_site == call_site:
+            return backend
+        backend = backend.backend
+    return InstrumentedBackend(backend, call_site)
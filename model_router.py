@@ -0,0 +1,210 @@
+"""
+Latency- and cost-aware model routing for advice and chat calls
+"""
+
+import re
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from chat_memory import estimate_message_tokens
+from llm_backend import Completion, LLMBackend
+from metrics import REGISTRY
+
+ROUTED_CALLS = REGISTRY.counter("ayurveda_llm_routed_total", "LLM calls by route, chosen model and reason",
+                                ("route", "model", "reason"))
+
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+class ModelRoute:
+    """A named kind of call: its model, max_tokens, p95 latency budget and fallback model"""
+
+    def __init__(self, name: str, model: str, max_tokens: int, p95_budget_s: Optional[float] = None,
+                 fallback_model: Optional[str] = None):
+        self.name = name
+        self.model = model
+        self.max_tokens = max_tokens
+        self.p95_budget_s = p95_budget_s
+        self.fallback_model = fallback_model
+
+
+class RoutedCall:
+    """The model and max_tokens chosen for one call"""
+
+    def __init__(self, route: str, model: str, max_tokens: int, reason: str = "primary"):
+        self.route = route
+        self.model = model
+        self.max_tokens = max_tokens
+        self.reason = reason
+
+    @property
+    def is_fallback(self) -> bool:
+        """Answers from a fallback model are not cached under the route model's namespace"""
+        return self.reason != "primary"
+
+
+class LatencyTracker:
+    """Recent call latencies per model, kept for window_s seconds"""
+
+    def __init__(self, window_s: float = 300.0, max_samples: int = 500):
+        self.window_s = window_s
+        self.max_samples = max_samples
+        self._samples: Dict[str, Deque[Tuple[float, float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, model: str, seconds: float):
+        now = time.monotonic()
+        with self._lock:
+            samples = self._samples.get(model)
+            if samples is None:
+                samples = self._samples[model] = deque(maxlen=self.max_samples)
+            samples.append((now, seconds))
+
+    def recent(self, model: str) -> List[float]:
+        """Latencies observed for model within the window, oldest first"""
+        cutoff = time.monotonic() - self.window_s
+        with self._lock:
+            samples = self._samples.get(model)
+            if not samples:
+                return []
+            while samples and samples[0][0] < cutoff:
+                samples.popleft()
+            return [seconds for _, seconds in samples]
+
+    def p95(self, model: str, min_samples: int = 1) -> Optional[float]:
+        """Nearest-rank p95 of recent latencies, or None with fewer than min_samples"""
+        latencies = sorted(self.recent(model))
+        if not latencies or len(latencies) < min_samples:
+            return None
+        return latencies[min(int(0.95 * len(latencies)), len(latencies) - 1)]
+
+
+class ModelRouter:
+    """Picks the model and max_tokens for each call.
+
+    Chat turns that are short, have a small prompt and ask for nothing
+    plan-like take the cheap "chat_simple" route; other chat turns take
+    "chat" and advice takes "advice". A route whose model's recent p95
+    latency is over its budget sends calls to its fallback model until
+    the slow samples age out of the latency window.
+    """
+
+    def __init__(self, routes: Dict[str, ModelRoute], tracker: Optional[LatencyTracker] = None,
+                 min_samples: int = 10, simple_max_words: int = 20, simple_max_prompt_tokens: int = 1000,
+                 complex_terms: frozenset = frozenset()):
+        self.routes = routes
+        self.tracker = tracker or LatencyTracker()
+        self.min_samples = min_samples
+        self.simple_max_words = simple_max_words
+        self.simple_max_prompt_tokens = simple_max_prompt_tokens
+        self.complex_terms = complex_terms
+
+    def select(self, route_name: str) -> RoutedCall:
+        """Return the call settings for a route, falling back when its model is over budget"""
+        route = self.routes[route_name]
+        model, reason = route.model, "primary"
+        if route.fallback_model and route.p95_budget_s is not None:
+            p95 = self.tracker.p95(route.model, self.min_samples)
+            if p95 is not None and p95 > route.p95_budget_s:
+                model, reason = route.fallback_model, "latency_fallback"
+        ROUTED_CALLS.inc(route=route.name, model=model, reason=reason)
+        return RoutedCall(route.name, model, route.max_tokens, reason)
+
+    def is_simple_chat(self, user_message: str, messages: List[Dict[str, str]]) -> bool:
+        """Short question, small prompt, and no plan-like request"""
+        words = _WORD_RE.findall(user_message.lower())
+        return (len(words) <= self.simple_max_words
+                and not self.complex_terms.intersection(words)
+                and estimate_message_tokens(messages) <= self.simple_max_prompt_tokens)
+
+    def chat_route(self, user_message: str, messages: List[Dict[str, str]]) -> str:
+        """Name of the route a chat turn takes, by its length and content"""
+        simple = "chat_simple" in self.routes and self.is_simple_chat(user_message, messages)
+        return "chat_simple" if simple else "chat"
+
+    def route_chat(self, user_message: str, messages: List[Dict[str, str]]) -> RoutedCall:
+        """Route a chat turn by its length and content"""
+        return self.select(self.chat_route(user_message, messages))
+
+    def observe(self, model: str, seconds: float):
+        self.tracker.observe(model, seconds)
+
+    def stats(self) -> List[Dict]:
+        """Per route: models, budget, recent p95 and whether calls are currently falling back"""
+        rows = []
+        for route in self.routes.values():
+            p95 = self.tracker.p95(route.model)
+            rows.append({
+                "route": route.name,
+                "model": route.model,
+                "fallback_model": route.fallback_model,
+                "max_tokens": route.max_tokens,
+                "p95_budget_s": route.p95_budget_s,
+                "p95_s": round(p95, 3) if p95 is not None else None,
+                "samples": len(self.tracker.recent(route.model)),
+                "falling_back": bool(route.fallback_model and route.p95_budget_s is not None
+                                     and (self.tracker.p95(route.model, self.min_samples) or 0.0) > route.p95_budget_s),
+            })
+        return rows
+
+
+class LatencyObservingBackend(LLMBackend):
+    """Reports the latency of successful upstream calls to a router.
+
+    Failed calls are not recorded: an error that returns at once would
+    otherwise pull the p95 down and hide a model that is slow when it works.
+    """
+
+    def __init__(self, backend: LLMBackend, router: ModelRouter):
+        self.backend = backend
+        self.router = router
+        self.name = backend.name
+
+    def complete(self, messages, model, max_tokens, temperature=0.7) -> Completion:
+        start = time.perf_counter()
+        completion = self.backend.complete(messages, model, max_tokens, temperature)
+        self.router.observe(model, time.perf_counter() - start)
+        return completion
+
+    def stream(self, messages, model, max_tokens, temperature=0.7) -> Iterator[str]:
+        start = time.perf_counter()
+        yield from self.backend.stream(messages, model, max_tokens, temperature)
+        self.router.observe(model, time.perf_counter() - start)
+
+    async def acomplete(self, messages, model, max_tokens, temperature=0.7) -> Completion:
+        start = time.perf_counter()
+        completion = await self.backend.acomplete(messages, model, max_tokens, temperature)
+        self.router.observe(model, time.perf_counter() - start)
+        return completion
+
+
+def observe_latency(backend: LLMBackend, router: Optional["ModelRouter"] = None) -> LLMBackend:
+    """Return backend wrapped to feed the router's latency window, without double-wrapping"""
+    if isinstance(backend, LatencyObservingBackend):
+        return backend
+    return LatencyObservingBackend(backend, router or get_model_router())
+
+
+_default_router: Optional[ModelRouter] = None
+_default_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """Return the process-wide router built from the routes in config.py"""
+    global _default_router
+    if _default_router is None:
+        with _default_lock:
+            if _default_router is None:
+                import config
+                routes = {name: ModelRoute(name, **settings) for name, settings in config.MODEL_ROUTES.items()}
+                _default_router = ModelRouter(
+                    routes,
+                    LatencyTracker(config.ROUTE_LATENCY_WINDOW_S),
+                    min_samples=config.ROUTE_MIN_SAMPLES,
+                    simple_max_words=config.CHAT_SIMPLE_MAX_WORDS,
+                    simple_max_prompt_tokens=config.CHAT_SIMPLE_MAX_PROMPT_TOKENS,
+                    complex_terms=config.CHAT_COMPLEX_TERMS,
+                )
+    return _default_router
@@ -0,0 +1,165 @@
+"""
+Process-wide compiled question bank for the Ayurveda assessment
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+QUESTIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'questions.txt')
+
+# Optional precompiled artifact so cold starts can skip parsing
+QUESTION_BANK_ARTIFACT = os.getenv("QUESTION_BANK_ARTIFACT")
+
+QUESTION_RE = re.compile(r'<Question (\d+)>(.*?)</Question \1>')
+OPTION_RE = re.compile(r'<Option (\d+)>(.*?)</Option \1>')
+DOSHA_RE = re.compile(r'\((Vata|Pitta|Kapha)\)$')
+SUFFIX_RE = re.compile(r'\([^)]+\)$')
+
+
+def parse_questions(text: str) -> List[Dict]:
+    """Parse questions.txt content into a list of question dicts"""
+    questions = []
+    current_question = None
+    current_options = []
+
+    for line in text.split('\n'):
+        trimmed_line = line.strip()
+        if not trimmed_line:
+            continue
+
+        # Check for question
+        question_match = QUESTION_RE.match(trimmed_line)
+        if question_match:
+            # Save previous question if exists
+            if current_question:
+                questions.append({
+                    'question': current_question,
+                    'options': current_options
+                })
+
+            current_question = question_match.group(2)
+            current_options = []
+            continue
+
+        # Check for option
+        option_match = OPTION_RE.match(trimmed_line)
+        if option_match:
+            option_text = option_match.group(2)
+            dosha_match = DOSHA_RE.search(option_text)
+            dosha = dosha_match.group(1).lower() if dosha_match else None
+
+            current_options.append({
+                'text': SUFFIX_RE.sub('', option_text).strip(),
+                'dosha': dosha
+            })
+
+    # Add the last question
+    if current_question:
+        questions.append({
+            'question': current_question,
+            'options': current_options
+        })
+
+    return questions
+
+
+class QuestionBank:
+    """Parsed question bank plus the file identity it was built from"""
+
+    def __init__(self, questions: List[Dict], version: str, path: str, mtime_ns: int, size: int):
+        self.questions = questions
+        self.version = version
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+
+
+_banks: Dict[str, QuestionBank] = {}
+_lock = threading.Lock()
+
+
+def _content_version(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def _load_artifact(artifact_path: str, version: str) -> Optional[List[Dict]]:
+    """Return precompiled questions if the artifact matches this version"""
+    try:
+        with open(artifact_path, 'r', encoding='utf-8') as file:
+            artifact = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if artifact.get('version') != version:
+        return None
+    return artifact.get('questions')
+
+
+def _save_artifact(artifact_path: str, version: str, questions: List[Dict]):
+    """Write the artifact atomically so concurrent workers never read half a file"""
+    tmp_path = f"{artifact_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'version': version, 'questions': questions}, file)
+        os.replace(tmp_path, artifact_path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def get_question_bank(path: str = QUESTIONS_FILE, artifact_path: Optional[str] = QUESTION_BANK_ARTIFACT) -> QuestionBank:
+    """Return the shared question bank, reparsing only when the file changes.
+
+    The returned questions are shared by every caller in the process and
+    must be treated as read-only. Raises FileNotFoundError if the file is missing.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    bank = _banks.get(path)
+    if bank and bank.mtime_ns == stat.st_mtime_ns and bank.size == stat.st_size:
+        return bank
+
+    with _lock:
+        bank = _banks.get(path)
+        if bank and bank.mtime_ns == stat.st_mtime_ns and bank.size == stat.st_size:
+            return bank
+
+        with open(path, 'rb') as file:
+            data = file.read()
+        version = _content_version(data)
+
+        # Touched but unchanged: keep the compiled bank, refresh the identity
+        if bank and bank.version == version:
+            questions = bank.questions
+        else:
+            questions = _load_artifact(artifact_path, version) if artifact_path else None
+            if questions is None:
+                questions = parse_questions(data.decode('utf-8'))
+                if artifact_path:
+                    _save_artifact(artifact_path, version, questions)
+
+        bank = QuestionBank(questions, version, path, stat.st_mtime_ns, stat.st_size)
+        _banks[path] = bank
+        return bank
+
+
+def compile_question_bank(path: str = QUESTIONS_FILE, artifact_path: str = 'questions.json') -> QuestionBank:
+    """Parse the question bank and write the precompiled artifact"""
+    with open(path, 'rb') as file:
+        data = file.read()
+    version = _content_version(data)
+    questions = parse_questions(data.decode('utf-8'))
+    _save_artifact(artifact_path, version, questions)
+    stat = os.stat(path)
+    return QuestionBank(questions, version, os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+if __name__ == "__main__":
+    import sys
+
+    output = sys.argv[1] if len(sys.argv) > 1 else 'questions.json'
+    bank = compile_question_bank(artifact_path=output)
+    print(f"📦 Compiled {len(bank.questions)} questions (version {bank.version}) to {output}")
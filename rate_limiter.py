@@ -0,0 +1,283 @@
+"""
+Token-bucket RPM/TPM limiting and prioritization for LLM calls, optionally shared across processes
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from metrics import REGISTRY
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+RATE_LIMIT_WAIT = REGISTRY.histogram("ayurveda_rate_limit_wait_seconds", "Time spent waiting for LLM budget", ("priority",))
+RATE_LIMIT_REJECTED = REGISTRY.counter("ayurveda_rate_limit_rejected_total", "LLM calls refused by the rate limiter",
+                                       ("priority", "reason"))
+
+# (bucket name, capacity, refill per second, cost, level that must remain afterwards)
+BucketRequest = Tuple[str, float, float, float, float]
+
+
+class RateLimitExceeded(Exception):
+    """The call was refused locally: the queue is full or budget did not free up in time"""
+
+
+def _take(levels: Dict[str, Tuple[float, float]], requests: List[BucketRequest],
+          now: float) -> Tuple[Dict[str, Tuple[float, float]], float]:
+    """Refill and try to debit every bucket at once.
+
+    Returns the updated levels and 0.0 on success, or the unchanged levels
+    and the seconds until the request could next succeed.
+    """
+    refilled = {}
+    wait = 0.0
+    for name, capacity, rate, cost, floor in requests:
+        level, updated = levels.get(name, (capacity, now))
+        level = min(capacity, level + rate * max(0.0, now - updated))
+        refilled[name] = level
+        # A request larger than the bucket may still go once the bucket is full
+        needed = min(cost + floor, capacity)
+        if level < needed:
+            wait = max(wait, (needed - level) / rate if rate > 0 else float("inf"))
+    if wait > 0:
+        return levels, wait
+    updated_levels = dict(levels)
+    for name, capacity, rate, cost, floor in requests:
+        updated_levels[name] = (refilled[name] - cost, now)
+    return updated_levels, 0.0
+
+
+class MemoryBucketStore:
+    """Bucket levels for a single process"""
+
+    def __init__(self):
+        self._levels: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, requests: List[BucketRequest]) -> float:
+        with self._lock:
+            self._levels, wait = _take(self._levels, requests, time.time())
+        return wait
+
+    def refund(self, name: str, amount: float, capacity: float):
+        with self._lock:
+            if name in self._levels:
+                level, updated = self._levels[name]
+                self._levels[name] = (min(capacity, level + amount), updated)
+
+
+class SQLiteBucketStore:
+    """Bucket levels in a SQLite file, so every process on the host draws from one budget"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, requests: List[BucketRequest]) -> float:
+        conn = self._connect()
+        names = [request[0] for request in requests]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                f"SELECT name, level, updated FROM buckets WHERE name IN ({','.join('?' * len(names))})", names
+            ).fetchall()
+            levels = {name: (level, updated) for name, level, updated in rows}
+            updated_levels, wait = _take(levels, requests, time.time())
+            if wait == 0:
+                conn.executemany("INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)",
+                                 [(name, *updated_levels[name]) for name in names])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def refund(self, name: str, amount: float, capacity: float):
+        conn = self._connect()
+        conn.execute("UPDATE buckets SET level = MIN(?, level + ?) WHERE name = ?", (capacity, amount, name))
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets per model.
+
+    Each call reserves one request and its estimated prompt tokens plus
+    max_tokens; unused tokens are refunded once the real size is known.
+    Batch calls leave batch_reserve of each bucket for interactive calls,
+    which keeps that priority across processes sharing a SQLite store.
+    Callers beyond max_queue waiters, or waiting longer than max_wait
+    seconds, get RateLimitExceeded.
+    """
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None, store=None,
+                 max_queue: int = 64, max_wait: float = 30.0, batch_reserve: float = 0.2):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.store = store or MemoryBucketStore()
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.batch_reserve = batch_reserve
+        self.waiting = 0
+        self._lock = threading.Lock()
+
+    def _requests(self, model: str, tokens: float, priority: int) -> List[BucketRequest]:
+        requests = []
+        for kind, limit, cost in (("requests", self.rpm, 1.0), ("tokens", self.tpm, tokens)):
+            if limit:
+                floor = limit * self.batch_reserve if priority >= BATCH else 0.0
+                requests.append((f"{model}:{kind}", limit, limit / 60.0, cost, floor))
+        return requests
+
+    def _enqueue(self, priority: int):
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                RATE_LIMIT_REJECTED.inc(priority=PRIORITY_NAMES[priority], reason="queue_full")
+                raise RateLimitExceeded(f"LLM queue is full ({self.max_queue} waiting)")
+            self.waiting += 1
+
+    def _dequeue(self):
+        with self._lock:
+            self.waiting -= 1
+
+    def _give_up(self, priority: int, start: float, wait: float, max_wait: float):
+        if time.monotonic() - start + wait > max_wait:
+            RATE_LIMIT_REJECTED.inc(priority=PRIORITY_NAMES[priority], reason="timeout")
+            raise RateLimitExceeded(f"LLM budget not available within {max_wait:g}s")
+
+    def acquire(self, model: str, tokens: float, priority: int = INTERACTIVE, max_wait: Optional[float] = None):
+        """Block until the call fits the budget, for at most max_wait (capped at the limiter's max_wait)"""
+        max_wait = self.max_wait if max_wait is None else min(max_wait, self.max_wait)
+        requests = self._requests(model, tokens, priority)
+        if not requests:
+            return
+        start = time.monotonic()
+        self._enqueue(priority)
+        try:
+            while True:
+                wait = self.store.take(requests)
+                if wait == 0:
+                    break
+                self._give_up(priority, start, wait, max_wait)
+                # Re-check often enough to notice budget refunded by other callers
+                time.sleep(min(wait, 0.25))
+        finally:
+            self._dequeue()
+        RATE_LIMIT_WAIT.observe(time.monotonic() - start, priority=PRIORITY_NAMES[priority])
+
+    async def aacquire(self, model: str, tokens: float, priority: int = INTERACTIVE,
+                       max_wait: Optional[float] = None):
+        """Async variant of acquire"""
+        max_wait = self.max_wait if max_wait is None else min(max_wait, self.max_wait)
+        requests = self._requests(model, tokens, priority)
+        if not requests:
+            return
+        start = time.monotonic()
+        self._enqueue(priority)
+        try:
+            while True:
+                wait = self.store.take(requests)
+                if wait == 0:
+                    break
+                self._give_up(priority, start, wait, max_wait)
+                await asyncio.sleep(min(wait, 0.25))
+        finally:
+            self._dequeue()
+        RATE_LIMIT_WAIT.observe(time.monotonic() - start, priority=PRIORITY_NAMES[priority])
+
+    def try_acquire(self, model: str, tokens: float, priority: int = INTERACTIVE) -> bool:
+        """Take the budget only if it is available now"""
+        requests = self._requests(model, tokens, priority)
+        return not requests or self.store.take(requests) == 0
+
+    def settle(self, model: str, reserved: float, used: float):
+        """Return reserved tokens that the call did not use"""
+        if self.tpm and reserved > used:
+            self.store.refund(f"{model}:tokens", reserved - used, self.tpm)
+
+    def refund_request(self, model: str):
+        """Return the request slot of a call that never reached the upstream"""
+        if self.rpm:
+            self.store.refund(f"{model}:requests", 1.0, self.rpm)
+
+
+class AttemptBudget:
+    """A limiter and priority that resilience.ResilientBackend charges for every upstream attempt.
+
+    The first attempt, each retry and each hedge reserves one request plus
+    its estimated prompt tokens and max_tokens. Reservations are taken on
+    the caller's thread before the attempt starts, bounded by the call's
+    remaining deadline, so waiting never counts against the attempt
+    timeout or the circuit breaker. Hedges are only sent when budget is
+    free at once.
+    """
+
+    def __init__(self, limiter: RateLimiter, priority: int = INTERACTIVE):
+        self.limiter = limiter
+        self.priority = priority
+
+    def acquire(self, model: str, tokens: float, max_wait: float):
+        self.limiter.acquire(model, tokens, self.priority, max_wait)
+
+    async def aacquire(self, model: str, tokens: float, max_wait: float):
+        await self.limiter.aacquire(model, tokens, self.priority, max_wait)
+
+    def try_acquire(self, model: str, tokens: float) -> bool:
+        return self.limiter.try_acquire(model, tokens, self.priority)
+
+    def settle(self, model: str, reserved: float, used: float = 0.0, reached_upstream: bool = True):
+        """Refund the tokens an attempt did not use, and its request if it never reached the upstream"""
+        self.limiter.settle(model, reserved, used)
+        if not reached_upstream:
+            self.limiter.refund_request(model)
+
+
+_default_limiter: Optional[RateLimiter] = None
+_default_lock = threading.Lock()
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """Return the process-wide limiter configured from the environment, or None when no limit is set.
+
+    LLM_RPM_LIMIT / LLM_TPM_LIMIT set the budget; LLM_RATE_LIMIT_DB shares
+    it through a SQLite file with every other process using the same path.
+    """
+    global _default_limiter
+    rpm = float(os.getenv("LLM_RPM_LIMIT", "0"))
+    tpm = float(os.getenv("LLM_TPM_LIMIT", "0"))
+    if not rpm and not tpm:
+        return None
+    if _default_limiter is None:
+        with _default_lock:
+            if _default_limiter is None:
+                path = os.getenv("LLM_RATE_LIMIT_DB")
+                _default_limiter = RateLimiter(
+                    rpm=rpm,
+                    tpm=tpm,
+                    store=SQLiteBucketStore(path) if path else MemoryBucketStore(),
+                    max_queue=int(os.getenv("LLM_RATE_LIMIT_MAX_QUEUE", "64")),
+                    max_wait=float(os.getenv("LLM_RATE_LIMIT_MAX_WAIT", "30")),
+                    batch_reserve=float(os.getenv("LLM_RATE_LIMIT_BATCH_RESERVE", "0.2")),
+                )
+    return _default_limiter
+
+
+def attempt_budget(priority: int = INTERACTIVE, limiter: Optional[RateLimiter] = None) -> Optional[AttemptBudget]:
+    """Return the budget for resilient() at this priority (default limiter if not given), or None without limits"""
+    limiter = limiter or get_rate_limiter()
+    if limiter is None:
+        return None
+    return AttemptBudget(limiter, priority)
@@ -0,0 +1,471 @@
+"""
+Deadlines, jittered retries, hedged requests and circuit breaking for LLM calls
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, Optional
+
+from chat_memory import estimate_message_tokens, estimate_tokens
+from llm_backend import Completion, EmptyCompletionError, LLMBackend
+from metrics import REGISTRY
+from rate_limiter import RateLimitExceeded
+
+if TYPE_CHECKING:
+    from rate_limiter import AttemptBudget
+
+LLM_RETRIES = REGISTRY.counter("ayurveda_llm_retries_total", "LLM call attempts retried", ("upstream",))
+LLM_HEDGES = REGISTRY.counter("ayurveda_llm_hedges_total", "Hedged LLM requests sent", ("upstream",))
+CIRCUIT_OPENED = REGISTRY.counter("ayurveda_circuit_opened_total", "Times a circuit breaker opened", ("upstream",))
+CIRCUIT_REJECTED = REGISTRY.counter("ayurveda_circuit_rejected_total", "Calls rejected by an open circuit", ("upstream",))
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+# Blocking calls run here so a stalled upstream cannot hold the caller past its deadline
+_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="llm-call")
+# Calls abandoned at their deadline keep running on _executor; past this many, no new calls start
+MAX_OVERDUE_CALLS = 16
+
+
+class DeadlineExceeded(TimeoutError):
+    """An LLM call did not finish within its deadline"""
+
+
+class CircuitOpenError(Exception):
+    """The upstream is marked unhealthy; the call was not attempted"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Timeouts, connection failures, rate limits and 5xx responses are worth retrying"""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    # openai.APIConnectionError / APITimeoutError carry no status code
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def is_transient(error: BaseException) -> bool:
+    """Throttling, an open circuit, an exhausted retry budget or an empty answer: the same prompt may succeed later"""
+    return isinstance(error, (RateLimitExceeded, CircuitOpenError, EmptyCompletionError)) or is_retryable(error)
+
+
+class ResiliencePolicy:
+    """Per-call-site limits for LLM calls.
+
+    attempt_timeout bounds each attempt (time to first token for streams),
+    deadline bounds the call including retries and backoff. A hedge is sent
+    once an attempt outlives hedge_percentile of recent successful latencies.
+    """
+
+    def __init__(self, attempt_timeout: float = 30.0, deadline: float = 60.0, max_retries: int = 2,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0, hedge_percentile: Optional[float] = 0.95,
+                 hedge_min_samples: int = 20, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before retry number `attempt` (0-based)"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+
+ADVICE_POLICY = ResiliencePolicy(attempt_timeout=45.0, deadline=90.0)
+CHAT_POLICY = ResiliencePolicy(attempt_timeout=20.0, deadline=40.0)
+STREAM_POLICY = ResiliencePolicy(attempt_timeout=10.0, deadline=25.0, hedge_percentile=None)
+
+
+class _OverdueCalls:
+    """Executor calls still running after the attempt that started them gave up"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def abandon(self, future: Future):
+        """Drop a future its caller no longer waits for, counting it until it finishes"""
+        if future.cancel():
+            return
+        with self._lock:
+            self.count += 1
+        future.add_done_callback(self._finished)
+
+    def _finished(self, _future: Future):
+        with self._lock:
+            self.count -= 1
+
+    def full(self) -> bool:
+        return self.count >= self.limit
+
+
+_overdue = _OverdueCalls(MAX_OVERDUE_CALLS)
+
+
+def _submit(call: Callable[[], object]) -> Future:
+    """Run call on the executor unless too many abandoned calls are still holding its threads"""
+    if _overdue.full():
+        raise DeadlineExceeded(f"{_overdue.count} LLM calls are still running past their deadline")
+    return _executor.submit(call)
+
+
+class UpstreamHealth:
+    """Circuit breaker state and recent latencies for one upstream model"""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.latencies = deque(maxlen=200)
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Return whether a call may be attempted now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+        CIRCUIT_REJECTED.inc(upstream=self.name)
+        return False
+
+    def record_success(self, latency: Optional[float] = None):
+        """Close the circuit; latency (of a full completion) feeds the hedging percentile"""
+        with self._lock:
+            if latency is not None:
+                self.latencies.append(latency)
+            self.consecutive_failures = 0
+            self.state = self.CLOSED
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Free the half-open trial slot without judging the upstream, e.g. after a client error"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    CIRCUIT_OPENED.inc(upstream=self.name)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def is_healthy(self) -> bool:
+        return self.state == self.CLOSED
+
+    def latency_percentile(self, percentile: float, min_samples: int) -> Optional[float]:
+        """Return the given percentile of recent latencies, or None with too few samples"""
+        with self._lock:
+            samples = sorted(self.latencies)
+        if len(samples) < min_samples:
+            return None
+        return samples[min(int(percentile * len(samples)), len(samples) - 1)]
+
+
+_upstreams: Dict[str, UpstreamHealth] = {}
+_upstreams_lock = threading.Lock()
+
+
+def get_upstream(name: str, policy: Optional[ResiliencePolicy] = None) -> UpstreamHealth:
+    """Return the process-wide health tracker for an upstream"""
+    upstream = _upstreams.get(name)
+    if upstream is None:
+        with _upstreams_lock:
+            upstream = _upstreams.get(name)
+            if upstream is None:
+                policy = policy or ResiliencePolicy()
+                upstream = _upstreams[name] = UpstreamHealth(name, policy.failure_threshold, policy.reset_timeout)
+    return upstream
+
+
+class ResilientBackend(LLMBackend):
+    """Applies a ResiliencePolicy around another backend.
+
+    Circuit breakers are shared per upstream and model across every wrapper
+    in the process, so one unhealthy model fails fast for all sessions.
+    With a rate-limit budget, every attempt that may reach the upstream
+    (first try, retry or hedge) is paid for; see rate_limiter.AttemptBudget.
+    The circuit is checked before waiting for budget, so an open circuit
+    never queues, and running out of budget never counts as a failure.
+    """
+
+    def __init__(self, backend: LLMBackend, policy: ResiliencePolicy = CHAT_POLICY,
+                 stream_policy: ResiliencePolicy = STREAM_POLICY, budget: Optional["AttemptBudget"] = None):
+        self.backend = backend
+        self.policy = policy
+        self.stream_policy = stream_policy
+        self.budget = budget
+        self.name = backend.name
+
+    def upstream(self, model: str) -> UpstreamHealth:
+        return get_upstream(f"{self.backend.name}:{model}", self.policy)
+
+    def _hedge_delay(self, upstream: UpstreamHealth, policy: ResiliencePolicy) -> Optional[float]:
+        if policy.hedge_percentile is None:
+            return None
+        return upstream.latency_percentile(policy.hedge_percentile, policy.hedge_min_samples)
+
+    def _reserve(self, upstream: UpstreamHealth, model: str, tokens: float, max_wait: float):
+        """Wait for one attempt's budget; throttling says nothing about upstream health"""
+        if self.budget is None:
+            return
+        try:
+            self.budget.acquire(model, tokens, max_wait)
+        except Exception:
+            upstream.release_trial()
+            raise
+
+    async def _areserve(self, upstream: UpstreamHealth, model: str, tokens: float, max_wait: float):
+        if self.budget is None:
+            return
+        try:
+            await self.budget.aacquire(model, tokens, max_wait)
+        except Exception:
+            upstream.release_trial()
+            raise
+
+    def _refund(self, model: str, tokens: float, used: float = 0.0, reached_upstream: bool = True):
+        if self.budget is not None:
+            self.budget.settle(model, tokens, used, reached_upstream)
+
+    def _settle_when_done(self, future, model: str, tokens: float):
+        """Settle an attempt's reservation once its future finishes, even after it was abandoned"""
+        if self.budget is None:
+            return
+
+        def settle(done):
+            if done.cancelled():
+                # A cancelled executor future never ran; a cancelled task may have sent its request
+                self._refund(model, tokens, reached_upstream=not isinstance(done, Future))
+            elif done.exception() is not None:
+                self._refund(model, tokens)
+            else:
+                completion = done.result()
+                used = completion.prompt_tokens + completion.completion_tokens
+                # Without usage figures the whole reservation is kept
+                self._refund(model, tokens, used or tokens)
+        future.add_done_callback(settle)
+
+    def _attempt(self, call: Callable[[], Completion], upstream: UpstreamHealth, policy: ResiliencePolicy,
+                 timeout: float, model: str, tokens: float) -> Completion:
+        start = time.monotonic()
+        try:
+            futures = [_submit(call)]
+        except DeadlineExceeded:
+            self._refund(model, tokens, reached_upstream=False)
+            raise
+        self._settle_when_done(futures[0], model, tokens)
+        hedge_delay = self._hedge_delay(upstream, policy)
+        if hedge_delay is not None and hedge_delay < timeout:
+            done, _ = wait(futures, timeout=hedge_delay)
+            if not done and not _overdue.full() and (self.budget is None or self.budget.try_acquire(model, tokens)):
+                LLM_HEDGES.inc(upstream=upstream.name)
+                futures.append(_executor.submit(call))
+                self._settle_when_done(futures[-1], model, tokens)
+
+        error = None
+        pending = set(futures)
+        while pending:
+            remaining = timeout - (time.monotonic() - start)
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return future.result()
+                error = future.exception()
+        if error is not None and not pending:
+            raise error
+        for future in pending:
+            _overdue.abandon(future)
+        raise DeadlineExceeded(f"LLM call exceeded {timeout:.1f}s")
+
+    def _run(self, model: str, policy: ResiliencePolicy, call: Callable[[UpstreamHealth, float], object],
+             tokens: float = 0.0, track_latency: bool = True):
+        """Retry call(upstream, timeout) under the policy, tracking health for the upstream.
+
+        Each attempt reserves tokens of budget first; call settles it.
+        """
+        upstream = self.upstream(model)
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            if not upstream.allow():
+                raise CircuitOpenError(f"{upstream.name} is unavailable (circuit open)")
+            self._reserve(upstream, model, tokens, policy.deadline - (time.monotonic() - start))
+            remaining = policy.deadline - (time.monotonic() - start)
+            if remaining <= 0:
+                upstream.release_trial()
+                self._refund(model, tokens, reached_upstream=False)
+                raise DeadlineExceeded(f"No LLM budget within the {policy.deadline:.1f}s deadline")
+            timeout = min(policy.attempt_timeout, remaining)
+            attempt_start = time.monotonic()
+            try:
+                result = call(upstream, timeout)
+            except Exception as e:
+                retryable = is_retryable(e)
+                if retryable:
+                    upstream.record_failure()
+                else:
+                    # Client errors say nothing about upstream health
+                    upstream.release_trial()
+                backoff = policy.backoff(attempt)
+                if (not retryable or attempt >= policy.max_retries
+                        or time.monotonic() - start + backoff >= policy.deadline):
+                    raise
+                LLM_RETRIES.inc(upstream=upstream.name)
+                attempt += 1
+                time.sleep(backoff)
+                continue
+            upstream.record_success(time.monotonic() - attempt_start if track_latency else None)
+            return result
+
+    def _tokens(self, messages, max_tokens: int) -> float:
+        """Budget one attempt reserves: estimated prompt plus max_tokens"""
+        return estimate_message_tokens(messages) + max_tokens if self.budget is not None else 0.0
+
+    def complete(self, messages, model, max_tokens, temperature=0.7) -> Completion:
+        tokens = self._tokens(messages, max_tokens)
+
+        def call(upstream, timeout):
+            return self._attempt(lambda: self.backend.complete(messages, model, max_tokens, temperature),
+                                 upstream, self.policy, timeout, model, tokens)
+        return self._run(model, self.policy, call, tokens)
+
+    def stream(self, messages, model, max_tokens, temperature=0.7) -> Iterator[str]:
+        # Retries and the deadline cover the wait for the first token; once
+        # tokens are flowing the stream is passed through as-is.
+        tokens = self._tokens(messages, max_tokens)
+
+        def call(upstream, timeout):
+            def first_token():
+                iterator = iter(self.backend.stream(messages, model, max_tokens, temperature))
+                return iterator, next(iterator, None)
+            try:
+                future = _submit(first_token)
+            except DeadlineExceeded:
+                self._refund(model, tokens, reached_upstream=False)
+                raise
+            done, _ = wait([future], timeout=timeout)
+            if not done:
+                # Whatever the abandoned stream would have produced is never read
+                self._refund(model, tokens, tokens - max_tokens)
+                _overdue.abandon(future)
+                raise DeadlineExceeded(f"No first token within {timeout:.1f}s")
+            if future.exception() is not None:
+                self._refund(model, tokens)
+            return future.result()
+
+        iterator, token = self._run(model, self.stream_policy, call, tokens, track_latency=False)
+        text = [token or ""]
+        try:
+            if token is None:
+                return
+            yield token
+            for token in iterator:
+                text.append(token)
+                yield token
+        finally:
+            self._refund(model, tokens, tokens - max_tokens + estimate_tokens("".join(text)))
+
+    async def acomplete(self, messages, model, max_tokens, temperature=0.7) -> Completion:
+        policy = self.policy
+        tokens = self._tokens(messages, max_tokens)
+        upstream = self.upstream(model)
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            if not upstream.allow():
+                raise CircuitOpenError(f"{upstream.name} is unavailable (circuit open)")
+            await self._areserve(upstream, model, tokens, policy.deadline - (time.monotonic() - start))
+            remaining = policy.deadline - (time.monotonic() - start)
+            if remaining <= 0:
+                upstream.release_trial()
+                self._refund(model, tokens, reached_upstream=False)
+                raise DeadlineExceeded(f"No LLM budget within the {policy.deadline:.1f}s deadline")
+            timeout = min(policy.attempt_timeout, remaining)
+            attempt_start = time.monotonic()
+            try:
+                result = await self._aattempt(messages, model, max_tokens, temperature, upstream, timeout, tokens)
+            except Exception as e:
+                retryable = is_retryable(e)
+                if retryable:
+                    upstream.record_failure()
+                else:
+                    upstream.release_trial()
+                backoff = policy.backoff(attempt)
+                if (not retryable or attempt >= policy.max_retries
+                        or time.monotonic() - start + backoff >= policy.deadline):
+                    raise
+                LLM_RETRIES.inc(upstream=upstream.name)
+                attempt += 1
+                await asyncio.sleep(backoff)
+                continue
+            upstream.record_success(time.monotonic() - attempt_start)
+            return result
+
+    async def _aattempt(self, messages, model, max_tokens, temperature, upstream: UpstreamHealth,
+                        timeout: float, tokens: float = 0.0) -> Completion:
+        tasks = [asyncio.ensure_future(self.backend.acomplete(messages, model, max_tokens, temperature))]
+        self._settle_when_done(tasks[0], model, tokens)
+        try:
+            hedge_delay = self._hedge_delay(upstream, self.policy)
+            if hedge_delay is not None and hedge_delay < timeout:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+                if not done and (self.budget is None or self.budget.try_acquire(model, tokens)):
+                    LLM_HEDGES.inc(upstream=upstream.name)
+                    tasks.append(asyncio.ensure_future(self.backend.acomplete(messages, model, max_tokens, temperature)))
+                    self._settle_when_done(tasks[-1], model, tokens)
+            loop = asyncio.get_running_loop()
+            end = loop.time() + timeout
+            pending = set(tasks)
+            error = None
+            while pending:
+                remaining = end - loop.time()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            if error is not None and not pending:
+                raise error
+            raise DeadlineExceeded(f"LLM call exceeded {timeout:.1f}s")
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+
+def resilient(backend: LLMBackend, policy: ResiliencePolicy = CHAT_POLICY,
+              budget: Optional["AttemptBudget"] = None) -> LLMBackend:
+    """Return backend wrapped with the resilience policy (charging budget per attempt), without double-wrapping"""
+    if isinstance(backend, ResilientBackend):
+        return backend
+    return ResilientBackend(backend, policy, budget=budget)
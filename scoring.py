@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Vectorized dosha scoring engine and bulk re-scoring CLI
+"""
+
+import argparse
+import csv
+import json
+import sys
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DOSHAS = ('vata', 'pitta', 'kapha')
+DOSHA_INDEX = {dosha: i for i, dosha in enumerate(DOSHAS)}
+
+# Marks an unanswered question in an answer array
+UNANSWERED = -1
+
+
+class ScoringEngine:
+    """Question bank compiled into an option -> dosha lookup table.
+
+    Scores an (N x questions) integer answer array in one batched gather,
+    with UNANSWERED (-1) for skipped questions.
+    """
+
+    def __init__(self, questions: List[Dict]):
+        self.num_questions = len(questions)
+        self.max_options = max((len(q['options']) for q in questions), default=0)
+        self.option_counts = np.array([len(q['options']) for q in questions], dtype=np.int64)
+
+        # Row q * max_options + option holds the one-hot dosha of that option;
+        # the final all-zero row absorbs invalid and unanswered cells.
+        self.sentinel = self.num_questions * self.max_options
+        table = np.zeros((self.sentinel + 1, len(DOSHAS)), dtype=np.int32)
+        for q, question in enumerate(questions):
+            for o, option in enumerate(question['options']):
+                if option['dosha'] in DOSHA_INDEX:
+                    table[q * self.max_options + o, DOSHA_INDEX[option['dosha']]] = 1
+        self.table = table
+        self.row_offsets = np.arange(self.num_questions, dtype=np.int64) * self.max_options
+
+    def to_array(self, answers_list: Iterable[Sequence[Optional[int]]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Convert answer lists into an answer array plus per-row counts of surplus answers"""
+        rows = []
+        extras = []
+        width = self.num_questions
+        for answers in answers_list:
+            row = [UNANSWERED if a is None else a for a in answers[:width]]
+            row.extend([UNANSWERED] * (width - len(row)))
+            rows.append(row)
+            extras.append(sum(1 for a in answers[width:] if a is not None))
+        array = np.array(rows, dtype=np.int64).reshape(len(rows), width)
+        return array, np.array(extras, dtype=np.int64)
+
+    def dosha_counts(self, answers: np.ndarray) -> np.ndarray:
+        """Return an (N x 3) array of raw dosha tallies"""
+        answers = np.asarray(answers, dtype=np.int64)
+        valid = (answers >= 0) & (answers < self.option_counts)
+        index = np.where(valid, self.row_offsets + answers, self.sentinel)
+        return self.table[index].sum(axis=1)
+
+    def score(self, answers: np.ndarray, extra_answered: Optional[np.ndarray] = None) -> np.ndarray:
+        """Return an (N x 3) array of vata/pitta/kapha percentages.
+
+        Percentages are relative to the number of answered questions, matching
+        calculate_dosha_scores: answers to options without a dosha still count.
+        """
+        answers = np.asarray(answers, dtype=np.int64)
+        counts = self.dosha_counts(answers).astype(np.float64)
+        answered = (answers != UNANSWERED).sum(axis=1)
+        if extra_answered is not None:
+            answered = answered + extra_answered
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = counts * 100.0 / answered[:, None]
+        scores[answered == 0] = 0.0
+        return scores
+
+
+class YesNoScoringEngine:
+    """Scores yes/no responses grouped by dosha, as used by AyurvedaAgent"""
+
+    def __init__(self, group_sizes: Sequence[Tuple[str, int]]):
+        self.group_sizes = tuple(group_sizes)
+        self.width = sum(size for _, size in self.group_sizes)
+        weights = np.zeros((self.width, len(DOSHAS)), dtype=np.float64)
+        column = 0
+        for dosha, size in self.group_sizes:
+            if dosha in DOSHA_INDEX and size:
+                weights[column:column + size, DOSHA_INDEX[dosha]] = 100.0 / size
+            column += size
+        self.weights = weights
+
+    def to_array(self, responses_list: Iterable[Dict[str, List[bool]]]) -> np.ndarray:
+        """Flatten per-dosha response dicts into an (N x width) boolean array"""
+        rows = [[bool(a) for dosha, _ in self.group_sizes for a in responses.get(dosha, [])]
+                for responses in responses_list]
+        return np.array(rows, dtype=bool).reshape(len(rows), self.width)
+
+    def score(self, responses: np.ndarray) -> np.ndarray:
+        """Return an (N x 3) array of vata/pitta/kapha percentages"""
+        return np.asarray(responses, dtype=np.float64) @ self.weights
+
+
+_engine_cache: Tuple[Optional[List[Dict]], Optional[ScoringEngine]] = (None, None)
+
+
+def get_scoring_engine(questions: List[Dict]) -> ScoringEngine:
+    """Return a compiled engine, reusing it while the same question bank is passed in"""
+    global _engine_cache
+    cached_questions, engine = _engine_cache
+    if cached_questions is not questions:
+        engine = ScoringEngine(questions)
+        _engine_cache = (questions, engine)
+    return engine
+
+
+@lru_cache(maxsize=32)
+def get_yes_no_engine(group_sizes: Tuple[Tuple[str, int], ...]) -> YesNoScoringEngine:
+    """Return a cached yes/no engine for the given (dosha, question count) layout"""
+    return YesNoScoringEngine(group_sizes)
+
+
+def rank_doshas(scores: np.ndarray) -> np.ndarray:
+    """Return dosha indices per row ordered from highest to lowest score.
+
+    Ties keep vata/pitta/kapha order, matching sorted(..., reverse=True).
+    """
+    return np.argsort(-np.asarray(scores), axis=-1, kind='stable')
+
+
+def scores_to_dict(row: np.ndarray) -> Dict[str, float]:
+    """Convert one scored row into the {'vata': .., 'pitta': .., 'kapha': ..} shape"""
+    return {dosha: float(row[i]) for i, dosha in enumerate(DOSHAS)}
+
+
+def score_answers(answers: List[Optional[int]], questions: List[Dict]) -> Dict[str, float]:
+    """Score a single multiple-choice submission"""
+    engine = get_scoring_engine(questions)
+    array, extras = engine.to_array([answers])
+    return scores_to_dict(engine.score(array, extras)[0])
+
+
+def score_yes_no(responses: Dict[str, List[bool]]) -> Dict[str, float]:
+    """Score a single yes/no submission grouped by dosha"""
+    layout = tuple((dosha, len(answers)) for dosha, answers in responses.items())
+    engine = get_yes_no_engine(layout)
+    return scores_to_dict(engine.score(engine.to_array([responses]))[0])
+
+
+# --- Bulk re-scoring CLI ---
+
+def _read_jsonl(file) -> Iterator[Tuple[object, List[Optional[int]]]]:
+    for line_number, line in enumerate(file):
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        yield record.get('id', line_number), record['answers']
+
+
+def _read_csv(file) -> Iterator[Tuple[object, List[Optional[int]]]]:
+    reader = csv.reader(file)
+    header = next(reader, None)
+    if header is None:
+        return
+    has_id = bool(header) and header[0] == 'id'
+    for line_number, row in enumerate(reader):
+        record_id = row[0] if has_id else line_number
+        cells = row[1:] if has_id else row
+        yield record_id, [int(cell) if cell.strip() else None for cell in cells]
+
+
+def _chunks(records: Iterator, chunk_size: int) -> Iterator[List]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def rescore_stream(records: Iterator[Tuple[object, List[Optional[int]]]], questions: List[Dict],
+                   chunk_size: int = 50000) -> Iterator[Tuple[object, np.ndarray]]:
+    """Score (id, answers) records chunk by chunk, yielding (id, scores) pairs"""
+    engine = ScoringEngine(questions)
+    for chunk in _chunks(records, chunk_size):
+        ids = [record_id for record_id, _ in chunk]
+        array, extras = engine.to_array([answers for _, answers in chunk])
+        scores = engine.score(array, extras)
+        yield from zip(ids, scores)
+
+
+def main(argv: Optional[List[str]] = None):
+    """Re-score stored submissions against the current question bank"""
+    from question_bank import QUESTIONS_FILE, get_question_bank
+
+    parser = argparse.ArgumentParser(description="Bulk re-score dosha assessment submissions")
+    parser.add_argument('input', help="JSONL ({\"id\": .., \"answers\": [..]}) or CSV (id, answer columns); '-' for stdin")
+    parser.add_argument('output', help="Output path ('-' for stdout)")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help="Input/output format (default: from input extension)")
+    parser.add_argument('--questions', default=QUESTIONS_FILE, help="Question bank file")
+    parser.add_argument('--chunk-size', type=int, default=50000, help="Submissions scored per batch")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('csv' if args.input.endswith('.csv') else 'jsonl')
+    questions = get_question_bank(args.questions, artifact_path=None).questions
+
+    infile = sys.stdin if args.input == '-' else open(args.input, 'r', encoding='utf-8', newline='')
+    outfile = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8', newline='')
+    count = 0
+    try:
+        records = _read_csv(infile) if fmt == 'csv' else _read_jsonl(infile)
+        writer = None
+        if fmt == 'csv':
+            writer = csv.writer(outfile)
+            writer.writerow(['id', *DOSHAS])
+        for record_id, row in rescore_stream(records, questions, args.chunk_size):
+            if writer:
+                writer.writerow([record_id, *(f"{value:.4f}" for value in row)])
+            else:
+                outfile.write(json.dumps({'id': record_id, **scores_to_dict(row)}) + '\n')
+            count += 1
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout:
+            outfile.close()
+
+    print(f"✅ Scored {count} submissions", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Near-duplicate chat answer cache: MinHash signatures of questions, partitioned by quantized dosha profile
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from advice_cache import quantize_scores
+from knowledge_index import negation_terms, tokenize
+from metrics import record_cache_lookup
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+SHINGLE_SIZE = 4
+
+
+def question_features(question: str) -> List[int]:
+    """Stable hashes of the question's stemmed words and character shingles"""
+    words = tokenize(question)
+    text = " ".join(words)
+    features = {f"w:{word}" for word in words}
+    features.update(f"c:{text[i:i + SHINGLE_SIZE]}" for i in range(max(len(text) - SHINGLE_SIZE + 1, 0)))
+    return [zlib.crc32(feature.encode("utf-8")) for feature in features]
+
+
+class MinHasher:
+    """Fixed random permutations, seeded so every replica computes identical signatures"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 31, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 31, num_perm, dtype=np.uint64)
+
+    def signature(self, question: str) -> Optional[np.ndarray]:
+        features = question_features(question)
+        if not features:
+            return None
+        x = np.array(features, dtype=np.uint64)[:, None]
+        return ((x * self.a + self.b) % _MERSENNE_PRIME).min(axis=0)
+
+
+def profile_partition(scores: Dict[str, float], namespace: str = "", step: float = 10.0) -> str:
+    """Partition key: dosha ranking plus scores quantized to step"""
+    quantized = quantize_scores(scores, step)
+    ranking = ">".join(sorted(scores, key=scores.get, reverse=True)[:2])
+    return f"{namespace}|{ranking}|" + "/".join(f"{quantized[dosha]:g}" for dosha in sorted(quantized))
+
+
+class _Partition:
+    def __init__(self):
+        self.entries: "OrderedDict[int, Tuple[np.ndarray, str, str]]" = OrderedDict()
+        self._matrix: Optional[Tuple[List[int], np.ndarray]] = None
+
+    def matrix(self) -> Tuple[List[int], np.ndarray]:
+        if self._matrix is None:
+            ids = list(self.entries)
+            self._matrix = (ids, np.stack([self.entries[i][0] for i in ids]))
+        return self._matrix
+
+    def add(self, entry_id: int, entry: Tuple[np.ndarray, str, str]):
+        self.entries[entry_id] = entry
+        self._matrix = None
+
+    def remove(self, entry_id: int):
+        del self.entries[entry_id]
+        self._matrix = None
+
+
+class SemanticChatCache:
+    """Reuses a chat answer for a differently phrased question from a similar profile.
+
+    A lookup matches the most similar stored question in the profile's
+    partition whose estimated Jaccard similarity is at least threshold
+    and whose negations ("not", "avoid", "don't") are exactly the same:
+    negating a question barely changes its MinHash signature.
+    The capacity bound is global, evicting the least recently used
+    answers; snapshots are plain JSON so replicas can warm up from one.
+    """
+
+    def __init__(self, threshold: float = 0.7, capacity: int = 10000, num_perm: int = 64,
+                 step: float = 10.0, snapshot_path: Optional[str] = None, name: str = "chat"):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.step = step
+        self.snapshot_path = snapshot_path
+        self.name = name
+        self.hasher = MinHasher(num_perm)
+        self._partitions: Dict[str, _Partition] = {}
+        # entry id -> partition key, oldest first
+        self._lru: "OrderedDict[int, str]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "sets": 0, "evictions": 0}
+        if snapshot_path and os.path.exists(snapshot_path):
+            self.load(snapshot_path)
+
+    def partition(self, scores: Dict[str, float], namespace: str = "") -> str:
+        return profile_partition(scores, namespace, self.step)
+
+    @staticmethod
+    def _question_partition(question: str, partition: str) -> str:
+        negations = negation_terms(question)
+        return f"{partition}|not:{','.join(sorted(negations))}" if negations else partition
+
+    def get(self, question: str, partition: str) -> Optional[str]:
+        """Return the cached answer for a near-duplicate question, or None"""
+        signature = self.hasher.signature(question)
+        partition = self._question_partition(question, partition)
+        answer = None
+        with self._lock:
+            entries = self._partitions.get(partition)
+            if signature is not None and entries is not None:
+                ids, matrix = entries.matrix()
+                similarity = (matrix == signature).mean(axis=1)
+                best = int(similarity.argmax())
+                if similarity[best] >= self.threshold:
+                    entry_id = ids[best]
+                    answer = entries.entries[entry_id][2]
+                    self._lru.move_to_end(entry_id)
+            self.stats["hits" if answer is not None else "misses"] += 1
+        record_cache_lookup(self.name, answer is not None)
+        return answer
+
+    def set(self, question: str, partition: str, answer: str):
+        """Store an answer for a question in a profile partition"""
+        signature = self.hasher.signature(question)
+        if signature is None:
+            return
+        partition = self._question_partition(question, partition)
+        with self._lock:
+            self._insert(partition, signature, question, answer)
+            self.stats["sets"] += 1
+
+    def _insert(self, partition: str, signature: np.ndarray, question: str, answer: str):
+        entry_id = self._next_id
+        self._next_id += 1
+        self._partitions.setdefault(partition, _Partition()).add(entry_id, (signature, question, answer))
+        self._lru[entry_id] = partition
+        while len(self._lru) > self.capacity:
+            old_id, old_partition = self._lru.popitem(last=False)
+            entries = self._partitions[old_partition]
+            entries.remove(old_id)
+            if not entries.entries:
+                del self._partitions[old_partition]
+            self.stats["evictions"] += 1
+
+    def save(self, path: Optional[str] = None):
+        """Write every entry, least recently used first, to a JSON snapshot"""
+        path = path or self.snapshot_path
+        with self._lock:
+            entries = [
+                {"partition": partition, "question": question, "answer": answer, "signature": signature.tolist()}
+                for entry_id, partition in self._lru.items()
+                for signature, question, answer in (self._partitions[partition].entries[entry_id],)
+            ]
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"saved_at": time.time(), "num_perm": len(self.hasher.a), "entries": entries}, file)
+        os.replace(temp_path, path)
+
+    def load(self, path: str):
+        """Add the entries of a snapshot, keeping their recency order"""
+        with open(path, "r", encoding="utf-8") as file:
+            snapshot = json.load(file)
+        with self._lock:
+            for entry in snapshot["entries"]:
+                if snapshot["num_perm"] == len(self.hasher.a):
+                    signature = np.array(entry["signature"], dtype=np.uint64)
+                else:
+                    signature = self.hasher.signature(entry["question"])
+                self._insert(entry["partition"], signature, entry["question"], entry["answer"])
+
+    def clear(self):
+        with self._lock:
+            self._partitions.clear()
+            self._lru.clear()
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._lru)
+            stats["partitions"] = len(self._partitions)
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / total if total else 0.0
+        return stats
+
+
+_default_cache: Optional[SemanticChatCache] = None
+_default_lock = threading.Lock()
+
+
+def get_chat_cache() -> SemanticChatCache:
+    """Return the process-wide chat answer cache configured from the environment.
+
+    CHAT_CACHE_SNAPSHOT names a JSON snapshot that is loaded at startup and
+    written back at exit.
+    """
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                _default_cache = SemanticChatCache(
+                    threshold=float(os.getenv("CHAT_CACHE_THRESHOLD", "0.7")),
+                    capacity=int(os.getenv("CHAT_CACHE_CAPACITY", "10000")),
+                    snapshot_path=os.getenv("CHAT_CACHE_SNAPSHOT"),
+                )
+                if _default_cache.snapshot_path:
+                    atexit.register(_default_cache.save)
+    return _default_cache
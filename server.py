@@ -1,40 +1,352 @@
 #!/usr/bin/env python3
 """
-Simple HTTP server to serve the Ayurveda assessment frontend
+HTTP server to serve the Ayurveda assessment frontend
 """
 
+import argparse
+import email.utils
+import hashlib
 import http.server
-import socketserver
-import os
+import json
+import mimetypes
+import threading
+import time
 import webbrowser
 from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import unquote, urlsplit
+
+from question_bank import get_question_bank
+from scoring import DOSHAS, get_scoring_engine, rank_doshas
+from metrics import HTTP_LATENCY, REGISTRY
 
 PORT = 8000
+STATIC_DIR = Path(__file__).parent
+# The frontend files served from the app root; nothing else there (config, logs, caches) is exposed
+STATIC_FILES = frozenset({'index.html', 'script.js', 'styles.css', 'questions.txt', 'favicon.ico'})
+MAX_BODY_BYTES = 16 * 1024 * 1024
+JSON_CONTENT_TYPE = 'application/json; charset=utf-8'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class APIError(Exception):
+    """Raised by API handlers to return a JSON error response"""
+
+    def __init__(self, status: int, message: str, **extra):
+        super().__init__(message)
+        self.status = status
+        self.payload = {'error': message, **extra}
+
+
+class StaticFile:
+    """A static file held in memory with its validators"""
+
+    def __init__(self, path: Path):
+        stat = path.stat()
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = stat.st_size
+        self.body = path.read_bytes()
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest() + '"'
+        self.last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+        self.mtime = int(stat.st_mtime)
+        content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+        self.content_type = content_type
+
+
+class StaticFileCache:
+    """In-memory cache of static files, refreshed when a file's mtime or size changes"""
+
+    def __init__(self, root: Path):
+        self.root = root.resolve()
+        self._files: Dict[Path, StaticFile] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, url_path: str) -> Optional[Path]:
+        """Map a URL path to one of the frontend files, refusing anything else"""
+        relative = unquote(url_path).lstrip('/') or 'index.html'
+        if relative not in STATIC_FILES:
+            return None
+        return self.root / relative
+
+    def get(self, url_path: str) -> Optional[StaticFile]:
+        path = self.resolve(url_path)
+        if path is None:
+            return None
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        cached = self._files.get(path)
+        if cached and cached.mtime_ns == stat.st_mtime_ns and cached.size == stat.st_size:
+            return cached
+        with self._lock:
+            try:
+                cached = StaticFile(path)
+            except OSError:
+                return None
+            self._files[path] = cached
+            return cached
+
+    def preload(self):
+        """Load every servable file up front"""
+        for name in STATIC_FILES:
+            self.get('/' + name)
+
+
+class ScoringAPI:
+    """JSON scoring endpoints backed by the shared question bank and scoring engine"""
+
+    def __init__(self, questions_path: Path):
+        self.questions_path = str(questions_path)
+        self._questions_body = (None, b'')
+
+    def bank(self):
+        try:
+            return get_question_bank(self.questions_path, artifact_path=None)
+        except FileNotFoundError:
+            raise APIError(503, 'Question bank unavailable')
+
+    def questions(self):
+        """Return (version, serialized body) for GET /api/questions, serialized once per version"""
+        bank = self.bank()
+        version, body = self._questions_body
+        if version != bank.version:
+            body = json.dumps({'version': bank.version, 'questions': bank.questions}).encode('utf-8')
+            self._questions_body = (bank.version, body)
+        return bank.version, body
+
+    def score(self, payload: Dict) -> Dict:
+        """Score one submission ({"answers": [...]}) or a batch ({"submissions": [...]})"""
+        if not isinstance(payload, dict):
+            raise APIError(400, 'Request body must be a JSON object')
+        bank = self.bank()
+        if payload.get('version') not in (None, bank.version):
+            raise APIError(409, 'Question bank version mismatch', version=bank.version)
+
+        if 'submissions' in payload:
+            submissions = payload['submissions']
+            if not isinstance(submissions, list):
+                raise APIError(400, '"submissions" must be a list')
+            batch = True
+        elif 'answers' in payload:
+            submissions = [payload]
+            batch = False
+        else:
+            raise APIError(400, 'Expected "answers" or "submissions"')
+
+        answers_list = []
+        for submission in submissions:
+            answers = submission.get('answers') if isinstance(submission, dict) else None
+            if not isinstance(answers, list) or not all(a is None or (type(a) is int and a >= 0) for a in answers):
+                raise APIError(400, '"answers" must be a list of non-negative option indices or null')
+            answers_list.append(answers)
+
+        engine = get_scoring_engine(bank.questions)
+        array, extras = engine.to_array(answers_list)
+        scores = engine.score(array, extras)
+        ranking = rank_doshas(scores)[:, :2].tolist()
+
+        results = []
+        for submission, row, (primary, secondary) in zip(submissions, scores.tolist(), ranking):
+            result = {'scores': dict(zip(DOSHAS, row)), 'primary': DOSHAS[primary], 'secondary': DOSHAS[secondary]}
+            if 'id' in submission:
+                result['id'] = submission['id']
+            results.append(result)
+
+        if batch:
+            return {'version': bank.version, 'results': results}
+        return {'version': bank.version, **results[0]}
+
+
+class AyurvedaRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Serves cached static files over keep-alive HTTP/1.1 connections"""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'AyurvedaServer/1.0'
+    # Headers and body go out as separate writes; without TCP_NODELAY each
+    # keep-alive response waits on the peer's delayed ACK.
+    disable_nagle_algorithm = True
+    static_files: StaticFileCache = None
+    api: ScoringAPI = None
+    quiet = False
 
-class MyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     def end_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
         super().end_headers()
 
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+    def send_body(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None):
+        """Send a complete response with Content-Length so the connection can be reused"""
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def send_error_body(self, status: int, message: str):
+        self.send_body(status, message.encode('utf-8'), 'text/plain; charset=utf-8')
+
+    def _not_modified(self, static_file: StaticFile) -> bool:
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return static_file.etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return static_file.mtime <= since
+        return False
+
+    def serve_static(self, path: str):
+        static_file = self.static_files.get(path)
+        if static_file is None:
+            self.send_error_body(404, 'Not Found')
+            return
+        validators = {
+            'ETag': static_file.etag,
+            'Last-Modified': static_file.last_modified,
+            'Cache-Control': 'no-cache',
+        }
+        if self._not_modified(static_file):
+            self.send_response(304)
+            for name, value in validators.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_body(200, static_file.body, static_file.content_type, validators)
+
+    def send_json(self, status: int, payload: Dict):
+        self.send_body(status, json.dumps(payload).encode('utf-8'), JSON_CONTENT_TYPE)
+
+    def read_json(self):
+        try:
+            length = int(self.headers.get('Content-Length', ''))
+        except ValueError:
+            raise APIError(411, 'Content-Length required')
+        if length < 0:
+            # rfile.read(-1) would block until the client closes the connection
+            self.close_connection = True
+            raise APIError(400, 'Invalid Content-Length')
+        if length > MAX_BODY_BYTES:
+            raise APIError(413, f'Request body exceeds {MAX_BODY_BYTES} bytes')
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            raise APIError(400, 'Invalid JSON')
+
+    def serve_questions(self):
+        version, body = self.api.questions()
+        etag = f'"{version}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_body(200, body, JSON_CONTENT_TYPE, {'ETag': etag, 'Cache-Control': 'no-cache'})
+
+    def send_response(self, code, message=None):
+        self.status_code = code
+        super().send_response(code, message)
+
+    def observe(self, route: str, start: float):
+        HTTP_LATENCY.observe(time.perf_counter() - start, route=route, status=self.status_code)
+
+    def do_GET(self):
+        start = time.perf_counter()
+        path = urlsplit(self.path).path
+        if path == '/api/questions':
+            try:
+                self.serve_questions()
+            except APIError as e:
+                self.send_json(e.status, e.payload)
+            self.observe(path, start)
+        elif path == '/metrics':
+            self.send_body(200, REGISTRY.render_prometheus().encode('utf-8'), PROMETHEUS_CONTENT_TYPE)
+        else:
+            self.serve_static(path)
+
+    def do_POST(self):
+        start = time.perf_counter()
+        path = urlsplit(self.path).path
+        try:
+            payload = self.read_json()
+            if path != '/api/score':
+                raise APIError(404, 'Not Found')
+            self.send_json(200, self.api.score(payload))
+        except APIError as e:
+            if e.status in (411, 413):
+                # The unread body would corrupt the next request on this connection
+                self.close_connection = True
+            self.send_json(e.status, e.payload)
+        if path == '/api/score':
+            self.observe(path, start)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class AyurvedaHTTPServer(http.server.ThreadingHTTPServer):
+    """Thread-per-connection server so one slow client cannot stall the rest"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+def create_server(host: str = '', port: int = PORT, root: Path = STATIC_DIR, quiet: bool = False) -> AyurvedaHTTPServer:
+    """Build a server with its static files preloaded into memory"""
+    static_files = StaticFileCache(root)
+    static_files.preload()
+    handler = type('BoundAyurvedaRequestHandler', (AyurvedaRequestHandler,), {
+        'static_files': static_files,
+        'api': ScoringAPI(root / 'questions.txt'),
+        'quiet': quiet,
+    })
+    return AyurvedaHTTPServer((host, port), handler)
+
+
 def main():
-    # Change to the directory containing the HTML files
-    os.chdir(Path(__file__).parent)
-    
-    with socketserver.TCPServer(("", PORT), MyHTTPRequestHandler) as httpd:
+    parser = argparse.ArgumentParser(description="Serve the Ayurveda assessment frontend")
+    parser.add_argument('--host', default='', help="Interface to bind (default: all)")
+    parser.add_argument('--port', type=int, default=PORT, help=f"Port to listen on (default: {PORT})")
+    parser.add_argument('--headless', action='store_true', help="Do not open a browser (for running as a service)")
+    parser.add_argument('--quiet', action='store_true', help="Disable per-request access logging")
+    args = parser.parse_args()
+
+    with create_server(args.host, args.port, quiet=args.quiet) as httpd:
         print(f"🌿 Ayurveda Assessment Server")
-        print(f"📡 Server running at http://localhost:{PORT}")
-        print(f"🌐 Opening browser automatically...")
+        print(f"📡 Server running at http://localhost:{args.port}")
+        if not args.headless:
+            print(f"🌐 Opening browser automatically...")
         print(f"⏹️  Press Ctrl+C to stop the server")
-        
+
         # Open browser automatically
-        webbrowser.open(f'http://localhost:{PORT}')
-        
+        if not args.headless:
+            webbrowser.open(f'http://localhost:{args.port}')
+
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
             print(f"\n🛑 Server stopped")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,94 @@
+"""
+Single-flight coalescing: concurrent identical calls share one execution
+"""
+
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+from metrics import REGISTRY
+
+T = TypeVar("T")
+
+COALESCED_REQUESTS = REGISTRY.counter("ayurveda_coalesced_requests_total",
+                                      "Calls that waited on an identical in-flight call instead of running", ("group",))
+
+
+class _Call:
+    """One in-flight execution that followers wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Thread-safe coalescing of concurrent calls that share a key.
+
+    The first caller for a key runs fn; callers arriving while it runs
+    block until it finishes and receive the same result or exception.
+    Nothing is remembered once the call completes.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """Return (result of fn, whether it was shared from another caller's call)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            COALESCED_REQUESTS.inc(group=self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight, safe to share across event loops.
+
+    Calls are only coalesced with others on the same loop. A cancelled
+    follower does not cancel the shared call.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Tuple[int, Hashable], asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Return (result of await fn(), whether it was shared from another caller's call)"""
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        with self._lock:
+            task = self._calls.get(flight_key)
+            leader = task is None
+            if leader:
+                task = self._calls[flight_key] = loop.create_task(fn())
+                task.add_done_callback(lambda _: self._forget(flight_key, task))
+        if not leader:
+            COALESCED_REQUESTS.inc(group=self.name)
+        return await asyncio.shield(task), not leader
+
+    def _forget(self, flight_key: Tuple[int, Hashable], task: asyncio.Future):
+        with self._lock:
+            if self._calls.get(flight_key) is task:
+                del self._calls[flight_key]
@@ -1,10 +1,23 @@
 import streamlit as st
+import concurrent.futures
 import json
-import re
-from typing import Dict, List
+from typing import Dict, Iterator, List
 import os
-from openai import OpenAI
 from config import setup_openai_api_key, get_api_key_status
+from question_bank import get_question_bank
+from scoring import score_answers
+from guidelines import render_advice
+from chat_memory import ChatMemory
+from assessment_state import AssessmentState
+from assessment_store import AssessmentRecord, get_assessment_log
+from ayurveda_agent import AyurvedaAgent
+from advice_prefetch import get_advice_prefetcher
+from chat import chat_with_ai, stream_chat_with_ai
+from llm_backend import get_llm_backend
+from metrics import REGISTRY, cache_hit_rates, llm_summary
+from knowledge_index import fast_path_fraction
+from model_router import get_model_router
+from resilience import ADVICE_POLICY
 
 # Page configuration
 st.set_page_config(
@@ -96,236 +109,88 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def initialize_openai_client():
-    """Initialize OpenAI client with API key"""
+def initialize_llm_backend():
+    """Initialize the LLM backend (OpenAI with API key, or the local stub when LLM_BACKEND=stub)"""
+    if os.getenv("LLM_BACKEND", "openai").lower() == "stub":
+        return get_llm_backend()
     api_key = setup_openai_api_key()
     if not api_key:
         return None
-    return OpenAI(api_key=api_key)
+    return get_llm_backend(api_key)
 
 def load_questions() -> List[Dict]:
-    """Load and parse questions from the questions.txt file"""
+    """Load the shared, precompiled question bank (parsed once per process)"""
     try:
-        with open('questions.txt', 'r', encoding='utf-8') as file:
-            text = file.read()
-        
-        questions = []
-        lines = text.split('\n')
-        current_question = None
-        current_options = []
-        
-        for line in lines:
-            trimmed_line = line.strip()
-            if not trimmed_line:
-                continue
-            
-            # Check for question
-            question_match = re.match(r'<Question (\d+)>(.*?)</Question \1>', trimmed_line)
-            if question_match:
-                # Save previous question if exists
-                if current_question:
-                    questions.append({
-                        'question': current_question,
-                        'options': current_options
-                    })
-                
-                current_question = question_match.group(2)
-                current_options = []
-                continue
-            
-            # Check for option
-            option_match = re.match(r'<Option (\d+)>(.*?)</Option \1>', trimmed_line)
-            if option_match:
-                option_text = option_match.group(2)
-                dosha_match = re.search(r'\((Vata|Pitta|Kapha)\)$', option_text)
-                dosha = dosha_match.group(1).lower() if dosha_match else None
-                
-                current_options.append({
-                    'text': re.sub(r'\([^)]+\)$', '', option_text).strip(),
-                    'dosha': dosha
-                })
-        
-        # Add the last question
-        if current_question:
-            questions.append({
-                'question': current_question,
-                'options': current_options
-            })
-        
-        return questions
+        return get_question_bank().questions
     except FileNotFoundError:
         st.error("Questions file not found. Please make sure 'questions.txt' is in the same directory.")
         return []
 
 def calculate_dosha_scores(answers: List[int], questions: List[Dict]) -> Dict[str, float]:
     """Calculate dosha scores based on user answers"""
-    dosha_scores = {'vata': 0, 'pitta': 0, 'kapha': 0}
-    
-    for answer_index, question_index in enumerate(answers):
-        if answer_index < len(questions) and question_index < len(questions[answer_index]['options']):
-            selected_option = questions[answer_index]['options'][question_index]
-            if selected_option['dosha']:
-                dosha_scores[selected_option['dosha']] += 1
-    
-    # Convert to percentages
-    total_answers = len([a for a in answers if a is not None])
-    if total_answers > 0:
-        for dosha in dosha_scores:
-            dosha_scores[dosha] = (dosha_scores[dosha] / total_answers) * 100
-    
-    return dosha_scores
+    return score_answers(answers, questions)
 
-def get_user_assessment_summary(answers: List[int], questions: List[Dict], scores: Dict[str, float]) -> str:
-    """Create a summary of the user's assessment for the AI"""
-    summary = "User's Ayurvedic Assessment Results:\n\n"
-    
-    # Add dosha scores
-    summary += f"Dosha Constitution:\n"
-    summary += f"- Vata: {scores['vata']:.1f}%\n"
-    summary += f"- Pitta: {scores['pitta']:.1f}%\n"
-    summary += f"- Kapha: {scores['kapha']:.1f}%\n\n"
-    
-    # Determine primary and secondary doshas
-    sorted_doshas = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-    primary_dosha = sorted_doshas[0][0]
-    secondary_dosha = sorted_doshas[1][0]
-    
-    summary += f"Primary Constitution: {primary_dosha.title()} ({scores[primary_dosha]:.1f}%)\n"
-    summary += f"Secondary Constitution: {secondary_dosha.title()} ({scores[secondary_dosha]:.1f}%)\n\n"
-    
-    # Add specific answers
-    summary += "Assessment Responses:\n"
-    for i, (answer, question) in enumerate(zip(answers, questions)):
-        if answer is not None and answer < len(question['options']):
-            selected_option = question['options'][answer]
-            summary += f"Q{i+1}: {question['question']}\n"
-            summary += f"A: {selected_option['text']} ({selected_option['dosha'].title() if selected_option['dosha'] else 'Neutral'})\n\n"
-    
-    return summary
+def render_streaming_reply(token_stream: Iterator[str]) -> str:
+    """Render an AI reply incrementally in the chat style and return the full text"""
+    placeholder = st.empty()
+    text = ""
+    for token in token_stream:
+        text += token
+        placeholder.markdown(f'<div class="chat-message ai-message"><strong>AI Expert:</strong> {text}▌</div>', unsafe_allow_html=True)
+    placeholder.markdown(f'<div class="chat-message ai-message"><strong>AI Expert:</strong> {text}</div>', unsafe_allow_html=True)
+    return text
 
-def chat_with_ai(client: OpenAI, user_message: str, assessment_summary: str) -> str:
-    """Chat with the AI Ayurvedic expert"""
-    
-    system_prompt = f"""You are an expert Ayurvedic practitioner with deep knowledge of doshas, diet, lifestyle, and natural healing. 
+def get_advice(primary_dosha: str, secondary_dosha: str, scores: Dict[str, float]) -> str:
+    """Generate personalized Ayurvedic advice from the precomputed templates"""
+    return render_advice(primary_dosha, secondary_dosha, scores)
 
-The user has completed an Ayurvedic dosha assessment. Here are their results:
+def start_advice_prefetch(assessment: AssessmentState):
+    """Start generating AI advice for the final scores so the advice page finds it ready"""
+    if st.session_state.advice_agent is not None:
+        st.session_state.advice_prefetch = get_advice_prefetcher().prefetch(st.session_state.advice_agent, assessment.scores())
+        st.session_state.advice_prefetch_text = None
 
-{assessment_summary}
+def store_assessment(assessment: AssessmentState):
+    """Append the finished assessment to the log at ASSESSMENT_LOG_PATH, if one is configured"""
+    log = get_assessment_log()
+    if log is not None:
+        log.append(AssessmentRecord.from_answers(assessment.answers, get_question_bank().version))
 
-Based on this assessment, provide personalized, practical Ayurvedic advice. Consider their specific dosha constitution when answering questions about:
-- Diet and nutrition
-- Lifestyle and daily routine
-- Exercise recommendations
-- Stress management
-- Seasonal considerations
-- Specific health concerns
+def cancel_advice_prefetch():
+    """Drop the background advice generation, e.g. when the assessment restarts"""
+    get_advice_prefetcher().cancel(st.session_state.advice_prefetch)
+    st.session_state.advice_prefetch = None
+    st.session_state.advice_prefetch_text = None
 
-Always provide practical, actionable advice that the user can implement in their daily life. Use modern language while respecting traditional Ayurvedic principles. Be encouraging and supportive in your responses."""
+def prefetched_advice() -> str:
+    """Wait (up to the advice deadline) for the prefetched advice once, then reuse it on every rerun"""
+    if st.session_state.advice_prefetch_text is None:
+        try:
+            text = get_advice_prefetcher().result(st.session_state.advice_prefetch, ADVICE_POLICY.deadline)
+        except concurrent.futures.TimeoutError:
+            text = "⚠️ Personalized AI advice is taking too long right now; the guidance above still applies to your constitution."
+        st.session_state.advice_prefetch_text = text
+    return st.session_state.advice_prefetch_text
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ],
-            max_tokens=500,
-            temperature=0.7
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        return f"I apologize, but I'm having trouble connecting to the AI service. Please try again later. Error: {str(e)}"
-
-def get_advice(primary_dosha: str, secondary_dosha: str, scores: Dict[str, float]) -> str:
-    """Generate personalized Ayurvedic advice"""
-    
-    advice_data = {
-        'vata': {
-            'description': 'Creative, quick-thinking, and adaptable. You tend to be energetic and imaginative but may experience anxiety and irregular habits.',
-            'diet': {
-                'favorable': ['Warm, cooked foods', 'Sweet, sour, and salty tastes', 'Ghee and oils', 'Dairy products', 'Nuts and seeds', 'Root vegetables'],
-                'avoid': ['Cold, raw foods', 'Bitter and astringent tastes', 'Dry, light foods', 'Carbonated drinks', 'Caffeine']
-            },
-            'lifestyle': {
-                'routine': 'Regular sleep schedule (10 PM - 6 AM), warm oil massage, gentle exercise like yoga and walking',
-                'exercise': 'Gentle, grounding exercises like walking, swimming, tai chi, and restorative yoga',
-                'stress': 'Meditation, deep breathing, warm baths, calming music'
-            }
-        },
-        'pitta': {
-            'description': 'Intelligent, focused, and driven. You are goal-oriented and competitive but may be prone to anger and inflammation.',
-            'diet': {
-                'favorable': ['Cooling foods', 'Sweet, bitter, and astringent tastes', 'Fresh vegetables', 'Sweet fruits', 'Dairy products', 'Grains'],
-                'avoid': ['Hot, spicy foods', 'Sour and salty tastes', 'Fermented foods', 'Alcohol', 'Red meat', 'Excessive oil']
-            },
-            'lifestyle': {
-                'routine': 'Early to bed (10 PM), early to rise (6 AM), cooling practices, moderate exercise',
-                'exercise': 'Moderate exercise like swimming, cycling, and cooling yoga practices',
-                'stress': 'Cooling meditation, moon gazing, spending time in nature'
-            }
-        },
-        'kapha': {
-            'description': 'Strong, loyal, and patient. You are dependable and nurturing but may be prone to weight gain and lethargy.',
-            'diet': {
-                'favorable': ['Light, dry foods', 'Bitter, pungent, and astringent tastes', 'Honey', 'Legumes', 'Light vegetables', 'Spices'],
-                'avoid': ['Heavy, oily foods', 'Sweet, sour, and salty tastes', 'Dairy products', 'Cold foods', 'Excessive water']
-            },
-            'lifestyle': {
-                'routine': 'Early rising (6 AM), vigorous exercise, dry massage, stimulating practices',
-                'exercise': 'Vigorous exercise like running, dancing, power yoga, and strength training',
-                'stress': 'Stimulating activities, energizing music, social engagement'
-            }
-        }
-    }
-    
-    primary_advice = advice_data[primary_dosha]
-    
-    return f"""
-    ## Your Personalized Ayurvedic Guidance
-    
-    ### Constitution Analysis
-    Your primary constitution is **{primary_dosha.title()}** ({scores[primary_dosha]:.1f}%), 
-    with **{secondary_dosha.title()}** ({scores[secondary_dosha]:.1f}%) as your secondary influence.
-    
-    **{primary_advice['description']}**
-    
-    ### Dietary Recommendations
-    
-    **Favor These Foods:**
-    {chr(10).join([f"• {food}" for food in primary_advice['diet']['favorable']])}
-    
-    **Avoid or Minimize:**
-    {chr(10).join([f"• {food}" for food in primary_advice['diet']['avoid']])}
-    
-    ### Lifestyle Recommendations
-    
-    **Daily Routine:**
-    {primary_advice['lifestyle']['routine']}
-    
-    **Exercise:**
-    {primary_advice['lifestyle']['exercise']}
-    
-    **Stress Management:**
-    {primary_advice['lifestyle']['stress']}
-    
-    ### Seasonal Considerations
-    As a {primary_dosha} type, pay special attention to balancing your constitution during seasonal changes. 
-    Consider adjusting your diet and lifestyle practices accordingly.
-    
-    ### Practical Tips
-    • Start with small changes and gradually incorporate these recommendations
-    • Listen to your body and adjust practices as needed
-    • Consider consulting with an Ayurvedic practitioner for personalized guidance
-    • Maintain consistency in your daily routine for best results
-    """
+def render_debug_panel():
+    """Show this process's LLM and cache metrics (enabled with AYURVEDA_DEBUG=1)"""
+    with st.expander("🔧 Debug: LLM metrics"):
+        summary = llm_summary()
+        if summary:
+            st.table(summary)
+        else:
+            st.caption("No LLM calls recorded yet.")
+        for cache, rate in cache_hit_rates().items():
+            st.caption(f"{cache} cache hit rate: {rate:.1%}")
+        st.caption(f"Chat questions answered from the local guideline index: {fast_path_fraction():.1%}")
+        st.table(get_model_router().stats())
+        st.code(REGISTRY.render_prometheus(), language="text")
 
 # --- Main App Logic ---
 def main():
     # Initialize session state
     if 'current_question' not in st.session_state:
         st.session_state.current_question = 0
-    if 'answers' not in st.session_state:
-        st.session_state.answers = []
     if 'assessment_complete' not in st.session_state:
         st.session_state.assessment_complete = False
     if 'show_advice' not in st.session_state:
@@ -334,14 +199,30 @@ def main():
         st.session_state.show_chat = False
     if 'chat_messages' not in st.session_state:
         st.session_state.chat_messages = []
-    if 'openai_client' not in st.session_state:
-        st.session_state.openai_client = setup_openai_api_key() and OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    if 'chat_memory' not in st.session_state:
+        st.session_state.chat_memory = ChatMemory()
+    if 'llm_backend' not in st.session_state:
+        st.session_state.llm_backend = initialize_llm_backend()
+    if 'advice_agent' not in st.session_state:
+        backend = st.session_state.llm_backend
+        st.session_state.advice_agent = AyurvedaAgent(backend=backend) if backend else None
+    if 'advice_prefetch' not in st.session_state:
+        st.session_state.advice_prefetch = None
+    if 'advice_prefetch_text' not in st.session_state:
+        st.session_state.advice_prefetch_text = None
 
     questions = load_questions()
     if not questions:
         st.error("Unable to load questions. Please check the questions.txt file.")
         return
 
+    # Answers and their running scores; rebuilt only if the question bank is reloaded
+    if 'assessment' not in st.session_state:
+        st.session_state.assessment = AssessmentState(questions)
+    elif st.session_state.assessment.questions is not questions:
+        st.session_state.assessment = AssessmentState(questions, st.session_state.assessment.answers)
+    assessment = st.session_state.assessment
+
     # Welcome screen
     if st.session_state.current_question == 0 and not st.session_state.assessment_complete:
         st.markdown('<h1 class="main-header">🌿 Ayurveda Dosha Assessment 🌿</h1>', unsafe_allow_html=True)
@@ -362,10 +243,8 @@ def main():
 
         # Use st.radio for answer selection
         answer_key = f"answer_{st.session_state.current_question}"
-        if len(st.session_state.answers) < st.session_state.current_question:
-            st.session_state.answers.append(None)
         options = [opt['text'] for opt in current_q['options']]
-        answer_idx = st.session_state.answers[st.session_state.current_question-1]
+        answer_idx = assessment.answers[st.session_state.current_question-1]
         if answer_idx is not None:
             selected = st.radio(
                 "Select an option:",
@@ -379,10 +258,10 @@ def main():
                 options,
                 key=answer_key
             )
-        # Update answer in session_state
+        # Update the answer and its dosha tallies
         for idx, opt in enumerate(current_q['options']):
             if selected == opt['text']:
-                st.session_state.answers[st.session_state.current_question-1] = idx
+                assessment.set_answer(st.session_state.current_question-1, idx)
                 break
 
         col1, col2, col3 = st.columns([1, 1, 1])
@@ -392,7 +271,7 @@ def main():
                     st.session_state.current_question -= 1
                     st.rerun()
         with col3:
-            if st.session_state.answers[st.session_state.current_question-1] is not None:
+            if assessment.answers[st.session_state.current_question-1] is not None:
                 if st.session_state.current_question < len(questions):
                     if st.button("Next →", key=f"next_{st.session_state.current_question}"):
                         st.session_state.current_question += 1
@@ -400,6 +279,9 @@ def main():
                 else:
                     if st.button("Finish Assessment", key="finish"):
                         st.session_state.assessment_complete = True
+                        # Scores are final now: begin the LLM advice before anyone asks for it
+                        start_advice_prefetch(assessment)
+                        store_assessment(assessment)
                         st.rerun()
 
     # Results
@@ -407,13 +289,9 @@ def main():
         st.markdown('<h1 class="main-header">Your Dosha Constitution</h1>', unsafe_allow_html=True)
         st.markdown('<p class="subtitle">Based on your responses, here\'s your unique body constitution breakdown:</p>', unsafe_allow_html=True)
         
-        # Calculate scores
-        scores = calculate_dosha_scores(st.session_state.answers, questions)
-        
-        # Sort doshas by score
-        sorted_doshas = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        primary_dosha = sorted_doshas[0][0]
-        secondary_dosha = sorted_doshas[1][0]
+        # Scores and ranking are kept up to date as answers change
+        sorted_doshas = assessment.sorted_scores()
+        primary_dosha, secondary_dosha = assessment.ranking()
         
         # Display results
         col1, col2, col3 = st.columns(3)
@@ -501,11 +379,13 @@ def main():
         with col1:
             if st.button("Take Assessment Again", key="take_again_btn"):
                 st.session_state.current_question = 0
-                st.session_state.answers = []
+                assessment.reset()
+                cancel_advice_prefetch()
                 st.session_state.assessment_complete = False
                 st.session_state.show_advice = False
                 st.session_state.show_chat = False
                 st.session_state.chat_messages = []
+                st.session_state.chat_memory.clear()
                 st.rerun()
         with col2:
             if st.button("Get Personalized Advice", key="get_advice_btn"):
@@ -520,11 +400,8 @@ def main():
     elif st.session_state.show_advice:
         st.markdown('<h1 class="main-header">Your Personalized Ayurvedic Advice</h1>', unsafe_allow_html=True)
         
-        # Calculate scores again for advice
-        scores = calculate_dosha_scores(st.session_state.answers, questions)
-        sorted_doshas = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        primary_dosha = sorted_doshas[0][0]
-        secondary_dosha = sorted_doshas[1][0]
+        scores = assessment.scores()
+        primary_dosha, secondary_dosha = assessment.ranking()
         
         # Generate and display advice
         advice = get_advice(primary_dosha, secondary_dosha, scores)
@@ -540,15 +417,21 @@ def main():
             if st.button("Chat with AI Expert"):
                 st.session_state.show_chat = True
                 st.rerun()
+        
+        # AI advice has been generating since the assessment finished
+        if st.session_state.advice_prefetch is not None:
+            st.markdown("### 🤖 AI Practitioner's Notes")
+            with st.spinner("Personalizing your advice..."):
+                st.markdown(prefetched_advice())
     
     # Chat screen
     elif st.session_state.show_chat:
         st.markdown('<h1 class="main-header">Chat with Ayurvedic AI Expert</h1>', unsafe_allow_html=True)
         st.markdown('<p class="subtitle">Ask me anything about your health, lifestyle, or Ayurvedic practices based on your dosha constitution!</p>', unsafe_allow_html=True)
         
-        # Calculate scores for context
-        scores = calculate_dosha_scores(st.session_state.answers, questions)
-        assessment_summary = get_user_assessment_summary(st.session_state.answers, questions, scores)
+        # Scores and summary are memoized until an answer changes
+        scores = assessment.scores()
+        assessment_summary = assessment.summary()
         
         # Display chat messages
         if st.session_state.chat_messages:
@@ -571,9 +454,12 @@ def main():
                     # Add user message to chat
                     st.session_state.chat_messages.append({"role": "user", "content": user_input})
                     
-                    if st.session_state.openai_client:
-                        # Get AI response
-                        ai_response = chat_with_ai(st.session_state.openai_client, user_input, assessment_summary)
+                    if st.session_state.llm_backend:
+                        # Stream the AI response as it is generated
+                        ai_response = render_streaming_reply(
+                            stream_chat_with_ai(st.session_state.llm_backend, user_input, assessment_summary,
+                                                st.session_state.chat_memory, scores)
+                        )
                         st.session_state.chat_messages.append({"role": "assistant", "content": ai_response})
                     else:
                         # Show error message
@@ -592,7 +478,10 @@ def main():
         with col3:
             if st.button("Clear Chat"):
                 st.session_state.chat_messages = []
+                st.session_state.chat_memory.clear()
                 st.rerun()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
+    if os.getenv("AYURVEDA_DEBUG"):
+        render_debug_panel() 
\ No newline at end of file
@@ -0,0 +1,81 @@
+import json
+import threading
+
+import pytest
+
+from advice_cache import AdviceCache
+from advice_pipeline import AdvicePipeline, Checkpoint
+from rate_limiter import RateLimitExceeded
+
+
+class FlakyAgent:
+    """Stands in for AyurvedaAgent: fails the first `failures` generations of each failing concern"""
+
+    def __init__(self, failing=(), failures=1):
+        self.cache = AdviceCache()
+        self.failing = set(failing)
+        self.failures = failures
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def generate_advice(self, scores, concerns):
+        with self._lock:
+            self.calls[concerns] = self.calls.get(concerns, 0) + 1
+            calls = self.calls[concerns]
+        if concerns in self.failing and calls <= self.failures:
+            raise RateLimitExceeded("budget did not free up in time")
+        return f"advice for {concerns}"
+
+
+def write_profiles(path, lines):
+    path.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+
+
+def read_rows(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def profile(record_id, concerns):
+    return json.dumps({"id": record_id, "scores": {"vata": 50, "pitta": 30, "kapha": 20}, "concerns": concerns})
+
+
+def test_throttled_generations_are_retried_not_written_as_fallbacks(tmp_path):
+    source, output = tmp_path / "profiles.jsonl", tmp_path / "advice.jsonl"
+    write_profiles(source, [profile(1, "sleep"), profile(2, "digestion"), profile(3, "sleep")])
+    agent = FlakyAgent(failing={"sleep"}, failures=2)
+    stats = AdvicePipeline(agent, workers=2, retry_backoff=0.0, progress_interval=60).run(str(source), str(output))
+
+    assert [row["advice"] for row in read_rows(output)] == ["advice for sleep", "advice for digestion",
+                                                            "advice for sleep"]
+    assert stats["retries"] == 2 and stats["errors"] == 0
+
+
+def test_run_stops_before_a_profile_that_keeps_failing_and_resumes_there(tmp_path):
+    source, output = tmp_path / "profiles.jsonl", tmp_path / "advice.jsonl"
+    write_profiles(source, [profile(1, "digestion"), profile(2, "sleep"), profile(3, "skin")])
+    agent = FlakyAgent(failing={"sleep"}, failures=3)
+    pipeline = AdvicePipeline(agent, workers=2, retries=1, retry_backoff=0.0, progress_interval=60)
+    with pytest.raises(RateLimitExceeded):
+        pipeline.run(str(source), str(output))
+
+    checkpoint = Checkpoint.load(f"{output}.checkpoint")
+    assert checkpoint.input_offset == len(profile(1, "digestion")) + 1
+    assert [row["id"] for row in read_rows(output)] == [1]
+
+    # The upstream has recovered by the time the run is resumed
+    pipeline.run(str(source), str(output))
+    assert [(row["id"], row["advice"]) for row in read_rows(output)] == [
+        (1, "advice for digestion"), (2, "advice for sleep"), (3, "advice for skin")]
+
+
+def test_bad_input_lines_become_error_rows(tmp_path):
+    source, output = tmp_path / "profiles.jsonl", tmp_path / "advice.jsonl"
+    write_profiles(source, [profile(1, "sleep"), "{not json", json.dumps({"id": 3, "scores": {"vata": 1}}),
+                            profile(4, "skin")])
+    stats = AdvicePipeline(FlakyAgent(), workers=2, progress_interval=60).run(str(source), str(output))
+
+    rows = read_rows(output)
+    assert [row["id"] for row in rows] == [1, None, 3, 4]
+    assert "error" in rows[1] and "error" in rows[2]
+    assert rows[3]["advice"] == "advice for skin"
+    assert stats["errors"] == 2 and stats["records"] == 4
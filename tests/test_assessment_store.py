@@ -0,0 +1,118 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from assessment_store import (FILE_HEADER, KIND_CHOICE, AssessmentLog, AssessmentRecord, choice_layout,
+                              iter_records, load_choice_matrix, record_size)
+from scoring import UNANSWERED
+
+BANK_VERSION = "00000000deadbeef"
+
+
+def choice_records(n, questions=10):
+    return [AssessmentRecord.from_answers([(i + q) % 3 if (i + q) % 4 else None for q in range(questions)],
+                                          BANK_VERSION, timestamp=1_700_000_000 + i) for i in range(n)]
+
+
+def stored(tmp_path, data):
+    """Decode the records of a log holding exactly these bytes"""
+    path = str(tmp_path / "records.log")
+    with open(path, "wb") as file:
+        file.write(FILE_HEADER.pack(b"AYVLOG", 1) + data)
+    return list(iter_records(path))
+
+
+def test_choice_record_round_trip(tmp_path):
+    answers = [0, 1, 2, None, 2, None, 0]
+    record = AssessmentRecord.from_answers(answers, BANK_VERSION, timestamp=1234)
+    data = record.to_bytes()
+    assert len(data) == record_size(KIND_CHOICE, len(answers))
+    # 2-bit codes, four answers to a byte, little end first
+    assert record.payload == bytes([0b00111001, 0b00010011])
+
+    (decoded,) = stored(tmp_path, data)
+    assert decoded.answers() == answers
+    assert decoded.bank_version_hex == BANK_VERSION
+    assert decoded.timestamp == 1234
+
+
+def test_yes_no_record_round_trip(tmp_path):
+    responses = {"vata": [True, False, True], "pitta": [False] * 9, "kapha": [True, True]}
+    (decoded,) = stored(tmp_path, AssessmentRecord.from_yes_no(responses, timestamp=1).to_bytes())
+    assert decoded.yes_no() == responses
+
+
+def test_answers_that_do_not_fit_two_bits_are_rejected():
+    with pytest.raises(ValueError):
+        AssessmentRecord.from_answers([3], BANK_VERSION)
+
+
+def test_appends_reach_the_file_before_close(tmp_path):
+    path = str(tmp_path / "assessments.log")
+    log = AssessmentLog(path, fsync_every=256, fsync_interval=0.05)
+    try:
+        records = choice_records(3)
+        for record in records:
+            log.append(record)
+        assert os.path.getsize(path) == FILE_HEADER.size + sum(len(r.to_bytes()) for r in records)
+        assert len(list(iter_records(path))) == 3
+        # The interval timer syncs the batch with no further appends
+        deadline = time.monotonic() + 2
+        while log._pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert log._pending == 0
+    finally:
+        log.close()
+
+
+def test_torn_tail_is_truncated_on_reopen(tmp_path):
+    path = str(tmp_path / "assessments.log")
+    records = choice_records(5)
+    with AssessmentLog(path) as log:
+        log.append_many(records[:4])
+    intact = os.path.getsize(path)
+    with open(path, "ab") as file:
+        # A crash part-way through writing the fifth record
+        file.write(records[4].to_bytes()[:-3])
+
+    with AssessmentLog(path) as log:
+        assert os.path.getsize(path) == intact
+        log.append(records[4])
+    assert [r.answers() for r in iter_records(path)] == [r.answers() for r in records]
+    assert choice_layout(path) == (10, 5)
+
+
+def test_torn_tail_of_a_mixed_log_is_truncated(tmp_path):
+    path = str(tmp_path / "assessments.log")
+    yes_no = AssessmentRecord.from_yes_no({"vata": [True], "pitta": [False], "kapha": [True]})
+    with AssessmentLog(path) as log:
+        log.append_many(choice_records(2) + [yes_no])
+    with open(path, "ab") as file:
+        file.write(b"\x00" * 7)
+    with AssessmentLog(path):
+        pass
+    assert len(list(iter_records(path))) == 3
+
+
+def test_log_shorter_than_its_header_is_reset(tmp_path):
+    path = str(tmp_path / "assessments.log")
+    with open(path, "wb") as file:
+        file.write(FILE_HEADER.pack(b"AYVLOG", 1)[:5])
+    with AssessmentLog(path) as log:
+        log.append_many(choice_records(2))
+    assert len(list(iter_records(path))) == 2
+
+
+def test_choice_matrix_decodes_unanswered_questions(tmp_path):
+    path = str(tmp_path / "assessments.log")
+    records = choice_records(6)
+    with AssessmentLog(path) as log:
+        log.append_many(records)
+    answers, versions, timestamps = load_choice_matrix(path)
+    expected = [[UNANSWERED if a is None else a for a in r.answers()] for r in records]
+    assert np.array_equal(answers, np.array(expected))
+    assert versions.tolist() == [int(BANK_VERSION, 16)] * 6
+    assert timestamps.tolist() == [r.timestamp for r in records]
+
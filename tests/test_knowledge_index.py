@@ -0,0 +1,34 @@
+import pytest
+
+from knowledge_index import GUIDELINE_INDEX
+
+SCORES = {"vata": 50.0, "pitta": 30.0, "kapha": 20.0}
+
+
+@pytest.mark.parametrize("question, dosha, topic", [
+    ("what foods should I avoid", "vata", "avoid"),
+    ("what should I not eat", "vata", "avoid"),
+    ("what should pitta avoid eating", "pitta", "avoid"),
+    ("what foods are good for vata", "vata", "favorable"),
+    ("how should I exercise", "vata", "exercise"),
+    ("what exercise suits kapha", "kapha", "exercise"),
+    ("what is the best sleep schedule for me", "vata", "daily_routine"),
+    ("how can I manage stress", "vata", "stress_management"),
+    ("what does vata mean", "vata", "description"),
+])
+def test_common_questions_are_answered_locally(question, dosha, topic):
+    answer = GUIDELINE_INDEX.answer(question, SCORES)
+    assert answer is not None
+    assert (answer.passage.dosha, answer.passage.topic) == (dosha, topic)
+
+
+@pytest.mark.parametrize("question", [
+    # "cold" is in the avoid list ("cold foods") but here it is an illness
+    "what can I eat when I have a cold",
+    "what should I eat with a fever",
+    "I have a headache, what should I take",
+    "is vata or pitta better for running",
+    "tell me about pitta",
+])
+def test_other_questions_go_to_the_llm(question):
+    assert GUIDELINE_INDEX.answer(question, SCORES) is None
@@ -0,0 +1,67 @@
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from advice_cache import AdviceCache
+from ayurveda_agent import AyurvedaAgent
+from llm_backend import EmptyCompletionError, LLMBackend, OpenAIBackend, as_backend
+
+
+class ContentFilteredClient:
+    """Stands in for openai.OpenAI: every completion comes back with no content"""
+
+    api_key = "test-key"
+    base_url = None
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, max_tokens, temperature, stream=False):
+        if stream:
+            return iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None))])])
+        message = SimpleNamespace(content=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="content_filter")],
+                               usage=None, model=model)
+
+
+def test_backends_must_implement_every_call():
+    class CompleteOnly(LLMBackend):
+        def complete(self, messages, model, max_tokens, temperature=0.7):
+            raise NotImplementedError
+
+    with pytest.raises(TypeError):
+        CompleteOnly()
+
+
+def test_openai_clients_are_still_accepted():
+    openai = pytest.importorskip("openai")
+    client = openai.OpenAI(api_key="test-key", base_url="http://127.0.0.1:9/v1")
+    backend = as_backend(client)
+    assert isinstance(backend, OpenAIBackend)
+    assert backend.client is client
+    assert backend.api_key == "test-key"
+    assert as_backend(backend) is backend
+
+
+def test_other_objects_are_rejected():
+    with pytest.raises(TypeError):
+        as_backend(object())
+
+
+def test_missing_completion_text_is_an_error():
+    backend = OpenAIBackend(client=ContentFilteredClient())
+    with pytest.raises(EmptyCompletionError, match="content_filter"):
+        backend.complete([], "model", 10)
+    with pytest.raises(EmptyCompletionError):
+        list(backend.stream([], "model", 10))
+
+
+def test_empty_advice_is_served_as_fallback_and_never_cached(tmp_path):
+    cache = AdviceCache(path=str(tmp_path / "advice.db"))
+    agent = AyurvedaAgent(cache=cache, backend=OpenAIBackend(client=ContentFilteredClient()))
+    scores = {"vata": 50.0, "pitta": 30.0, "kapha": 20.0}
+    assert agent.get_personalized_advice(scores) == agent._fallback_advice(scores)
+    assert "".join(agent.stream_personalized_advice(scores)) == agent._fallback_advice(scores)
+    with sqlite3.connect(tmp_path / "advice.db") as conn:
+        assert conn.execute("SELECT COUNT(*) FROM advice").fetchone() == (0,)
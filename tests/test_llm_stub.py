@@ -0,0 +1,58 @@
+import http.client
+import json
+import math
+import threading
+
+import pytest
+
+from llm_stub import StubConfig, StubModel, create_stub_server
+
+
+@pytest.fixture
+def stub_server():
+    server = create_stub_server(port=0, config=StubConfig(time_scale=0.0, seed=1))
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post(server, body: bytes, headers=None):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=5)
+    connection.putrequest("POST", "/v1/chat/completions")
+    for name, value in (headers or {"Content-Length": str(len(body))}).items():
+        connection.putheader(name, value)
+    connection.endheaders(body)
+    response = connection.getresponse()
+    payload = json.loads(response.read())
+    connection.close()
+    return response.status, payload
+
+
+@pytest.mark.parametrize("body,headers", [
+    (b"{not json", None),
+    (b"[1, 2]", None),
+    (b'{"messages": "hello"}', None),
+    (b'{"messages": [], "max_tokens": "many"}', None),
+    (b"{}", {"Content-Length": "lots"}),
+])
+def test_malformed_requests_get_a_400(stub_server, body, headers):
+    status, payload = post(stub_server, body, headers)
+    assert status == 400
+    assert payload["error"]["type"] == "invalid_request_error"
+
+
+def test_well_formed_request_still_completes(stub_server):
+    body = json.dumps({"model": "stub", "messages": [{"role": "user", "content": "hi"}], "max_tokens": 5}).encode()
+    status, payload = post(stub_server, body)
+    assert status == 200
+    assert payload["choices"][0]["message"]["content"]
+
+
+def test_lognormal_ttft_tail_is_capped():
+    config = StubConfig(ttft_ms=100.0, jitter_ms=100.0, seed=7)
+    model = StubModel(config)
+    cap = 100.0 * math.exp(3 * math.log1p(1.0)) / 1000.0
+    samples = [model.sample_ttft() for _ in range(20000)]
+    assert max(samples) == pytest.approx(cap)
@@ -0,0 +1,74 @@
+import pytest
+
+import model_router
+import semantic_cache
+from advice_cache import AdviceCache
+from ayurveda_agent import ADVICE_CACHE_NAMESPACE, AyurvedaAgent
+from chat import chat_with_ai
+from llm_backend import Completion, LLMBackend
+from model_router import LatencyObservingBackend, LatencyTracker, ModelRoute, ModelRouter
+
+SCORES = {"vata": 50.0, "pitta": 30.0, "kapha": 20.0}
+
+
+class EchoBackend(LLMBackend):
+    name = "echo"
+
+    def complete(self, messages, model, max_tokens, temperature=0.7) -> Completion:
+        return Completion(f"advice from {model}", model, 10, 10)
+
+    def stream(self, messages, model, max_tokens, temperature=0.7):
+        yield self.complete(messages, model, max_tokens, temperature).text
+
+    async def acomplete(self, messages, model, max_tokens, temperature=0.7) -> Completion:
+        return self.complete(messages, model, max_tokens, temperature)
+
+
+class FailingBackend(EchoBackend):
+    name = "failing"
+
+    def complete(self, messages, model, max_tokens, temperature=0.7) -> Completion:
+        raise ValueError("rejected")
+
+
+def slow_router() -> ModelRouter:
+    """Advice router whose primary model is already over its p95 budget"""
+    routes = {"advice": ModelRoute("advice", "primary-model", 100, p95_budget_s=1.0, fallback_model="fallback-model")}
+    router = ModelRouter(routes, LatencyTracker(), min_samples=1)
+    router.observe("primary-model", 5.0)
+    return router
+
+
+def test_failed_calls_are_not_latency_samples():
+    router = ModelRouter({}, LatencyTracker())
+    backend = LatencyObservingBackend(FailingBackend(), router)
+    with pytest.raises(ValueError):
+        backend.complete([], "model", 10)
+    assert router.tracker.recent("model") == []
+
+    LatencyObservingBackend(EchoBackend(), router).complete([], "model", 10)
+    assert len(router.tracker.recent("model")) == 1
+
+
+def test_fallback_model_advice_is_not_cached(monkeypatch):
+    router = slow_router()
+    monkeypatch.setattr(model_router, "_default_router", router)
+    cache = AdviceCache()
+    agent = AyurvedaAgent(cache=cache, backend=EchoBackend())
+
+    assert agent.get_personalized_advice(SCORES) == "advice from fallback-model"
+    assert cache.get(cache.key(SCORES, "", ADVICE_CACHE_NAMESPACE)) is None
+
+
+def test_chat_simple_replies_are_not_served_to_the_full_chat_route(monkeypatch):
+    routes = {"chat": ModelRoute("chat", "big-model", 500), "chat_simple": ModelRoute("chat_simple", "small-model", 250)}
+    router = ModelRouter(routes, LatencyTracker())
+    monkeypatch.setattr(model_router, "_default_router", router)
+    monkeypatch.setattr(semantic_cache, "_default_cache", semantic_cache.SemanticChatCache())
+    question = "is ginger tea fine for me in the evening"
+
+    assert chat_with_ai(EchoBackend(), question, "", scores=SCORES) == "advice from small-model"
+    assert chat_with_ai(EchoBackend(), question, "", scores=SCORES) == "advice from small-model"
+    # The same question now takes the full route and must not get the small model's cached reply
+    router.simple_max_words = 0
+    assert chat_with_ai(EchoBackend(), question, "", scores=SCORES) == "advice from big-model"
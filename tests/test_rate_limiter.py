@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from llm_backend import Completion, LLMBackend
+from rate_limiter import AttemptBudget, RateLimiter, RateLimitExceeded
+from resilience import CircuitOpenError, ResiliencePolicy, ResilientBackend, get_upstream
+
+MESSAGES = [{"role": "user", "content": "How should I eat in winter?"}]
+POLICY = ResiliencePolicy(attempt_timeout=2.0, deadline=5.0, max_retries=2, backoff_base=0.01, backoff_max=0.01,
+                          hedge_percentile=None)
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class ScriptedBackend(LLMBackend):
+    """Raises the scripted errors in order, then answers"""
+
+    name = "scripted"
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def complete(self, messages, model, max_tokens, temperature=0.7) -> Completion:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return Completion("advice", model, 20, 30)
+
+    def stream(self, messages, model, max_tokens, temperature=0.7):
+        yield self.complete(messages, model, max_tokens, temperature).text
+
+    async def acomplete(self, messages, model, max_tokens, temperature=0.7) -> Completion:
+        return self.complete(messages, model, max_tokens, temperature)
+
+
+def level(limiter, model, kind):
+    return limiter.store._levels[f"{model}:{kind}"][0]
+
+
+def test_failed_calls_get_their_tokens_back():
+    limiter = RateLimiter(rpm=60, tpm=6000, max_wait=0.5)
+    backend = ScriptedBackend([UpstreamError(400)] * 5)
+    llm = ResilientBackend(backend, POLICY, budget=AttemptBudget(limiter))
+    for _ in range(5):
+        with pytest.raises(UpstreamError):
+            llm.complete(MESSAGES, "refund-model", 1000)
+    # Five rejected calls used no tokens, so a sixth still fits the 6000 TPM budget
+    assert llm.complete(MESSAGES, "refund-model", 1000).text == "advice"
+    assert level(limiter, "refund-model", "tokens") > 6000 - 1000
+    assert backend.calls == 6
+
+
+def test_every_retry_is_charged_a_request():
+    limiter = RateLimiter(rpm=60, tpm=6000)
+    backend = ScriptedBackend([UpstreamError(503), UpstreamError(503)])
+    llm = ResilientBackend(backend, POLICY, budget=AttemptBudget(limiter))
+    assert llm.complete(MESSAGES, "retry-model", 100).text == "advice"
+    assert backend.calls == 3
+    assert level(limiter, "retry-model", "requests") == pytest.approx(57, abs=0.5)
+    # Only the successful attempt's real usage stays spent
+    assert level(limiter, "retry-model", "tokens") == pytest.approx(6000 - 50, abs=5)
+
+
+def test_open_circuit_fails_fast_without_queueing_for_budget():
+    limiter = RateLimiter(rpm=60, max_wait=30.0)
+    limiter.store.take([("open-model:requests", 60, 1.0, 60, 0.0)])
+    upstream = get_upstream("scripted:open-model", POLICY)
+    for _ in range(upstream.failure_threshold):
+        upstream.record_failure()
+    llm = ResilientBackend(ScriptedBackend(), POLICY, budget=AttemptBudget(limiter))
+    start = time.monotonic()
+    with pytest.raises(CircuitOpenError):
+        llm.complete(MESSAGES, "open-model", 100)
+    assert time.monotonic() - start < 0.5
+
+
+def test_running_out_of_budget_is_not_an_upstream_failure():
+    limiter = RateLimiter(rpm=60, max_wait=0.1)
+    limiter.store.take([("empty-model:requests", 60, 1.0, 60, 0.0)])
+    backend = ScriptedBackend()
+    llm = ResilientBackend(backend, POLICY, budget=AttemptBudget(limiter))
+    for _ in range(10):
+        with pytest.raises(RateLimitExceeded):
+            llm.complete(MESSAGES, "empty-model", 100)
+    assert backend.calls == 0
+    assert get_upstream("scripted:empty-model").consecutive_failures == 0
@@ -0,0 +1,141 @@
+import threading
+import time
+
+import pytest
+
+import rate_limiter
+import resilience
+from advice_cache import AdviceCache
+from ayurveda_agent import ADVICE_MODEL, AyurvedaAgent
+from llm_backend import Completion, LLMBackend
+from resilience import (ADVICE_POLICY, DeadlineExceeded, ResiliencePolicy, ResilientBackend, UpstreamHealth,
+                        get_upstream)
+
+SCORES = {"vata": 50.0, "pitta": 30.0, "kapha": 20.0}
+
+
+class CountingBackend(LLMBackend):
+    """Healthy, instant upstream that counts the calls reaching it"""
+
+    name = "counting"
+
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def complete(self, messages, model, max_tokens, temperature=0.7) -> Completion:
+        with self._lock:
+            self.calls += 1
+        return Completion("advice", model, 10, 10)
+
+    def stream(self, messages, model, max_tokens, temperature=0.7):
+        yield self.complete(messages, model, max_tokens, temperature).text
+
+    async def acomplete(self, messages, model, max_tokens, temperature=0.7) -> Completion:
+        return self.complete(messages, model, max_tokens, temperature)
+
+
+@pytest.fixture
+def drained_limiter(monkeypatch):
+    """600 RPM limiter with an empty bucket: every caller queues about 0.1s per request ahead of it"""
+    limiter = rate_limiter.RateLimiter(rpm=600)
+    limiter.store.take([(f"{ADVICE_MODEL}:requests", 600, 10.0, 600, 0.0)])
+    monkeypatch.setenv("LLM_RPM_LIMIT", "600")
+    monkeypatch.setattr(rate_limiter, "_default_limiter", limiter)
+    # Queueing for budget takes longer than one attempt is allowed to
+    monkeypatch.setattr(ADVICE_POLICY, "attempt_timeout", 0.3)
+    return limiter
+
+
+def test_throttling_alone_never_opens_the_circuit(drained_limiter):
+    backend = CountingBackend()
+    agent = AyurvedaAgent(cache=AdviceCache(), backend=backend)
+    results = []
+
+    def ask(i):
+        results.append(agent.get_personalized_advice(SCORES, f"concern {i}"))
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    upstream = get_upstream(f"{backend.name}:{ADVICE_MODEL}")
+    assert upstream.state == UpstreamHealth.CLOSED
+    assert upstream.consecutive_failures == 0
+    # Every caller waited for budget and was served by exactly one upstream call
+    assert results == ["advice"] * 12
+    assert backend.calls == 12
+
+
+def test_client_errors_do_not_close_a_half_open_circuit():
+    upstream = UpstreamHealth("test:half-open", failure_threshold=1, reset_timeout=0.0)
+    upstream.record_failure()
+    assert upstream.allow()
+    assert upstream.state == UpstreamHealth.HALF_OPEN
+    upstream.release_trial()
+    assert upstream.state == UpstreamHealth.HALF_OPEN
+    # The trial slot is free again for a real probe
+    assert upstream.allow()
+
+
+def test_calls_abandoned_at_their_deadline_are_capped(monkeypatch):
+    release = threading.Event()
+
+    class StalledBackend(CountingBackend):
+        name = "stalled"
+
+        def complete(self, messages, model, max_tokens, temperature=0.7) -> Completion:
+            super().complete(messages, model, max_tokens, temperature)
+            release.wait(5)
+            return Completion("late", model, 10, 10)
+
+    overdue = resilience._OverdueCalls(limit=2)
+    monkeypatch.setattr(resilience, "_overdue", overdue)
+    policy = ResiliencePolicy(attempt_timeout=0.05, deadline=0.05, max_retries=0, hedge_percentile=None,
+                              failure_threshold=100)
+    backend = StalledBackend()
+    llm = ResilientBackend(backend, policy)
+    try:
+        for _ in range(4):
+            with pytest.raises(DeadlineExceeded):
+                llm.complete([], "model", 10)
+        # Two stalled calls hold executor threads; later calls fail fast without reaching the upstream
+        assert backend.calls == 2
+        assert overdue.count == 2
+    finally:
+        release.set()
+    deadline = time.monotonic() + 5
+    while overdue.count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert overdue.count == 0
+
+
+class FailingBackend(CountingBackend):
+    """Upstream whose every call raises the given error"""
+
+    def __init__(self, name, error):
+        super().__init__()
+        self.name = name
+        self.error = error
+
+    def complete(self, messages, model, max_tokens, temperature=0.7) -> Completion:
+        super().complete(messages, model, max_tokens, temperature)
+        raise self.error
+
+
+def test_upstream_failures_degrade_to_local_advice(monkeypatch, capsys):
+    monkeypatch.setattr(ADVICE_POLICY, "max_retries", 0)
+    agent = AyurvedaAgent(cache=AdviceCache(), backend=FailingBackend("refused", ConnectionError("refused")))
+    assert agent.get_personalized_advice(SCORES) == agent._fallback_advice(SCORES)
+    assert "ConnectionError: refused" in capsys.readouterr().err
+
+
+def test_programming_errors_are_not_hidden_behind_fallback_advice(monkeypatch):
+    monkeypatch.setattr(ADVICE_POLICY, "max_retries", 0)
+    agent = AyurvedaAgent(cache=AdviceCache(), backend=FailingBackend("buggy", KeyError("choices")))
+    with pytest.raises(KeyError):
+        agent.get_personalized_advice(SCORES)
+    with pytest.raises(KeyError):
+        list(agent.stream_personalized_advice(SCORES))
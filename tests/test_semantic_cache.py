@@ -0,0 +1,22 @@
+from semantic_cache import SemanticChatCache
+
+SCORES = {"vata": 50.0, "pitta": 30.0, "kapha": 20.0}
+
+
+def test_rephrased_questions_share_an_answer():
+    cache = SemanticChatCache()
+    partition = cache.partition(SCORES, "test")
+    cache.set("can I eat spicy food", partition, "answer")
+    assert cache.get("can I eat spicy foods", partition) == "answer"
+
+
+def test_negated_question_does_not_reuse_the_answer():
+    cache = SemanticChatCache()
+    partition = cache.partition(SCORES, "test")
+    cache.set("can I eat spicy food", partition, "yes, in moderation")
+    assert cache.get("can I not eat spicy food", partition) is None
+    assert cache.get("why don't I eat spicy food", partition) is None
+
+    cache.set("can I not eat spicy food", partition, "you can skip it")
+    assert cache.get("can I not eat spicy foods", partition) == "you can skip it"
+    assert cache.get("can I eat spicy food", partition) == "yes, in moderation"